@@ -0,0 +1,284 @@
+import io
+import os
+import sys
+import logging
+import time
+import itertools
+import threading
+from datetime import datetime
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import etree, html as lxml_html
+from price_store import EmptyFetch, to_price, write_records_csv
+
+# HTTP fetch engine for agmarknet. Replays the ASP.NET form postbacks that the
+# Selenium scraper performs by hand (commodity/state/market dropdowns, date
+# fields, btnGo) and streams the rows of cphBody_GridPriceData with lxml.
+
+AGMARKNET_URL = "https://agmarknet.gov.in/"
+# "http" tries this engine first and falls back to Selenium; "selenium" skips it
+FETCH_ENGINE = os.environ.get("AGMARKNET_ENGINE", "http")
+REQUEST_TIMEOUT = (10, 90)  # (connect, read) seconds
+# Requests per second allowed to each host across all sessions (0 = no limit)
+AGMARKNET_RATE_LIMIT = float(os.environ.get("AGMARKNET_RATE_LIMIT", 0))
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/134.0 Safari/537.36"
+)
+
+
+class AgmarknetError(Exception):
+    """Raised when the agmarknet pages do not look like the form we expect."""
+
+
+# Connections are pooled in one adapter shared by every fetch, while each fetch
+# gets its own Session so ASP.NET session cookies never leak between requests.
+_adapter = None
+_adapter_lock = threading.Lock()
+
+
+def get_http_adapter(pool_size=10):
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            retry = Retry(total=3, backoff_factor=1, status_forcelist=(500, 502, 503, 504),
+                          allowed_methods=("GET", "POST"))
+            _adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        return _adapter
+
+
+# Spaces requests to each host at least 1/rate seconds apart, shared by threads
+class HostRateLimiter:
+    def __init__(self, rate=AGMARKNET_RATE_LIMIT):
+        self.rate = rate
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if self.rate <= 0:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_rate_limiter = HostRateLimiter()
+
+
+def get_rate_limiter():
+    return _rate_limiter
+
+
+class RateLimitedSession(requests.Session):
+    def __init__(self, limiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, method, url, *args, **kwargs):
+        self.limiter.wait(url)
+        return super().request(method, url, *args, **kwargs)
+
+
+def create_session():
+    session = RateLimitedSession(get_rate_limiter())
+    adapter = get_http_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+class PriceGridNotFound(AgmarknetError):
+    """Raised when a results page has no cphBody_GridPriceData table."""
+
+
+GRID_ID = "cphBody_GridPriceData"
+
+
+# One grid row as a typed record: date parsed once, prices as ints (None when
+# blank). Rows without a valid date are dropped.
+def price_row(cols, market, state):
+    try:
+        row_date = datetime.strptime(cols[9], "%d %b %Y").date()
+    except ValueError:
+        logging.warning(f"Invalid date format: {cols[9]}")
+        return None
+    return {
+        "S.No": cols[0],
+        "Market": market,
+        "Commodity": cols[3],
+        "Min Price": to_price(cols[6]),
+        "Max Price": to_price(cols[7]),
+        "Modal Price": to_price(cols[8]),
+        "Date": row_date,
+        "State": state,
+    }
+
+
+# Grid parsing, shared with the Selenium path so both engines return identical
+# records. The page is parsed incrementally and each row is released once it
+# has been yielded, so memory does not grow with the size of the grid. Raises
+# PriceGridNotFound if the page has no grid.
+def iter_price_grid(page_source, market, state):
+    if isinstance(page_source, str):
+        page_source = page_source.encode("utf-8")
+    grid = None
+    header_skipped = False
+    for event, element in etree.iterparse(io.BytesIO(page_source), events=("start", "end"), html=True):
+        if grid is None:
+            if event == "start" and element.tag == "table" and element.get("id") == GRID_ID:
+                grid = element
+            continue
+        if event != "end":
+            continue
+        if element is grid:
+            return
+        if element.tag != "tr":
+            continue
+        if not header_skipped:
+            header_skipped = True
+        else:
+            cols = ["".join(col.itertext()).strip() for col in element.iterchildren("td")]
+            row = price_row(cols, market, state) if len(cols) >= 10 else None
+            if row:
+                yield row
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    if grid is None:
+        raise PriceGridNotFound("Price grid not found in response")
+
+
+# Rows of the grid, or an EmptyFetch when it is empty. The page is checked for
+# the grid up front (raising PriceGridNotFound) and the rest is parsed as it is
+# consumed.
+def price_grid_rows(page_source, market, state):
+    rows = iter_price_grid(page_source, market, state)
+    first = next(rows, None)
+    return EmptyFetch() if first is None else itertools.chain([first], rows)
+
+
+def parse_price_grid(page_source, market, state):
+    try:
+        return list(iter_price_grid(page_source, market, state))
+    except PriceGridNotFound:
+        return None
+
+
+# All successful controls of the first form, as the browser would submit them
+def form_fields(doc):
+    forms = doc.xpath("//form")
+    if not forms:
+        raise AgmarknetError("No form found on page")
+    form = forms[0]
+    fields = {}
+    for element in form.xpath(".//input[@name]"):
+        input_type = (element.get("type") or "text").lower()
+        if input_type in ("submit", "button", "image", "reset"):
+            continue
+        if input_type in ("checkbox", "radio") and element.get("checked") is None:
+            continue
+        fields[element.get("name")] = element.get("value", "")
+    for element in form.xpath(".//select[@name]"):
+        selected = element.xpath("./option[@selected]") or element.xpath("./option")
+        if selected:
+            fields[element.get("name")] = selected[0].get("value", selected[0].text_content().strip())
+    return urljoin(AGMARKNET_URL, form.get("action") or ""), fields
+
+
+def find_select(doc, select_id):
+    selects = doc.xpath(f'//select[@id="{select_id}"]')
+    if not selects:
+        raise AgmarknetError(f"Dropdown {select_id} not found")
+    return selects[0]
+
+
+def option_value(select, text):
+    wanted = text.strip().lower()
+    for option in select.xpath("./option"):
+        if option.text_content().strip().lower() == wanted:
+            return option.get("value", option.text_content().strip())
+    return None
+
+
+def submit(session, doc, overrides, event_target=None, button=None, parse=True):
+    action, fields = form_fields(doc)
+    fields.update(overrides)
+    if event_target:
+        fields["__EVENTTARGET"] = event_target
+        fields["__EVENTARGUMENT"] = ""
+    if button:
+        buttons = doc.xpath(f'//input[@name="{button}"]')
+        fields[button] = buttons[0].get("value", "") if buttons else ""
+    response = session.post(action, data=fields, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response, lxml_html.fromstring(response.content) if parse else None
+
+
+# Select a dropdown value, replaying the autopostback when the control has one
+def select_option(session, doc, select_id, text, selections):
+    select = find_select(doc, select_id)
+    value = option_value(select, text)
+    if value is None:
+        return doc, False
+    selections[select.get("name")] = value
+    if "__doPostBack" in (select.get("onchange") or ""):
+        _, doc = submit(session, doc, selections, event_target=select.get("name"))
+    return doc, True
+
+
+# Session.close() would also close the shared adapter, so sessions are simply dropped
+def fetch_market_prices_http(state, commodity, market, from_date, to_date, session=None):
+    session = session or create_session()
+    try:
+        response = session.get(AGMARKNET_URL, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        doc = lxml_html.fromstring(response.content)
+        logging.info(f"Fetching data over HTTP for {commodity} in {state}, {market}")
+
+        selections = {}
+        for select_id, text in (("ddlCommodity", commodity), ("ddlState", state), ("ddlMarket", market)):
+            doc, found = select_option(session, doc, select_id, text, selections)
+            if not found:
+                logging.error(f"'{text}' not available in {select_id}")
+                return []
+
+        selections["txtDate"] = from_date.strftime("%d-%b-%Y")
+        selections["txtDateTo"] = to_date.strftime("%d-%b-%Y")
+        response, _ = submit(session, doc, selections, button="btnGo", parse=False)
+
+        rows = price_grid_rows(response.content, market, state)
+        logging.info(f"Completed HTTP fetch for {market}")
+        return rows
+    except requests.RequestException as e:
+        raise AgmarknetError(f"HTTP fetch failed: {e}") from e
+
+
+# Offline check of the parser against a saved page, e.g. timeout_page.html,
+# optionally writing the parsed rows to a CSV in chunks
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "parse":
+        print("Usage: python agmarknet_http.py parse <html_file> [market] [state] [output_csv]")
+        sys.exit(1)
+    with open(sys.argv[2], "rb") as f:
+        page_source = f.read()
+    market, state = (sys.argv[3:5] + ["", ""])[:2]
+    try:
+        rows = price_grid_rows(page_source, market, state)
+    except PriceGridNotFound:
+        print("No cphBody_GridPriceData table found")
+        sys.exit(1)
+    if len(sys.argv) > 5:
+        print(f"Wrote {write_records_csv(rows, sys.argv[5])} records to '{sys.argv[5]}'")
+        sys.exit(0)
+    count = 0
+    for count, record in enumerate(rows, start=1):
+        if count <= 5:
+            print(record)
+    print(f"Parsed {count} records")
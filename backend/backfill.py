@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from price_store import get_price_store, parse_date, EmptyFetch, PRICE_DB_PATH, PriceStore
+from agmarknet_http import fetch_market_prices_http, get_rate_limiter, AgmarknetError, AGMARKNET_RATE_LIMIT
+
+# Backfill of long date ranges into the price store. The range is split into
+# month- or quarter-sized windows that are fetched concurrently (bounded by
+# BACKFILL_WORKERS, with requests to agmarknet paced by the shared per-host
+# rate limiter). Every completed window is checkpointed in the store, so a
+# failed window is the only one fetched again and a restarted backfill skips
+# what is already done. Coverage is only extended once every window is in.
+
+BACKFILL_WORKERS = int(os.environ.get("BACKFILL_WORKERS", 4))
+BACKFILL_RETRIES = int(os.environ.get("BACKFILL_RETRIES", 3))
+BACKFILL_RATE_LIMIT = float(os.environ.get("BACKFILL_RATE_LIMIT", AGMARKNET_RATE_LIMIT or 2))
+WINDOW_MONTHS = {"month": 1, "quarter": 3}
+
+
+# Calendar-aligned windows covering [from_date, to_date], clipped at both ends
+def date_windows(from_date, to_date, window="month"):
+    months = WINDOW_MONTHS[window]
+    from_date, to_date = parse_date(from_date), parse_date(to_date)
+    windows = []
+    start = from_date
+    while start <= to_date:
+        month_index = start.year * 12 + start.month - 1
+        next_index = (month_index // months + 1) * months
+        next_start = date(next_index // 12, next_index % 12 + 1, 1)
+        windows.append((start, min(next_start - timedelta(days=1), to_date)))
+        start = next_start
+    return windows
+
+
+# Fetch and store one window, retrying with backoff. Only an empty results
+# grid (EmptyFetch) is a window without arrivals; a page without a grid or an
+# empty result is a failed attempt, and leaves the stored rows and checkpoints
+# of the window as they were.
+def fetch_window(store, fetch_fn, state, market, commodity, window_from, window_to, retries=BACKFILL_RETRIES):
+    for attempt in range(retries):
+        started = time.perf_counter()
+        try:
+            records = fetch_fn(state, commodity, market,
+                               datetime.combine(window_from, datetime.min.time()),
+                               datetime.combine(window_to, datetime.min.time()))
+            saved = store.save_prices(state, market, commodity, records, window_from, window_to,
+                                      require_rows=True, update_coverage=False)
+            if not saved and not isinstance(records, EmptyFetch):
+                raise AgmarknetError("No records fetched")
+        except Exception as e:
+            logging.warning(f"Window {window_from} to {window_to} attempt {attempt + 1}/{retries} failed: {e}")
+            if attempt + 1 < retries:
+                time.sleep(2 ** attempt)
+                continue
+            return {"from": window_from.isoformat(), "to": window_to.isoformat(), "status": "failed",
+                    "error": str(e), "attempts": attempt + 1}
+        # Windows reaching today may still be published to, so they stay unchecked
+        if window_to < date.today():
+            store.mark_window_complete(state, market, commodity, window_from, window_to, saved)
+        return {"from": window_from.isoformat(), "to": window_to.isoformat(), "status": "ok", "rows": saved,
+                "attempts": attempt + 1, "seconds": round(time.perf_counter() - started, 3)}
+
+
+# Yields one result per window as it finishes, then a summary. Windows already
+# checkpointed are skipped (also empty ones, unless refetch_empty).
+def backfill(state, market, commodity, from_date, to_date, window="month", workers=BACKFILL_WORKERS,
+             retries=BACKFILL_RETRIES, store=None, fetch_fn=fetch_market_prices_http, refetch_empty=False):
+    store = store or get_price_store()
+    started = time.perf_counter()
+    windows = date_windows(from_date, to_date, window)
+    completed = store.completed_windows(state, market, commodity)
+    pending = [w for w in windows if w not in completed or (refetch_empty and completed[w] == 0)]
+    logging.info(f"Backfilling {commodity} in {state}, {market}: {len(pending)} of {len(windows)} windows to fetch")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(fetch_window, store, fetch_fn, state, market, commodity, window_from, window_to,
+                               retries)
+                   for window_from, window_to in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            yield result
+
+    failed = [result for result in results if result["status"] == "failed"]
+    if not failed and windows:
+        store.mark_covered(state, market, commodity, windows[0][0], windows[-1][1])
+    yield {
+        "summary": True,
+        "state": state,
+        "market": market,
+        "commodity": commodity,
+        "windows": len(windows),
+        "checkpointed": len(windows) - len(pending),
+        "fetched": len(results) - len(failed),
+        "failed": len(failed),
+        "rows": sum(result.get("rows", 0) for result in results),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill a market series into the price store in date windows")
+    parser.add_argument("state")
+    parser.add_argument("market")
+    parser.add_argument("commodity")
+    parser.add_argument("--from", dest="from_date", type=parse_date, required=True, help="YYYY-MM-DD")
+    parser.add_argument("--to", dest="to_date", type=parse_date, default=date.today(), help="YYYY-MM-DD")
+    parser.add_argument("--window", choices=sorted(WINDOW_MONTHS), default="month")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--retries", type=int, default=BACKFILL_RETRIES)
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE_LIMIT,
+                        help="requests per second to agmarknet (0 for no limit)")
+    parser.add_argument("--db", default=PRICE_DB_PATH, help="price store database")
+    parser.add_argument("--refetch-empty", action="store_true", help="fetch checkpointed empty windows again")
+    args = parser.parse_args(argv)
+    if args.to_date < args.from_date:
+        parser.error("--to is before --from")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    get_rate_limiter().rate = args.rate
+    store = PriceStore(args.db)
+    summary = None
+    for result in backfill(args.state, args.market, args.commodity, args.from_date, args.to_date, args.window,
+                           args.workers, args.retries, store=store, refetch_empty=args.refetch_empty):
+        if result.get("summary"):
+            summary = result
+            continue
+        detail = f"{result['rows']} rows" if result["status"] == "ok" else result["error"]
+        print(f"{result['from']} to {result['to']}: {result['status']} ({detail})")
+    print(json.dumps(summary))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+import os
+import csv
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import timedelta
+from concurrent.futures import FIRST_COMPLETED, wait
+import pandas as pd
+from price_store import PriceStore, PRICE_DB_PATH, read_price_csv, typed_price_frame
+from forecasting import parse_horizons, parse_interval_levels, parse_engine, interval_label, FORECAST_ENGINES
+from panel_forecast import forecast_panel
+from price_service import preprocess, forecast, FORECAST_CAP_MULTIPLE
+from jobs import JobManager, JobQueueFull, get_job_manager
+
+# Batch forecasting over every market series held locally: the bundled
+# *_past3years.csv files and the series in the price store, preprocessed and
+# forecast as /predict_prices does (price_service.py). Series are fitted on the
+# job manager's fit pool (jobs.py), shared with the price jobs, at most
+# BATCH_WORKERS at a time per batch. Results are yielded as each series
+# completes and a failed series is reported without stopping the rest of the
+# run. The batch endpoints run at most BATCH_MAX_CONCURRENT batches at once.
+
+BATCH_DATA_DIR = os.environ.get("BATCH_DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
+BATCH_WORKERS = int(os.environ.get("BATCH_FORECAST_WORKERS", os.cpu_count() or 1))
+BATCH_MAX_CONCURRENT = int(os.environ.get("BATCH_MAX_CONCURRENT", 2))
+BATCH_HISTORY_DAYS = 3 * 365  # same window as /predict_prices
+
+_batch_slots = threading.BoundedSemaphore(BATCH_MAX_CONCURRENT)
+
+
+def series_identity(series):
+    return {"state": series["state"], "market": series["market"], "commodity": series["commodity"]}
+
+
+# One entry per (state, market, commodity); the same series saved under two
+# file names is only forecast once
+def discover_csv_series(data_dir=BATCH_DATA_DIR):
+    found = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, "*_past3years.csv"))):
+        try:
+            head = pd.read_csv(path, dtype=str, nrows=1, usecols=["State", "Market", "Commodity"])
+        except (ValueError, pd.errors.EmptyDataError) as e:
+            logging.warning(f"Skipping '{path}': {e}")
+            continue
+        if head.empty:
+            continue
+        key = (head["State"].iloc[0], head["Market"].iloc[0], head["Commodity"].iloc[0])
+        found.setdefault(key, {"state": key[0], "market": key[1], "commodity": key[2],
+                               "source": "csv", "path": path})
+    return list(found.values())
+
+
+def discover_store_series(db_path=PRICE_DB_PATH):
+    if not os.path.exists(db_path):
+        return []
+    return [
+        {"state": state, "market": market, "commodity": commodity, "source": "store", "db_path": db_path,
+         "from_date": max(from_date, to_date - timedelta(days=BATCH_HISTORY_DAYS)).isoformat(),
+         "to_date": to_date.isoformat()}
+        for state, market, commodity, from_date, to_date in PriceStore(db_path).series()
+    ]
+
+
+# Store series take precedence over CSV files for the same market and commodity
+def discover_series(data_dir=BATCH_DATA_DIR, db_path=PRICE_DB_PATH, use_csv=True, use_store=True):
+    found = {}
+    for series in (discover_store_series(db_path) if use_store else []) + (discover_csv_series(data_dir) if use_csv else []):
+        found.setdefault((series["state"], series["market"], series["commodity"]), series)
+    return list(found.values())
+
+
+# Pick the requested [{"state", "market", "commodity"}, ...] out of the
+# discovered series. Requests without local data are returned separately.
+def select_series(requested, available):
+    index = {(s["state"].lower(), s["market"].lower(), s["commodity"].lower()): s for s in available}
+    selected, missing = [], []
+    for item in requested:
+        try:
+            key = (item["state"].lower(), item["market"].lower(), item["commodity"].lower())
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError("Each series needs string state, market and commodity fields")
+        if key in index:
+            selected.append(index[key])
+        else:
+            missing.append(series_identity(item))
+    return selected, missing
+
+
+# A series' records as a typed price frame
+def load_series_frame(series):
+    if series["source"] == "store":
+        # A fresh store per call, since connections must not cross the worker fork
+        records = PriceStore(series["db_path"]).load_prices(
+            series["state"], series["market"], series["commodity"], series["from_date"], series["to_date"])
+        return typed_price_frame(records)
+    return read_price_csv(series["path"])
+
+
+# Runs in a pool worker; never raises so one bad series cannot fail the batch
+def forecast_series(series, horizons=None, interval_levels=None, freq="W"):
+    started = time.perf_counter()
+    result = {**series_identity(series), "source": series["source"]}
+    try:
+        df = load_series_frame(series)
+        price_series = preprocess(df, freq=freq)
+        result.update({
+            "status": "ok",
+            "data_points": len(df),
+            "last_date": price_series.index[-1].strftime("%Y-%m-%d"),
+            "predictions": forecast(price_series, (series["state"], series["market"], series["commodity"]),
+                                    horizons, interval_levels, freq=freq),
+        })
+    except Exception as e:
+        result.update({"status": "failed", "error": str(e)})
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+# The panel engine fits every series in one vectorized pass in this process;
+# series that cannot be loaded or resampled fail individually
+def run_panel_batch(series_list, horizons=None, interval_levels=None, freq="W"):
+    started = time.perf_counter()
+    loaded = []
+    for series in series_list:
+        try:
+            df = load_series_frame(series)
+            loaded.append((series, len(df), preprocess(df, freq=freq)))
+        except Exception as e:
+            yield {**series_identity(series), "source": series["source"], "status": "failed", "error": str(e),
+                   "seconds": round(time.perf_counter() - started, 3)}
+    if not loaded:
+        return
+    predictions = forecast_panel([price_series for _, _, price_series in loaded], horizons, interval_levels, freq=freq,
+                                 caps=[price_series.max() * FORECAST_CAP_MULTIPLE for _, _, price_series in loaded])
+    seconds = round(time.perf_counter() - started, 3)
+    for (series, data_points, price_series), prediction in zip(loaded, predictions):
+        yield {**series_identity(series), "source": series["source"], "status": "ok", "data_points": data_points,
+               "last_date": price_series.index[-1].strftime("%Y-%m-%d"), "predictions": prediction,
+               "seconds": seconds}
+
+
+# Yields one result per series in completion order. At most workers series
+# are submitted to the fit pool at a time, so a large batch does not queue
+# ahead of interactive price jobs. Closing the generator early (e.g. a client
+# disconnecting) cancels the submitted series that have not started.
+def run_batch(series_list, horizons=None, interval_levels=None, workers=BATCH_WORKERS, engine="sarimax",
+              manager=None):
+    if not series_list:
+        return
+    if engine == "panel":
+        yield from run_panel_batch(series_list, horizons, interval_levels)
+        return
+    manager = manager or get_job_manager()
+    remaining = iter(series_list)
+    futures = {}
+
+    def submit_next():
+        series = next(remaining, None)
+        if series is not None:
+            futures[manager.submit_fit(forecast_series, series, horizons, interval_levels)] = series
+
+    try:
+        for _ in range(max(1, workers)):
+            submit_next()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                series = futures.pop(future)
+                submit_next()
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. BrokenProcessPool)
+                    yield {**series_identity(series), "source": series["source"],
+                           "status": "failed", "error": f"Worker failed: {e}"}
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def summarize(results, started):
+    ok = sum(1 for result in results if result["status"] == "ok")
+    return {"total": len(results), "ok": ok, "failed": len(results) - ok,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+# Series for an API request: all discovered series, or only the requested ones
+def resolve_series(requested=None):
+    available = discover_series()
+    if requested is None:
+        return available, []
+    if not isinstance(requested, list):
+        raise ValueError("series must be a list of {state, market, commodity} objects")
+    return select_series(requested, available)
+
+
+# The lines of one batch stream, holding one of the BATCH_MAX_CONCURRENT slots
+# until they are exhausted or the stream is closed (also if it never started)
+class BatchStream:
+    def __init__(self, lines):
+        self.lines = lines
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            yield from self.lines
+        finally:
+            self.close()
+
+    # Servers call this when the response ends, so a disconnected client frees
+    # its slot right away rather than when the abandoned iterator is collected
+    def close(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        try:
+            self.lines.close()
+        finally:
+            _batch_slots.release()
+
+
+# NDJSON lines for the batch endpoints: one per series as it completes
+# (requested series without local data first), then {"summary": ...}. Raises
+# JobQueueFull when BATCH_MAX_CONCURRENT batches are already running.
+def stream_batch(series_list, missing=(), horizons=None, interval_levels=None, engine="sarimax"):
+    if not _batch_slots.acquire(blocking=False):
+        raise JobQueueFull(f"Too many batch forecasts running ({BATCH_MAX_CONCURRENT})")
+    return BatchStream(batch_lines(series_list, missing, horizons, interval_levels, engine))
+
+
+def batch_lines(series_list, missing=(), horizons=None, interval_levels=None, engine="sarimax"):
+    started = time.perf_counter()
+    results = [{**item, "status": "failed", "error": "No local data for this series"} for item in missing]
+    for result in results:
+        yield json.dumps(result) + "\n"
+    for result in run_batch(series_list, horizons, interval_levels, engine=engine):
+        results.append(result)
+        yield json.dumps(result) + "\n"
+    yield json.dumps({"summary": summarize(results, started)}) + "\n"
+
+
+# Consolidated table: one row per series and forecast week of the longest
+# horizon (shorter horizons are prefixes of it), one row per failed series
+def table_columns(interval_levels):
+    columns = ["state", "market", "commodity", "source", "step", "date", "predicted_price"]
+    for level in interval_levels:
+        label = interval_label(level)
+        columns += [f"lower_{label}", f"upper_{label}"]
+    return columns + ["status", "error"]
+
+
+def table_rows(result):
+    identity = {**series_identity(result), "source": result["source"], "status": result["status"]}
+    if result["status"] != "ok":
+        return [{**identity, "error": result["error"]}]
+    longest = max(result["predictions"].values(), key=lambda horizon: len(horizon["dates"]))
+    rows = []
+    for step, (forecast_date, price) in enumerate(zip(longest["dates"], longest["predicted_prices"]), start=1):
+        row = {**identity, "step": step, "date": forecast_date, "predicted_price": round(price, 2)}
+        for label, band in longest.get("intervals", {}).items():
+            row[f"lower_{label}"] = round(band["lower"][step - 1], 2)
+            row[f"upper_{label}"] = round(band["upper"][step - 1], 2)
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast every local market series in parallel")
+    parser.add_argument("--data-dir", default=BATCH_DATA_DIR, help="directory with *_past3years.csv files")
+    parser.add_argument("--db", default=PRICE_DB_PATH, help="price store database")
+    parser.add_argument("--no-csv", action="store_true", help="skip the CSV files")
+    parser.add_argument("--no-store", action="store_true", help="skip the price store")
+    parser.add_argument("--series", nargs=3, action="append", metavar=("STATE", "MARKET", "COMMODITY"),
+                        help="only forecast this series (repeatable)")
+    parser.add_argument("--horizons", type=int, nargs="+", help="forecast horizons in weeks (default 1 4 12 24)")
+    parser.add_argument("--interval-levels", type=float, nargs="+", help="confidence levels, e.g. 0.8 0.95")
+    parser.add_argument("--engine", choices=FORECAST_ENGINES, default=parse_engine(None))
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--output", default="batch_forecasts.csv", help="consolidated forecast table")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        horizons = parse_horizons(args.horizons)
+        interval_levels = parse_interval_levels(args.interval_levels)
+        series_list = discover_series(args.data_dir, args.db, use_csv=not args.no_csv, use_store=not args.no_store)
+        if args.series:
+            series_list, missing = select_series(
+                [{"state": state, "market": market, "commodity": commodity} for state, market, commodity in args.series],
+                series_list)
+            for item in missing:
+                logging.warning(f"No local data for {item['commodity']} in {item['state']}, {item['market']}")
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"Forecasting {len(series_list)} series with the {args.engine} engine")
+    started = time.perf_counter()
+    results = []
+    manager = JobManager(scrape_workers=1, fit_workers=max(1, args.workers))
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=table_columns(interval_levels))
+        writer.writeheader()
+        for result in run_batch(series_list, horizons, interval_levels, args.workers, args.engine, manager):
+            results.append(result)
+            writer.writerows(table_rows(result))
+            f.flush()
+            detail = f"{result['data_points']} points" if result["status"] == "ok" else result["error"]
+            print(f"[{len(results)}/{len(series_list)}] {result['commodity']} in {result['state']}, "
+                  f"{result['market']}: {result['status']} ({detail}, {result['seconds']:.1f}s)")
+    manager.shutdown()
+
+    summary = summarize(results, started)
+    print(json.dumps(summary))
+    print(f"Wrote forecast table to '{args.output}'")
+    return 0 if summary["failed"] < summary["total"] or not summary["total"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import html
+import argparse
+import itertools
+import platform
+import warnings
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Every fit is measured cold: no disk cache and nothing kept in memory
+os.environ["FORECAST_CACHE_DIR"] = ""
+os.environ["FORECAST_CACHE_ENTRIES"] = "0"
+
+from train import load_recommender, main_feature_columns, RECOMMENDER_ARTIFACT
+from price_service import preprocess, preprocess_and_predict
+from agmarknet_http import GRID_ID, iter_price_grid
+from batch_forecast import discover_csv_series, load_series_frame
+
+# Offline benchmarks of the request hot paths, on the data bundled in backend/:
+#   recommend_single       recommend_sub_crops, one Crop_recommendation.csv row per call
+#   recommend_batch[n]     recommend_sub_crops_batch on n rows
+#   predict[engine,Nw]     preprocess_and_predict on the last N weeks of the
+#                          longest *_past3years.csv series (cold fits)
+#   ingest[series]         reading the longest series' CSV and preprocessing it
+#                          to the weekly series
+#   preprocess[series]     preprocessing alone, on that series and on synthetic
+#                          string-typed frames of SYNTHETIC_ROWS rows (with peak
+#                          traced memory)
+#   parse[fixture]         agmarknet grid parsing of the saved results pages in
+#                          benchmarks/fixtures (rendered from the CSVs with --write-fixtures)
+# Results are written as JSON (median, p95 and min seconds per call) and
+# compared with a stored baseline on the min (best of the runs, the figure
+# least disturbed by other load); a benchmark more than --tolerance slower
+# than its baseline is a regression and fails the run.
+# Baselines are machine-specific, so regenerate baseline.json with
+# --save-baseline when moving to another machine.
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+GROUPS = ("recommend", "predict", "preprocess", "parse")
+SINGLE_ROWS = 200
+BATCH_SIZES = (1, 64, 1024)
+SERIES_WEEKS = (26, 52, 104, 156)
+ENGINES = ("sarimax", "panel")
+SYNTHETIC_ROWS = (100_000, 500_000)
+SEED = 42
+
+
+def summarize(samples, **extra):
+    samples = np.asarray(samples, dtype=float)
+    return {
+        "median": float(np.median(samples)),
+        "p95": float(np.percentile(samples, 95)),
+        "min": float(samples.min()),
+        "runs": len(samples),
+        **extra,
+    }
+
+
+# Seconds per call of fn() over repeat runs, after warmup untimed calls
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+# Recommendation
+
+def sample_inputs(rows, seed=SEED):
+    df = pd.read_csv(os.path.join(BACKEND_DIR, "Crop_recommendation.csv"))
+    return df[main_feature_columns].sample(n=rows, replace=len(df) < rows, random_state=seed).to_numpy(dtype=float)
+
+
+def bench_recommend(repeat):
+    recommender = load_recommender(os.path.join(BACKEND_DIR, RECOMMENDER_ARTIFACT),
+                                   os.path.join(BACKEND_DIR, "subcrop_recommender.pkl"))
+    results = {}
+    calls = itertools.cycle(sample_inputs(SINGLE_ROWS).tolist())
+    samples = measure(lambda: recommender.recommend_sub_crops(*next(calls)), SINGLE_ROWS)
+    results["recommend_single"] = summarize(samples)
+
+    for size in BATCH_SIZES:
+        batch = sample_inputs(size, seed=SEED + size)
+        samples = measure(lambda: recommender.recommend_sub_crops_batch(batch), repeat)
+        results[f"recommend_batch[{size}]"] = summarize(samples, rows=size,
+                                                        rows_per_second=round(size / float(np.median(samples)), 1))
+    return results
+
+
+# Forecasting
+
+def longest_csv_path():
+    paths = [item["path"] for item in discover_csv_series(BACKEND_DIR)]
+    return max(paths, key=lambda path: pd.read_csv(path, dtype=str, usecols=["Date"])["Date"].nunique())
+
+
+def longest_csv_series():
+    return pd.read_csv(longest_csv_path(), dtype=str)
+
+
+def last_weeks(df, weeks):
+    dates = pd.to_datetime(df["Date"], errors="coerce")
+    return df[dates > dates.max() - pd.Timedelta(weeks=weeks)]
+
+
+def bench_predict(repeat):
+    # statsmodels adds its own warning filters when first imported, so it is
+    # imported before the fit warnings are silenced
+    import statsmodels.tsa.statespace.sarimax  # noqa: F401
+    warnings.filterwarnings("ignore")
+    df = longest_csv_series()
+    results = {}
+    for engine in ENGINES:
+        for weeks in SERIES_WEEKS:
+            frame = last_weeks(df, weeks)
+            prediction = preprocess_and_predict(frame, engine=engine)
+            if "error" in prediction:
+                print(f"skip predict[{engine},{weeks}w]: {prediction['error']}")
+                continue
+            samples = measure(lambda: preprocess_and_predict(frame, engine=engine), repeat, warmup=0)
+            results[f"predict[{engine},{weeks}w]"] = summarize(samples, records=len(frame))
+    return results
+
+
+# Preprocessing
+
+# Scraper-shaped frame of strings: several markets' worth of daily quotes
+def synthetic_price_frame(rows, seed=SEED):
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, max(rows // 8, 60), rows))
+    modal = np.round(2000 + 500 * np.sin(days / 58.0) + rng.normal(0, 150, rows)).astype(int)
+    spread = rng.integers(0, 300, rows)
+    dates = (np.datetime64("2015-01-01") + days).astype(str)
+    return pd.DataFrame({"Date": dates, "Min Price": (modal - spread).astype(str),
+                         "Max Price": (modal + spread).astype(str), "Modal Price": modal.astype(str)})
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_preprocess(repeat):
+    path = longest_csv_path()
+    name = os.path.basename(path)[:-len("_past3years.csv")]
+    series = {"source": "csv", "path": path}
+    results = {}
+    ingest = lambda: preprocess(load_series_frame(series))
+    results[f"ingest[{name}]"] = summarize(measure(ingest, repeat), peak_bytes=peak_memory(ingest))
+    frames = [(name, pd.read_csv(path, dtype=str))]
+    frames += [(f"synthetic_{rows}", synthetic_price_frame(rows)) for rows in SYNTHETIC_ROWS]
+    for label, df in frames:
+        run = lambda: preprocess(df)
+        results[f"preprocess[{label}]"] = summarize(measure(run, repeat if len(df) < 100_000 else max(3, repeat // 5)),
+                                                    rows=len(df), peak_bytes=peak_memory(run))
+    return results
+
+
+# Scraper parsing
+
+def render_grid_page(df):
+    header = ("<tr><th>Sl no.</th><th>District Name</th><th>Market Name</th><th>Commodity</th><th>Variety</th>"
+              "<th>Grade</th><th>Min Price (Rs./Quintal)</th><th>Max Price (Rs./Quintal)</th>"
+              "<th>Modal Price (Rs./Quintal)</th><th>Price Date</th></tr>")
+    rows = []
+    for i, record in enumerate(df.to_dict("records"), start=1):
+        row_date = pd.to_datetime(record["Date"], errors="coerce")
+        cells = [str(i), "", record["Market"], record["Commodity"], "Other", "FAQ", record["Min Price"],
+                 record["Max Price"], record["Modal Price"],
+                 row_date.strftime("%d %b %Y") if not pd.isna(row_date) else str(record["Date"])]
+        rows.append("<tr>" + "".join(f"<td><span>{html.escape(str(cell))}</span></td>" for cell in cells) + "</tr>")
+    # A view state of realistic size, so the parser also has to skip past it
+    viewstate = "A" * 40000
+    return (
+        "<!DOCTYPE html><html><head><title>AGMARKNET</title></head><body>"
+        "<form method=\"post\" id=\"form1\">"
+        f"<input type=\"hidden\" name=\"__VIEWSTATE\" id=\"__VIEWSTATE\" value=\"{viewstate}\" />"
+        f"<div><table class=\"tableagmark_new\" id=\"{GRID_ID}\">{header}{''.join(rows)}</table></div>"
+        "</form></body></html>"
+    )
+
+
+# Fixtures: a typical (median-sized) and the largest bundled CSV series as results pages
+def write_fixtures(fixture_dir=FIXTURE_DIR):
+    os.makedirs(fixture_dir, exist_ok=True)
+    frames = sorted((pd.read_csv(item["path"], dtype=str) for item in discover_csv_series(BACKEND_DIR)), key=len)
+    for name, df in (("typical", frames[len(frames) // 2]), ("large", frames[-1])):
+        path = os.path.join(fixture_dir, f"price_grid_{name}.html.gz")
+        # mtime=0 keeps the files byte-identical between runs
+        with gzip.GzipFile(path, "wb", mtime=0) as f:
+            f.write(render_grid_page(df).encode("utf-8"))
+        print(f"Wrote {len(df)} rows to '{path}'")
+
+
+def bench_parse(repeat, fixture_dir=FIXTURE_DIR):
+    results = {}
+    paths = sorted(glob.glob(os.path.join(fixture_dir, "*.html.gz")))
+    if not paths:
+        print(f"No fixtures in '{fixture_dir}'; run with --write-fixtures")
+    for path in paths:
+        with gzip.open(path, "rb") as f:
+            page = f.read()
+        name = os.path.basename(path)[:-len(".html.gz")]
+        rows = sum(1 for _ in iter_price_grid(page, "", ""))
+        samples = measure(lambda: sum(1 for _ in iter_price_grid(page, "", "")), repeat)
+        median = float(np.median(samples))
+        results[f"parse[{name}]"] = summarize(samples, rows=rows, bytes=len(page),
+                                              rows_per_second=round(rows / median, 1),
+                                              mb_per_second=round(len(page) / median / 2 ** 20, 2))
+    return results
+
+
+# Comparison
+
+def benchmark_group(name):
+    return name.split("[")[0].split("_")[0]
+
+
+def compare(results, baseline, tolerance, groups=GROUPS):
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline:
+            comparison[name] = {"status": "new"}
+            continue
+        ratio = result["min"] / baseline[name]["min"]
+        status = "regression" if ratio > 1 + tolerance else "improvement" if ratio < 1 - tolerance else "ok"
+        comparison[name] = {"status": status, "ratio": round(ratio, 3),
+                            "baseline_min": baseline[name]["min"], "min": result["min"]}
+    # A benchmark in the baseline that no longer produced a result (e.g. a
+    # forecast that now fails) is reported rather than silently dropped
+    for name in baseline:
+        if name not in results and benchmark_group(name) in groups:
+            comparison[name] = {"status": "missing"}
+    return comparison
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation, forecasting and scraper hot paths")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS), help="benchmark groups to run")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per recommend/parse benchmark")
+    parser.add_argument("--fit-repeat", type=int, default=3, help="timed runs per predict benchmark")
+    parser.add_argument("--output", default="benchmark_results.json", help="results file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown (0.25 = 25%%) before a benchmark counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--write-fixtures", action="store_true", help="render the HTML fixtures from the CSVs")
+    args = parser.parse_args(argv)
+
+    if args.write_fixtures:
+        write_fixtures()
+    np.random.seed(SEED)
+    runners = {"recommend": lambda: bench_recommend(args.repeat),
+               "predict": lambda: bench_predict(args.fit_repeat),
+               "preprocess": lambda: bench_preprocess(args.repeat),
+               "parse": lambda: bench_parse(args.repeat)}
+    results = {}
+    for group in args.only:
+        started = time.perf_counter()
+        results.update(runners[group]())
+        print(f"{group}: {time.perf_counter() - started:.1f}s")
+
+    report = {"environment": environment(), "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        report["baseline"] = args.baseline
+        report["comparison"] = compare(results, baseline, args.tolerance, args.only)
+        regressions = [name for name, item in report["comparison"].items()
+                       if item["status"] in ("regression", "missing")]
+
+    for name, result in results.items():
+        line = (f"{name:<40} min {result['min'] * 1000:10.3f} ms  median {result['median'] * 1000:10.3f} ms  "
+                f"p95 {result['p95'] * 1000:10.3f} ms")
+        item = report.get("comparison", {}).get(name)
+        if item and "ratio" in item:
+            line += f"  {item['ratio']:.2f}x baseline ({item['status']})"
+        print(line)
+    with open(args.baseline if args.save_baseline else args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote results to '{args.baseline if args.save_baseline else args.output}'")
+    if regressions:
+        statuses = [f"{name} ({report['comparison'][name]['status']})" for name in regressions]
+        print(f"Regressions: {', '.join(statuses)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
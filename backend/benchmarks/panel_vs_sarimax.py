@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forecasting import model_spec, build_model, fit_model, weekly_price_series
+from panel_forecast import forecast_panel
+from batch_forecast import BATCH_DATA_DIR, discover_csv_series, load_series_frame
+
+# Holdout comparison of the panel engine against per-series SARIMAX on the
+# bundled *_past3years.csv files: the last --holdout weeks of every series are
+# forecast from the weeks before them. SARIMAX is fitted directly, bypassing
+# the forecast cache, so its wall time is that of cold fits.
+
+
+def load_weekly_series(data_dir, min_train):
+    loaded = []
+    for series in discover_csv_series(data_dir):
+        try:
+            loaded.append((series, weekly_price_series(load_series_frame(series))))
+        except ValueError as e:
+            print(f"skip {series['commodity']} in {series['market']}: {e}")
+    return [(series, prices) for series, prices in loaded if len(prices) >= min_train]
+
+
+def errors(actual, forecast):
+    actual, forecast = np.asarray(actual, dtype=float), np.asarray(forecast, dtype=float)
+    mae = float(np.mean(np.abs(actual - forecast)))
+    nonzero = actual != 0
+    mape = float(np.mean(np.abs((actual[nonzero] - forecast[nonzero]) / actual[nonzero])) * 100) if nonzero.any() else None
+    return mae, mape
+
+
+def run_sarimax(train_series, holdout):
+    forecasts = []
+    started = time.perf_counter()
+    for train in train_series:
+        spec = model_spec(train)
+        try:
+            fitted = fit_model(build_model(train, spec), spec)
+            forecasts.append(np.clip(np.asarray(fitted.get_forecast(steps=holdout).predicted_mean, dtype=float), 0, None))
+        except Exception as e:
+            print(f"SARIMAX failed: {e}")
+            forecasts.append(None)
+    return forecasts, time.perf_counter() - started
+
+
+def run_panel(train_series, holdout):
+    started = time.perf_counter()
+    predictions = forecast_panel(train_series, {"holdout": holdout}, [])
+    elapsed = time.perf_counter() - started
+    return [np.array(prediction["holdout"]["predicted_prices"]) for prediction in predictions], elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the panel forecaster with per-series SARIMAX")
+    parser.add_argument("--data-dir", default=BATCH_DATA_DIR)
+    parser.add_argument("--holdout", type=int, default=8, help="weeks held out per series")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+    warnings.filterwarnings("ignore")
+
+    loaded = load_weekly_series(args.data_dir, min_train=args.holdout + 10)
+    train_series = [prices.iloc[:-args.holdout] for _, prices in loaded]
+    sarimax_forecasts, sarimax_seconds = run_sarimax(train_series, args.holdout)
+    panel_forecasts, panel_seconds = run_panel(train_series, args.holdout)
+
+    rows = []
+    for (series, prices), sarimax_forecast, panel_forecast in zip(loaded, sarimax_forecasts, panel_forecasts):
+        actual = prices.iloc[-args.holdout:].values
+        row = {"commodity": series["commodity"], "market": series["market"], "weeks": len(prices)}
+        row["sarimax_mae"], row["sarimax_mape"] = errors(actual, sarimax_forecast) if sarimax_forecast is not None else (None, None)
+        row["panel_mae"], row["panel_mape"] = errors(actual, panel_forecast)
+        rows.append(row)
+
+    table = pd.DataFrame(rows)
+    summary = {
+        "series": len(rows),
+        "holdout_weeks": args.holdout,
+        "sarimax_seconds": round(sarimax_seconds, 3),
+        "panel_seconds": round(panel_seconds, 3),
+        "speedup": round(sarimax_seconds / panel_seconds, 1) if panel_seconds else None,
+        "sarimax_mean_mape": round(float(table["sarimax_mape"].mean()), 2),
+        "panel_mean_mape": round(float(table["panel_mape"].mean()), 2),
+        "sarimax_mean_mae": round(float(table["sarimax_mae"].mean()), 2),
+        "panel_mean_mae": round(float(table["panel_mae"].mean()), 2),
+    }
+    with pd.option_context("display.width", 160, "display.max_columns", None):
+        print(table.round(2).to_string(index=False))
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "series": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,99 @@
+import os
+import time
+import threading
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 
-def get_db_connection():
+# Process-wide connection pool for the auth endpoints. Credentials come from
+# the environment, defaulting to the local development database.
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "port": int(os.environ.get("DB_PORT", 3306)),
+    "user": os.environ.get("DB_USER", "root"),
+    "password": os.environ.get("DB_PASSWORD", "balaji@06"),
+    "database": os.environ.get("DB_NAME", "croprecommendation"),
+}
+DB_POOL_NAME = os.environ.get("DB_POOL_NAME", "croprecommendation")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))  # mysql-connector allows at most 32
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))  # seconds to wait for a free connection
+
+_pool = None
+_pool_lock = threading.Lock()
+# MySQLConnectionPool fails at once when empty, so checkouts wait on this first
+_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+_stats_lock = threading.Lock()
+_stats = {"checkouts": 0, "in_use": 0, "exhausted": 0, "unhealthy": 0, "errors": 0,
+          "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(pool_name=DB_POOL_NAME, pool_size=DB_POOL_SIZE,
+                                                pool_reset_session=True, **DB_CONFIG)
+        return _pool
+
+
+def get_db_connection(timeout=DB_POOL_TIMEOUT):
+    start = time.monotonic()
+    if not _slots.acquire(timeout=timeout):
+        _count("exhausted")
+        print(f"Database Connection Error: no pooled connection free within {timeout:g}s")
+        return None
+    waited = time.monotonic() - start
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='balaji@06',  
-            database='croprecommendation'
-        )
-        return connection
+        connection = get_pool().get_connection()
     except Error as err:
+        _slots.release()
+        _count("errors")
         print(f"Database Connection Error: {err}")
         return None
 
-# Optional: Function to close connection
+    _count("in_use")
+
+    # Health check on checkout; a dropped server connection is reopened once
+    try:
+        connection.ping(reconnect=True, attempts=2, delay=0)
+    except Error as err:
+        _count("unhealthy")
+        close_db_connection(connection)
+        print(f"Database Connection Error: {err}")
+        return None
+
+    with _stats_lock:
+        _stats["checkouts"] += 1
+        _stats["wait_seconds_total"] += waited
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+    return connection
+
+
+# Returns the connection to the pool; safe to call more than once
 def close_db_connection(connection, cursor=None):
     if cursor:
         cursor.close()
-    if connection and connection.is_connected():
-        connection.close()
\ No newline at end of file
+    if connection is None or getattr(connection, "_released", False):
+        return
+    connection._released = True
+    try:
+        connection.close()
+    except Error as err:
+        print(f"Database Connection Error: {err}")
+    finally:
+        _slots.release()
+        with _stats_lock:
+            _stats["in_use"] -= 1
+
+
+def db_pool_metrics():
+    with _stats_lock:
+        stats = dict(_stats)
+    wait_total = stats.pop("wait_seconds_total")
+    stats["wait_seconds_avg"] = wait_total / stats["checkouts"] if stats["checkouts"] else 0.0
+    stats["pool_size"] = DB_POOL_SIZE
+    return stats
@@ -0,0 +1,197 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Bounded pool of Chrome WebDrivers shared by the Selenium scraping paths.
+# Drivers are health-checked on checkout, retired after max_uses fetches and
+# recycled when they raise a browser-level WebDriverException. Callers that
+# cannot get a driver within acquire_timeout get DriverPoolTimeout. Selenium
+# is only imported once a driver is actually needed, so the HTTP engine never
+# loads it.
+
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", 2))
+DRIVER_MAX_USES = int(os.environ.get("DRIVER_MAX_USES", 50))
+DRIVER_ACQUIRE_TIMEOUT = float(os.environ.get("DRIVER_ACQUIRE_TIMEOUT", 60))
+DRIVER_HEADLESS = os.environ.get("DRIVER_HEADLESS", "1") != "0"
+
+
+class DriverPoolTimeout(Exception):
+    """Raised when no driver becomes available within the acquire timeout."""
+    status_code = 503
+
+
+# A WebDriverException other than the page-level errors, which leave the
+# browser itself usable
+def browser_error(e):
+    from selenium.common.exceptions import (
+        WebDriverException, TimeoutException, NoSuchElementException, StaleElementReferenceException
+    )
+    return isinstance(e, WebDriverException) and not isinstance(
+        e, (TimeoutException, NoSuchElementException, StaleElementReferenceException))
+
+
+def chrome_options(headless=DRIVER_HEADLESS):
+    from selenium import webdriver
+    options = webdriver.ChromeOptions()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    if headless:
+        options.add_argument("--headless")
+    return options
+
+
+class DriverPool:
+    def __init__(self, max_size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES,
+                 acquire_timeout=DRIVER_ACQUIRE_TIMEOUT, page_load_timeout=120):
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self.page_load_timeout = page_load_timeout
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._uses = {}
+        self._size = 0
+        self._waiting = 0
+        self._stats = {"created": 0, "recycled": 0, "acquired": 0, "timeouts": 0,
+                       "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    def _create_driver(self):
+        from selenium import webdriver
+        driver = webdriver.Chrome(options=chrome_options())
+        driver.set_page_load_timeout(self.page_load_timeout)
+        return driver
+
+    def _healthy(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _retire(self, driver):
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Error quitting WebDriver: {e}")
+
+    def acquire(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise DriverPoolTimeout(f"No WebDriver available within {timeout:g}s")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                driver = self._idle.popleft() if self._idle else None
+                if driver is None:
+                    self._size += 1
+
+            if driver is None:
+                try:
+                    driver = self._create_driver()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._uses[id(driver)] = 0
+                    self._stats["created"] += 1
+            elif not self._healthy(driver):
+                logging.info("Discarding unhealthy WebDriver")
+                self._retire(driver)
+                with self._cond:
+                    self._size -= 1
+                    self._stats["recycled"] += 1
+                    self._cond.notify()
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._stats["acquired"] += 1
+                self._stats["wait_seconds_total"] += waited
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+            return driver
+
+    def release(self, driver, discard=False):
+        with self._cond:
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+            retire = discard or uses >= self.max_uses
+        if not retire:
+            try:
+                driver.delete_all_cookies()
+            except Exception as e:
+                from selenium.common.exceptions import WebDriverException
+                if not isinstance(e, WebDriverException):
+                    raise
+                retire = True
+        if retire:
+            self._retire(driver)
+        with self._cond:
+            if retire:
+                self._size -= 1
+                self._stats["recycled"] += 1
+            else:
+                self._idle.append(driver)
+            self._cond.notify()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        driver = self.acquire(timeout)
+        discard = False
+        try:
+            yield driver
+        except Exception as e:
+            discard = browser_error(e)
+            raise
+        finally:
+            self.release(driver, discard=discard)
+
+    def metrics(self):
+        with self._cond:
+            acquired = self._stats["acquired"]
+            return {
+                "max_size": self.max_size,
+                "in_use": self._size - len(self._idle),
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "created": self._stats["created"],
+                "recycle_count": self._stats["recycled"],
+                "acquired": acquired,
+                "timeouts": self._stats["timeouts"],
+                "wait_seconds_avg": self._stats["wait_seconds_total"] / acquired if acquired else 0.0,
+                "wait_seconds_max": self._stats["wait_seconds_max"],
+            }
+
+    def close(self):
+        with self._cond:
+            drivers = list(self._idle)
+            self._idle.clear()
+            self._size -= len(drivers)
+        for driver in drivers:
+            self._retire(driver)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = DriverPool()
+        return _default_pool
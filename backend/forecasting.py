@@ -0,0 +1,521 @@
+import os
+import time
+import json
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from price_store import typed_price_frame
+
+# Price model fitting shared by both backends, with a cache of fitted
+# parameters keyed by a fingerprint of the weekly series and the model spec.
+# A cache hit only runs the Kalman filter with the stored parameters; a miss
+# whose series extends a cached one by a few points warm-starts the optimizer
+# from the cached parameters.
+
+SEASONAL_PERIOD = 52
+FORECAST_CACHE_DIR = os.environ.get("FORECAST_CACHE_DIR", "model_cache")
+FORECAST_CACHE_ENTRIES = int(os.environ.get("FORECAST_CACHE_ENTRIES", 256))
+FORECAST_CACHE_DISK_BYTES = int(os.environ.get("FORECAST_CACHE_DISK_BYTES", 50 * 1024 * 1024))
+FORECAST_WARM_START_POINTS = int(os.environ.get("FORECAST_WARM_START_POINTS", 8))
+
+CACHE_COUNTERS = ["memory_hits", "disk_hits", "misses", "warm_starts", "stores", "evictions"]
+
+
+# SARIMA with yearly seasonality if there is at least a year of data, else ARIMA
+def model_spec(price_series):
+    if len(price_series) >= SEASONAL_PERIOD:
+        return {"model": "sarimax", "order": [1, 0, 1], "seasonal_order": [1, 0, 1, SEASONAL_PERIOD]}
+    return {"model": "arima", "order": [1, 0, 1]}
+
+
+# statsmodels is imported on first fit to keep server start-up fast
+def build_model(price_series, spec):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    from statsmodels.tsa.arima.model import ARIMA
+    if spec["model"] == "sarimax":
+        return SARIMAX(
+            price_series,
+            order=tuple(spec["order"]),
+            seasonal_order=tuple(spec["seasonal_order"]),
+            enforce_stationarity=True,
+            enforce_invertibility=True
+        )
+    return ARIMA(price_series, order=tuple(spec["order"]))
+
+
+def fit_model(model, spec, start_params=None):
+    if spec["model"] == "sarimax":
+        return model.fit(disp=False, maxiter=100, start_params=start_params)
+    return model.fit(start_params=start_params)
+
+
+def series_fingerprint(price_series, spec):
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode())
+    digest.update(np.asarray(price_series.index.asi8, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(price_series.values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class ForecastModelCache:
+    def __init__(self, cache_dir=FORECAST_CACHE_DIR, max_entries=FORECAST_CACHE_ENTRIES,
+                 max_disk_bytes=FORECAST_CACHE_DISK_BYTES, warm_start_points=FORECAST_WARM_START_POINTS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.warm_start_points = warm_start_points
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Shared memory counters so fits in forked worker processes are counted too
+        self._counters = multiprocessing.Array("q", len(CACHE_COUNTERS))
+
+    def _count(self, name):
+        with self._counters.get_lock():
+            self._counters[CACHE_COUNTERS.index(name)] += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _remember(self, key, params):
+        with self._lock:
+            self._memory[key] = params
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            params = self._memory.get(key)
+            if params is not None:
+                self._memory.move_to_end(key)
+                self._count("memory_hits")
+                return params
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                params = data["params"]
+            os.utime(path)  # Keeps the disk LRU ordering by mtime
+        except (OSError, KeyError, ValueError):
+            return None
+        self._remember(key, params)
+        self._count("disk_hits")
+        return params
+
+    # Lookup without touching the hit counters, used for warm-start candidates
+    def peek(self, key):
+        with self._lock:
+            params = self._memory.get(key)
+        if params is not None or not self.cache_dir:
+            return params
+        try:
+            with np.load(self._path(key)) as data:
+                return data["params"]
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def put(self, key, params):
+        params = np.asarray(params, dtype=np.float64)
+        self._remember(key, params)
+        self._count("stores")
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            # Created on the first write rather than at import
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(tmp_path, params=params)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write forecast cache entry: {e}")
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz") or ".tmp" in name:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+                self._count("evictions")
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._counters.get_lock():
+            stats = dict(zip(CACHE_COUNTERS, self._counters[:]))
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        with self._lock:
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+    # Fit (or restore) the model for price_series
+    def fit(self, price_series):
+        spec = model_spec(price_series)
+        model = build_model(price_series, spec)
+        key = series_fingerprint(price_series, spec)
+
+        params = self.get(key)
+        if params is not None:
+            logging.info(f"Forecast cache hit for {spec['model']} model")
+            return model.filter(params)
+
+        self._count("misses")
+        start_params = None
+        for grown in range(1, min(self.warm_start_points, len(price_series) - 1) + 1):
+            prefix = price_series.iloc[:-grown]
+            if model_spec(prefix) != spec:
+                break
+            start_params = self.peek(series_fingerprint(prefix, spec))
+            if start_params is not None:
+                logging.info(f"Warm-starting {spec['model']} fit from a series {grown} points shorter")
+                self._count("warm_starts")
+                break
+
+        fitted_model = fit_model(model, spec, start_params)
+        logging.info(f"{spec['model'].upper()} model fitted successfully")
+        self.put(key, fitted_model.params)
+        return fitted_model
+
+
+# Created at import time so forked fit workers share the counters
+_default_cache = ForecastModelCache()
+
+
+def get_forecast_cache():
+    return _default_cache
+
+
+WEEKLY_FREQS = ("W", "W-SUN")
+
+
+def check_weekly_length(weeks, full_range):
+    if full_range and weeks < 5:
+        raise ValueError("Not enough data points after filling gaps (minimum 5 required)")
+
+
+# Weekly features of scraper records in one pass over a typed price frame
+# (see price_store.typed_price_frame), for weeks ending on Sunday as pandas'
+# "W": the mean modal price, the lowest min and highest max price, the
+# standard deviation of the modal prices quoted in the week (volatility) and
+# the number of quotes. Weeks without quotes are interpolated linearly between
+# their neighbours (held flat at the ends) and have 0 observations. full_range
+# keeps only whole weeks up to the last date, as API.py has always done.
+# Raises ValueError when there is too little data.
+def weekly_price_features(records, full_range=False, min_points=10):
+    frame = typed_price_frame(records)
+    if len(frame) < min_points:
+        raise ValueError(f"Not enough data points for prediction (minimum {min_points} required)")
+    dates = frame["Date"].to_numpy()
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    # 1970-01-01 was a Thursday, so (days + 3) % 7 is 0 on Mondays and 6 on Sundays
+    week_ends = days + 6 - (days + 3) % 7
+    first, last = week_ends.min(), week_ends.max()
+    if full_range:
+        # The last whole week is the one ending on or before the last date
+        last = days.max() - (days.max() + 4) % 7
+    weeks = max((last - first) // 7 + 1, 0)
+    check_weekly_length(weeks, full_range)
+
+    week = (week_ends - first) // 7
+    if full_range and week.max() >= weeks:
+        keep = week < weeks
+        week, frame = week[keep], frame[keep]
+    modal = frame["Modal Price"].to_numpy(dtype=np.float64)
+    observations = np.bincount(week, minlength=weeks)
+    quoted = observations > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(week, weights=modal, minlength=weeks) / observations
+        variance = np.bincount(week, weights=modal * modal, minlength=weeks) / observations - mean * mean
+    lows = np.full(weeks, np.inf)
+    np.minimum.at(lows, week, frame["Min Price"].to_numpy(dtype=np.float64))
+    highs = np.full(weeks, -np.inf)
+    np.maximum.at(highs, week, frame["Max Price"].to_numpy(dtype=np.float64))
+
+    positions = np.arange(weeks)
+    columns = {}
+    for name, values in (("modal", mean), ("min", lows), ("max", highs),
+                         ("volatility", np.sqrt(np.clip(variance, 0, None)))):
+        columns[name] = values if quoted.all() else np.interp(positions, positions[quoted], values[quoted])
+    columns["observations"] = observations
+    labels = (first + 7 * positions).astype("datetime64[D]").astype(dates.dtype)
+    # Named like a resampled frame's index, or unnamed as a reindexed full range
+    index = pd.DatetimeIndex(labels, freq="W-SUN", name=None if full_range else "Date")
+    return pd.DataFrame(columns, index=index)
+
+
+# Scraper records (Date / Modal Price columns) to a gap-filled weekly mean series.
+# full_range reindexes onto a regular range from the first to the last date, as
+# API.py has always done. Raises ValueError when there is too little data.
+def weekly_price_series(df, freq="W", full_range=False, min_points=10):
+    if freq in WEEKLY_FREQS:
+        return weekly_price_features(df, full_range, min_points)["modal"].rename("Modal Price")
+
+    frame = typed_price_frame(df)
+    if len(frame) < min_points:
+        raise ValueError(f"Not enough data points for prediction (minimum {min_points} required)")
+    frame = frame.set_index("Date").sort_index()
+    series = frame["Modal Price"].astype(np.float64).resample(freq).mean()
+    if full_range:
+        series = series.reindex(pd.date_range(start=frame.index.min(), end=frame.index.max(), freq=freq))
+    series = series.interpolate(method="linear").ffill().bfill()
+    check_weekly_length(len(series), full_range)
+    return series
+
+
+# With a series_key (e.g. (state, market, commodity)) the incremental
+# forecaster below folds new points into the previous fit for that series
+def fit_price_model(price_series, cache=None, series_key=None):
+    if series_key is not None and FORECAST_INCREMENTAL:
+        return get_incremental_forecaster().fit(series_key, price_series)
+    return (cache or get_forecast_cache()).fit(price_series)
+
+
+# Horizons are served from a single get_forecast() call for the longest
+# horizon; every shorter horizon and interval band is a slice of that result.
+DEFAULT_HORIZONS = {"one_week": 1, "one_month": 4, "three_months": 12, "six_months": 24}
+DEFAULT_INTERVAL_LEVELS = [0.95]
+MAX_HORIZON_STEPS = 104
+
+
+# Accepts {"name": steps} or a list of step counts (named "<n>_weeks")
+def parse_horizons(value):
+    if value is None:
+        return dict(DEFAULT_HORIZONS)
+    if isinstance(value, dict):
+        horizons = dict(value)
+    elif isinstance(value, (list, tuple)):
+        horizons = {f"{steps}_weeks": steps for steps in value}
+    else:
+        raise ValueError("horizons must be an object of name: steps or a list of steps")
+    if not horizons:
+        raise ValueError("horizons must not be empty")
+    for name, steps in horizons.items():
+        if isinstance(steps, bool) or not isinstance(steps, int) or not 1 <= steps <= MAX_HORIZON_STEPS:
+            raise ValueError(f"Horizon '{name}' must be an integer between 1 and {MAX_HORIZON_STEPS}")
+    return horizons
+
+
+# Accepts levels as fractions (0.8) or percentages (80)
+def parse_interval_levels(value):
+    if value is None:
+        return list(DEFAULT_INTERVAL_LEVELS)
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("interval_levels must be a list")
+    levels = []
+    for level in value:
+        if isinstance(level, bool) or not isinstance(level, (int, float)):
+            raise ValueError("interval_levels must be numbers")
+        level = level / 100 if level > 1 else float(level)
+        if not 0 < level < 1:
+            raise ValueError("interval_levels must be between 0 and 1 (or 0 and 100)")
+        levels.append(level)
+    return sorted(set(levels))
+
+
+# "sarimax" fits each series on its own; "panel" is the vectorized damped-trend
+# smoother in panel_forecast.py, much cheaper when many series are fitted at once
+FORECAST_ENGINES = ("sarimax", "panel")
+FORECAST_ENGINE = os.environ.get("FORECAST_ENGINE", "sarimax")
+
+
+def parse_engine(value):
+    if value is None:
+        return FORECAST_ENGINE
+    if value not in FORECAST_ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(FORECAST_ENGINES)}")
+    return value
+
+
+def interval_label(level):
+    return f"{level * 100:g}"
+
+
+def forecast_horizons(fitted_model, last_date, horizons=None, interval_levels=None, freq="W", cap=None):
+    horizons = DEFAULT_HORIZONS if horizons is None else horizons
+    interval_levels = DEFAULT_INTERVAL_LEVELS if interval_levels is None else interval_levels
+    max_steps = max(horizons.values())
+
+    forecast = fitted_model.get_forecast(steps=max_steps)
+    # Prevent negative prices and optionally cap extreme values
+    upper_bound = np.inf if cap is None else cap
+    mean = np.clip(np.asarray(forecast.predicted_mean, dtype=float), 0, upper_bound)
+    bands = {}
+    for level in interval_levels:
+        conf_int = np.clip(np.asarray(forecast.conf_int(alpha=1 - level), dtype=float), 0, upper_bound)
+        bands[interval_label(level)] = (conf_int[:, 0], conf_int[:, 1])
+    return horizon_predictions(mean, bands, last_date, horizons, freq=freq)
+
+
+# Slice a forecast of max(horizons) steps into the per-horizon response shape.
+# bands maps an interval label to (lower, upper) arrays.
+def horizon_predictions(mean, bands, last_date, horizons, freq="W"):
+    max_steps = max(horizons.values())
+    future_dates = pd.date_range(start=last_date, periods=max_steps + 1, freq=freq)[1:].strftime("%Y-%m-%d").tolist()
+    mean = np.asarray(mean, dtype=float).tolist()
+    bands = {label: (np.asarray(lower, dtype=float).tolist(), np.asarray(upper, dtype=float).tolist())
+             for label, (lower, upper) in bands.items()}
+    predictions = {}
+    for period, steps in horizons.items():
+        predictions[period] = {
+            "dates": future_dates[:steps],
+            "predicted_prices": mean[:steps],
+        }
+        if bands:
+            predictions[period]["intervals"] = {
+                label: {"lower": lower[:steps], "upper": upper[:steps]} for label, (lower, upper) in bands.items()
+            }
+    return predictions
+
+
+# Incremental updates: the fitted results for each market series are kept and
+# new weekly observations are folded in with results.extend() (or a filter pass
+# with the stored parameters in another process) instead of re-estimating. A
+# full refit happens after FORECAST_REFIT_EVERY new points, after
+# FORECAST_REFIT_MAX_AGE_DAYS, or when the new points' standardized one-step
+# forecast errors average more than FORECAST_DRIFT_THRESHOLD.
+
+FORECAST_INCREMENTAL = os.environ.get("FORECAST_INCREMENTAL", "1") != "0"
+FORECAST_REFIT_EVERY = int(os.environ.get("FORECAST_REFIT_EVERY", 13))
+FORECAST_REFIT_MAX_AGE_DAYS = float(os.environ.get("FORECAST_REFIT_MAX_AGE_DAYS", 30))
+FORECAST_DRIFT_THRESHOLD = float(os.environ.get("FORECAST_DRIFT_THRESHOLD", 3.0))
+FORECAST_INCREMENTAL_SERIES = int(os.environ.get("FORECAST_INCREMENTAL_SERIES", 256))
+
+INCREMENTAL_COUNTERS = ["unchanged", "incremental_updates", "scheduled_refits", "drift_refits", "full_fits"]
+
+
+class IncrementalForecaster:
+    def __init__(self, cache=None, refit_every=FORECAST_REFIT_EVERY, refit_max_age_days=FORECAST_REFIT_MAX_AGE_DAYS,
+                 drift_threshold=FORECAST_DRIFT_THRESHOLD, max_series=FORECAST_INCREMENTAL_SERIES):
+        self.cache = cache or get_forecast_cache()
+        self.refit_every = refit_every
+        self.refit_max_age = refit_max_age_days * 86400
+        self.drift_threshold = drift_threshold
+        self.max_series = max_series
+        self.state_dir = os.path.join(self.cache.cache_dir, "incremental") if self.cache.cache_dir else None
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = multiprocessing.Array("q", len(INCREMENTAL_COUNTERS))
+
+    def _count(self, name):
+        with self._counters.get_lock():
+            self._counters[INCREMENTAL_COUNTERS.index(name)] += 1
+
+    def _state_path(self, series_key):
+        name = hashlib.sha256(json.dumps(list(series_key)).encode()).hexdigest()
+        return os.path.join(self.state_dir, f"{name}.npz")
+
+    def _save(self, series_key, state):
+        with self._lock:
+            self._states[series_key] = state
+            self._states.move_to_end(series_key)
+            while len(self._states) > self.max_series:
+                self._states.popitem(last=False)
+        if not self.state_dir:
+            return
+        path = self._state_path(series_key)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            np.savez(tmp_path, params=np.asarray(state["params"], dtype=np.float64),
+                     index=state["series"].index.values.astype("datetime64[ns]").view(np.int64), values=state["series"].values.astype(np.float64),
+                     meta=json.dumps({"spec": state["spec"], "appended": state["appended"],
+                                      "fitted_at": state["fitted_at"]}))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write incremental forecast state: {e}")
+
+    def _load(self, series_key, like_series):
+        with self._lock:
+            state = self._states.get(series_key)
+            if state is not None:
+                self._states.move_to_end(series_key)
+                return state
+        if not self.state_dir:
+            return None
+        try:
+            with np.load(self._state_path(series_key)) as data:
+                meta = json.loads(str(data["meta"]))
+                index = pd.DatetimeIndex(data["index"].astype("datetime64[ns]"), freq=like_series.index.freq)
+                series = pd.Series(data["values"], index=index)
+                return {"params": data["params"], "series": series, "spec": meta["spec"],
+                        "appended": meta["appended"], "fitted_at": meta["fitted_at"], "results": None}
+        except (OSError, KeyError, ValueError, TypeError):
+            return None
+
+    # None if new_series does not continue old_series, otherwise whether the
+    # last old point was revised (the current week's mean changes as days arrive)
+    @staticmethod
+    def _continuation(old_series, new_series):
+        n = len(old_series)
+        if len(new_series) < n or not new_series.index[:n].equals(old_series.index):
+            return None
+        if not np.allclose(new_series.values[:n - 1], old_series.values[:n - 1], rtol=0, atol=1e-9):
+            return None
+        return not np.isclose(new_series.values[n - 1], old_series.values[n - 1], rtol=0, atol=1e-9)
+
+    def _full_fit(self, series_key, price_series, reason):
+        self._count(reason)
+        results = self.cache.fit(price_series)
+        self._save(series_key, {"params": results.params, "series": price_series, "spec": model_spec(price_series),
+                                "appended": 0, "fitted_at": time.time(), "results": results})
+        return results
+
+    def fit(self, series_key, price_series):
+        state = self._load(series_key, price_series)
+        revised = None if state is None else self._continuation(state["series"], price_series)
+        if revised is None or model_spec(price_series) != state["spec"]:
+            return self._full_fit(series_key, price_series, "full_fits")
+
+        new_points = price_series.iloc[len(state["series"]):]
+        if len(new_points) == 0 and not revised and state["results"] is not None:
+            self._count("unchanged")
+            return state["results"]
+        if (state["appended"] + len(new_points) >= self.refit_every
+                or time.time() - state["fitted_at"] >= self.refit_max_age):
+            return self._full_fit(series_key, price_series, "scheduled_refits")
+
+        if state["results"] is not None and not revised:
+            results = state["results"].extend(new_points)
+            errors = results.standardized_forecasts_error[0]
+        else:
+            # Fitted in another process or last point revised: filter with the stored params
+            results = build_model(price_series, state["spec"]).filter(state["params"])
+            errors = results.standardized_forecasts_error[0][len(state["series"]) - int(revised):]
+        drift = float(np.nanmean(np.abs(errors))) if len(errors) else 0.0
+        if drift > self.drift_threshold:
+            logging.info(f"Forecast drift {drift:.2f} for {series_key} exceeds {self.drift_threshold}, refitting")
+            return self._full_fit(series_key, price_series, "drift_refits")
+
+        self._count("incremental_updates" if len(new_points) or revised else "unchanged")
+        self._save(series_key, {**state, "series": price_series, "results": results,
+                                "appended": state["appended"] + len(new_points)})
+        return results
+
+    def stats(self):
+        with self._counters.get_lock():
+            return dict(zip(INCREMENTAL_COUNTERS, self._counters[:]))
+
+
+_default_incremental = IncrementalForecaster(_default_cache)
+
+
+def get_incremental_forecaster():
+    return _default_incremental
@@ -0,0 +1,258 @@
+import os
+import re
+import time
+import queue
+import atexit
+import bisect
+import cProfile
+import logging
+import threading
+import multiprocessing
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# Stage timing, profiling and logging for the request paths.
+#
+# span(stage) times one pipeline stage (scrape, parse, preprocess, fit, ...)
+# into the latency histograms served as Prometheus text by /metrics. Work that
+# runs on a job pool collects its spans with collect_spans() and hands them
+# back to the parent process, which records them with observe_spans(), so
+# stages run in fit worker processes are counted too. With PROFILE_REQUESTS
+# set, stages run under cProfile and the stats are written to PROFILE_DIR.
+# setup_logging() moves log writes onto a background thread.
+
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "off")  # "off", "all" or "header" (X-Profile: 1)
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # collector() returns {metric name: number}, exported as gauges
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            histograms = sorted((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), counts, total, count, buckets in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {e}")
+                continue
+            for name, value in sorted(gauges.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+                declare(name, "gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+_default_registry = MetricsRegistry()
+_default_registry.describe("pipeline_stage_seconds", "Time spent in each price pipeline stage")
+_default_registry.describe("http_request_seconds", "HTTP request latency by endpoint")
+_default_registry.describe("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def get_metrics():
+    return _default_registry
+
+
+# Spans
+
+_collector = contextvars.ContextVar("span_collector", default=None)
+
+
+def observe_spans(spans):
+    for stage, seconds in spans:
+        _default_registry.observe("pipeline_stage_seconds", seconds, stage=stage)
+
+
+def record_span(stage, seconds):
+    collected = _collector.get()
+    if collected is None:
+        observe_spans([(stage, seconds)])
+    else:
+        collected.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+
+# Iterate while timing only the time spent producing items (e.g. a streaming
+# parser consumed by a database writer). The time is summed over the whole
+# iteration and recorded as one span once it is exhausted or closed.
+def timed_iter(stage, iterable):
+    iterator = iter(iterable)
+    seconds = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - started
+            yield item
+    finally:
+        record_span(stage, seconds)
+
+
+# Spans inside the block are gathered into the yielded list instead of being
+# recorded, e.g. to send them back from a worker process
+@contextmanager
+def collect_spans():
+    spans = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+
+# Profiling
+
+def profiling_requested(headers=None):
+    if PROFILE_REQUESTS == "all":
+        return True
+    return PROFILE_REQUESTS == "header" and headers is not None and headers.get("X-Profile") == "1"
+
+
+# Runs the block under cProfile when name is set, writing PROFILE_DIR/<name>.prof
+@contextmanager
+def profiled(name=None):
+    if not name:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.prof")
+        profiler.dump_stats(path)
+        logging.info(f"Wrote profile to '{path}'")
+
+
+# Run fn(*args, **kwargs) on a job pool, returning (result, spans); with
+# profile_name the call is profiled. Module-level so process pools can pickle it.
+def traced_call(fn, *args, profile_name=None, **kwargs):
+    with collect_spans() as spans, profiled(profile_name):
+        result = fn(*args, **kwargs)
+    return result, spans
+
+
+# Logging
+
+class DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _default_registry.increment("log_records_dropped_total")
+
+
+_listener = None
+
+
+# Log records are queued by the calling thread and written to filename by a
+# listener thread, so request threads never wait on file I/O. When the queue is
+# full, records are dropped and counted rather than blocking. The queue is a
+# multiprocessing one: forked pool workers (the fit pool, batch forecasts)
+# inherit the handler and their records are written by this process' listener.
+def setup_logging(filename, level=logging.INFO, fmt="%(asctime)s - %(levelname)s - %(message)s"):
+    global _listener
+    if _listener is not None:
+        return _listener
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter(fmt))
+    log_queue = multiprocessing.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,204 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Background jobs for price prediction. Each job runs a scrape stage on a
+# bounded thread pool (I/O bound) and then a fit stage on a bounded process
+# pool (CPU bound SARIMAX fitting). Identical in-flight requests share one job.
+# A fit worker dying (e.g. killed for memory) breaks the whole process pool, so
+# the pool is replaced and the fits it lost are retried FIT_RETRIES times.
+
+SCRAPE_WORKERS = int(os.environ.get("PRICE_SCRAPE_WORKERS", 4))
+FIT_WORKERS = int(os.environ.get("PRICE_FIT_WORKERS", os.cpu_count() or 1))
+FIT_EXECUTOR = os.environ.get("PRICE_FIT_EXECUTOR", "process")  # "process" or "thread"
+MAX_PENDING_JOBS = int(os.environ.get("PRICE_MAX_PENDING_JOBS", 64))
+JOB_TTL_SECONDS = int(os.environ.get("PRICE_JOB_TTL_SECONDS", 3600))
+FIT_RETRIES = int(os.environ.get("PRICE_FIT_RETRIES", 1))
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already pending."""
+    status_code = 503
+
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.status_code = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Resolved with the job itself once it is done or failed
+        self.future = Future()
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def set_status(self, status, status_code=None, result=None, error=None):
+        with self._changed:
+            self.status = status
+            self.status_code = status_code
+            self.result = result
+            self.error = error
+            self.updated_at = time.time()
+            self._changed.notify_all()
+        if self.finished:
+            self.future.set_result(self)
+
+    # Block until the status changes from last_status (or the job finishes)
+    def wait_for_change(self, last_status, timeout=None):
+        with self._changed:
+            self._changed.wait_for(lambda: self.status != last_status or self.finished, timeout)
+            return self.status
+
+    def wait(self, timeout=None):
+        return self.future.result(timeout)
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if self.finished:
+            data["status_code"] = self.status_code
+            if self.error:
+                data["error"] = self.error
+            else:
+                data["result"] = self.result
+        return data
+
+
+class JobManager:
+    def __init__(self, scrape_workers=SCRAPE_WORKERS, fit_workers=FIT_WORKERS,
+                 fit_executor=FIT_EXECUTOR, max_pending=MAX_PENDING_JOBS, ttl=JOB_TTL_SECONDS,
+                 fit_retries=FIT_RETRIES):
+        self.scrape_pool = ThreadPoolExecutor(max_workers=scrape_workers, thread_name_prefix="scrape")
+        self.fit_workers = fit_workers
+        self.fit_executor = fit_executor
+        self.fit_pool = self._create_fit_pool()
+        self._fit_pool_lock = threading.Lock()
+        self.fit_retries = fit_retries
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._in_flight = {}
+
+    def _create_fit_pool(self):
+        if self.fit_executor == "process":
+            return ProcessPoolExecutor(max_workers=self.fit_workers)
+        return ThreadPoolExecutor(max_workers=self.fit_workers, thread_name_prefix="fit")
+
+    # Run fn(*args) on the fit pool. A broken process pool rejects every
+    # submit, so it is replaced by a new one and the submit goes there.
+    def submit_fit(self, fn, *args):
+        with self._fit_pool_lock:
+            try:
+                return self.fit_pool.submit(fn, *args)
+            except BrokenProcessPool:
+                logging.warning("Fit pool is broken (a worker died); starting a new one")
+                self.fit_pool = self._create_fit_pool()
+                return self.fit_pool.submit(fn, *args)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    # Submit a scrape -> fit job, or return the in-flight job for the same key.
+    # scrape_fn(*scrape_args) runs on the thread pool; fit_fn(data) runs on the
+    # fit pool and must be picklable for the process executor; finish_fn(data,
+    # fit_result) returns (status_code, body). A falsy scrape result skips the
+    # fit stage and goes straight to finish_fn(data, None).
+    def submit(self, key, scrape_fn, scrape_args, fit_fn, finish_fn):
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                logging.info(f"Coalescing request for {key} into job {job.id}")
+                return job
+            if len(self._in_flight) >= self.max_pending:
+                raise JobQueueFull(f"Too many pending price jobs ({self.max_pending})")
+            self._purge_expired()
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+
+        def finish(status_code, body):
+            with self._lock:
+                self._in_flight.pop(key, None)
+            if status_code >= 400:
+                job.set_status("failed", status_code, error=body.get("error", "Job failed"))
+            else:
+                job.set_status("done", status_code, result=body)
+
+        def fail(e):
+            logging.error(f"Job {job.id} for {key} failed: {e}")
+            finish(getattr(e, "status_code", 500), {"error": str(e)})
+
+        # Fits lost to a broken pool are submitted again; a fit that keeps
+        # killing its worker fails only this job
+        def fit(data, attempt=0):
+            self.submit_fit(fit_fn, data).add_done_callback(lambda f: after_fit(data, attempt, f))
+
+        def after_fit(data, attempt, future):
+            try:
+                try:
+                    fitted = future.result()
+                except BrokenProcessPool as e:
+                    if attempt >= self.fit_retries:
+                        raise
+                    logging.warning(f"Job {job.id} for {key} lost its fit worker ({e}); retrying")
+                    fit(data, attempt + 1)
+                    return
+                finish(*finish_fn(data, fitted))
+            except Exception as e:
+                fail(e)
+
+        def after_scrape(future):
+            try:
+                data = future.result()
+                if not data:
+                    finish(*finish_fn(data, None))
+                    return
+                job.set_status("fitting")
+                fit(data)
+            except Exception as e:
+                fail(e)
+
+        def scrape():
+            job.set_status("scraping")
+            return scrape_fn(*scrape_args)
+
+        self.scrape_pool.submit(scrape).add_done_callback(after_scrape)
+        return job
+
+    def shutdown(self):
+        self.scrape_pool.shutdown(wait=False, cancel_futures=True)
+        self.fit_pool.shutdown(wait=False, cancel_futures=True)
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = JobManager()
+        return _default_manager
@@ -0,0 +1,177 @@
+import io
+import json
+import struct
+import pickle
+import zipfile
+import numpy as np
+
+# Memory-mapped model artifacts. An artifact is an ordinary uncompressed .npz
+# (np.load can still read it) whose members are padded so every array's data
+# starts on a 64-byte boundary. np.load cannot memory-map .npz members, so
+# read_artifact maps each member directly at its offset in the file: loading
+# is a file map, and every process sharing the file shares one page-cached copy.
+
+ALIGNMENT = 64
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")  # 30-byte zip local file header
+PADDING_EXTRA_ID = 0xD935  # zip extra field id used for alignment padding (as in zipalign)
+
+
+def write_artifact(path, arrays, manifest):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+        members = {"manifest": np.frombuffer(json.dumps(manifest, sort_keys=True).encode(), dtype=np.uint8)}
+        members.update(arrays)
+        for name, array in members.items():
+            array = np.asarray(array)
+            if array.dtype.hasobject:
+                raise ValueError(f"Artifact member '{name}' must not hold Python objects")
+            buffer = io.BytesIO()
+            np.lib.format.write_array(buffer, np.ascontiguousarray(array), allow_pickle=False)
+
+            info = zipfile.ZipInfo(f"{name}.npy", date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_STORED
+            # npy headers are already padded to a multiple of 64 bytes, so
+            # aligning the member's data aligns the array data too
+            header_end = zf.fp.tell() + ZIP_LOCAL_HEADER.size + len(info.filename.encode()) + 4
+            padding = -header_end % ALIGNMENT
+            info.extra = struct.pack("<HH", PADDING_EXTRA_ID, padding) + b"\0" * padding
+            zf.writestr(info, buffer.getvalue())
+
+
+def read_manifest(arrays):
+    return json.loads(bytes(arrays["manifest"]).decode())
+
+
+# {member name: read-only array}, memory-mapped unless mmap is False
+def read_artifact(path, mmap=True):
+    arrays = {}
+    with open(path, "rb") as f, zipfile.ZipFile(f) as zf:
+        for info in zf.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Artifact member '{name}' is compressed and cannot be mapped")
+            f.seek(info.header_offset)
+            header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+            f.seek(info.header_offset + ZIP_LOCAL_HEADER.size + header[-2] + header[-1])
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"Artifact member '{name}' holds Python objects")
+            if mmap and shape and np.prod(shape) > 0:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran_order else "C")
+            else:
+                count = int(np.prod(shape))
+                data = np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype, count=count)
+                arrays[name] = data.reshape(shape, order="F" if fortran_order else "C")
+    return arrays
+
+
+# Random forest stored as flat node arrays instead of pickled estimators.
+# Child indices are global across trees and class probabilities are only kept
+# for leaves; predict_proba matches sklearn's RandomForestClassifier.
+class CompactForest:
+    def __init__(self, classes, roots, children_left, children_right, feature, threshold, leaf_index, leaf_proba,
+                 feature_names=None):
+        self.classes_ = classes
+        self.roots = roots
+        self.children_left = children_left
+        self.children_right = children_right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_index = leaf_index
+        self.leaf_proba = leaf_proba
+        self.feature_names_in_ = feature_names
+
+    @classmethod
+    def supports(cls, model):
+        estimators = getattr(model, "estimators_", None)
+        return (type(model).__name__ in ("RandomForestClassifier", "ExtraTreesClassifier")
+                and estimators is not None and getattr(model, "n_outputs_", 1) == 1)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        roots, lefts, rights, features, thresholds, leaf_index, leaf_proba = [], [], [], [], [], [], []
+        offset = leaves = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            index = np.full(tree.node_count, -1)
+            index[is_leaf] = np.arange(leaves, leaves + is_leaf.sum())
+            leaf_index.append(index)
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            proba = tree.value[is_leaf, 0, :].astype(np.float64)
+            normalizer = proba.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0] = 1
+            leaf_proba.append(proba / normalizer)
+            offset += tree.node_count
+            leaves += int(is_leaf.sum())
+        names = getattr(model, "feature_names_in_", None)
+        return cls(
+            np.asarray(model.classes_).astype(str),
+            np.asarray(roots, dtype=np.int32),
+            np.concatenate(lefts).astype(np.int32),
+            np.concatenate(rights).astype(np.int32),
+            np.concatenate(features).astype(np.int16),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(leaf_index).astype(np.int32),
+            np.concatenate(leaf_proba),
+            None if names is None else np.asarray(names).astype(str),
+        )
+
+    def to_arrays(self, prefix):
+        arrays = {f"{prefix}{name}": getattr(self, name) for name in
+                  ("roots", "children_left", "children_right", "feature", "threshold", "leaf_index", "leaf_proba")}
+        arrays[f"{prefix}classes"] = self.classes_
+        if self.feature_names_in_ is not None:
+            arrays[f"{prefix}feature_names"] = self.feature_names_in_
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        return cls(arrays[f"{prefix}classes"], *(arrays[f"{prefix}{name}"] for name in
+                   ("roots", "children_left", "children_right", "feature", "threshold", "leaf_index", "leaf_proba")),
+                   arrays.get(f"{prefix}feature_names"))
+
+    def predict_proba(self, X):
+        if self.feature_names_in_ is not None and hasattr(X, "columns"):
+            X = X[list(self.feature_names_in_)]
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        samples = np.arange(len(X))
+        nodes = np.repeat(np.asarray(self.roots)[:, None], len(X), axis=1)
+        while True:
+            left = self.children_left[nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[samples, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.children_right[nodes]), nodes)
+        return self.leaf_proba[self.leaf_index[nodes]].mean(axis=0)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+# Classifier <-> artifact arrays: tree forests become a CompactForest, any
+# other estimator is kept as pickled bytes (loaded with an unpickle)
+def classifier_to_arrays(model, prefix="classifier_"):
+    if CompactForest.supports(model):
+        return "compact_forest", CompactForest.from_sklearn(model).to_arrays(prefix)
+    return "pickle", {f"{prefix}pickle": np.frombuffer(pickle.dumps(model), dtype=np.uint8)}
+
+
+def classifier_from_arrays(kind, arrays, prefix="classifier_"):
+    if kind == "compact_forest":
+        return CompactForest.from_arrays(arrays, prefix)
+    if kind == "pickle":
+        return pickle.loads(bytes(arrays[f"{prefix}pickle"]))
+    raise ValueError(f"Unknown classifier format: {kind}")
@@ -0,0 +1,133 @@
+import os
+import gc
+import time
+import logging
+import threading
+
+# Models and heavy modules loaded once per process and shared by every request.
+# MODEL_WARMUP picks when they load:
+#   "eager"      load everything at start-up. With a preloading forking server
+#                (e.g. gunicorn --preload) this happens in the parent, and the
+#                workers share the loaded objects copy-on-write.
+#   "background" start serving at once and load in a thread (default)
+#   "lazy"       load each entry on first use
+# An entry registered with watch paths is reloaded when one of those files
+# changes, checked at most every MODEL_WATCH_SECONDS.
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "background")
+MODEL_WATCH_SECONDS = float(os.environ.get("MODEL_WATCH_SECONDS", 5))
+
+
+# (mtime, size) of each path, None for a missing file
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._status = {}
+        self._watched = {}
+        self._load_lock = threading.Lock()
+        # Separate so status() answers while a slow load holds the load lock
+        self._status_lock = threading.Lock()
+        self._warmed_up = threading.Event()
+        self.mode = None
+
+    def register(self, name, loader, watch=()):
+        self._loaders[name] = loader
+        if watch:
+            self._watched[name] = {"paths": list(watch), "signature": None, "next_check": 0.0}
+        self._set_status(name, {"loaded": False})
+
+    def _set_status(self, name, status):
+        with self._status_lock:
+            self._status[name] = status
+
+    # The loaded entry, or None if its loader failed (retried on the next call)
+    def get(self, name):
+        if name in self._models:
+            if self._source_changed(name):
+                with self._load_lock:
+                    self._load(name)
+            return self._models[name]
+        with self._load_lock:
+            if name in self._models:
+                return self._models[name]
+            return self._load(name)
+
+    # Called with the load lock held. If a reload fails, the loaded entry stays.
+    def _load(self, name):
+        watch = self._watched.get(name)
+        if watch:
+            watch["signature"] = file_signature(watch["paths"])
+        started = time.perf_counter()
+        try:
+            model = self._loaders[name]()
+        except Exception as e:
+            logging.error(f"Loading '{name}' failed: {e}")
+            if name in self._models:
+                return self._models[name]
+            self._set_status(name, {"loaded": False, "error": str(e)})
+            return None
+        self._models[name] = model
+        seconds = round(time.perf_counter() - started, 3)
+        self._set_status(name, {"loaded": True, "seconds": seconds})
+        logging.info(f"Loaded '{name}' in {seconds}s")
+        return model
+
+    def _source_changed(self, name):
+        watch = self._watched.get(name)
+        now = time.monotonic()
+        with self._status_lock:
+            if watch is None or now < watch["next_check"]:
+                return False
+            watch["next_check"] = now + MODEL_WATCH_SECONDS
+        if file_signature(watch["paths"]) == watch["signature"]:
+            return False
+        logging.info(f"'{name}' changed on disk; reloading")
+        return True
+
+    def warm_up(self, freeze=False):
+        for name in list(self._loaders):
+            self.get(name)
+        if freeze:
+            # Keep the cyclic GC from touching (and so copying) the loaded
+            # objects' pages in forked workers
+            gc.freeze()
+        self._warmed_up.set()
+
+    def start(self, mode=MODEL_WARMUP):
+        self.mode = mode
+        if mode == "eager":
+            self.warm_up(freeze=True)
+        elif mode == "background":
+            threading.Thread(target=self.warm_up, name="model-warmup", daemon=True).start()
+        else:
+            self._warmed_up.set()
+
+    # Ready once warm-up has finished and every entry that was tried loaded
+    def status(self):
+        with self._status_lock:
+            models = {name: dict(status) for name, status in self._status.items()}
+        warmed_up = self._warmed_up.is_set()
+        return {
+            "ready": warmed_up and not any("error" in status for status in models.values()),
+            "warmed_up": warmed_up,
+            "mode": self.mode,
+            "models": models,
+        }
+
+
+_default_registry = ModelRegistry()
+
+
+def get_model_registry():
+    return _default_registry
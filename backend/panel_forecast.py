@@ -0,0 +1,99 @@
+import os
+from statistics import NormalDist
+import numpy as np
+from forecasting import DEFAULT_HORIZONS, DEFAULT_INTERVAL_LEVELS, horizon_predictions, interval_label
+
+# Vectorized panel forecaster. Weekly series are right-aligned into one 2-D
+# array (series x weeks, NaN before each series starts) and every series gets
+# a damped additive-trend exponential smoother. The smoothing parameters are
+# picked per series from a small grid by one-step-ahead squared error, with
+# all grid points and all series updated together in a single pass over time.
+
+PANEL_ALPHAS = np.array([0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+PANEL_BETAS = np.array([0.0, 0.05, 0.1, 0.2])
+PANEL_DAMPING = float(os.environ.get("PANEL_DAMPING", 0.9))
+
+
+def stack_series(price_series_list):
+    length = max(len(series) for series in price_series_list)
+    panel = np.full((len(price_series_list), length), np.nan)
+    for row, series in enumerate(price_series_list):
+        panel[row, length - len(series):] = np.asarray(series, dtype=float)
+    return panel
+
+
+class PanelFit:
+    """Per-series damped-trend states and parameters for a stacked panel."""
+
+    def __init__(self, level, trend, alpha, beta, phi, sigma):
+        self.level = level
+        self.trend = trend
+        self.alpha = alpha
+        self.beta = beta
+        self.phi = phi
+        self.sigma = sigma
+
+    # Mean forecasts, shape (series, steps)
+    def forecast(self, steps):
+        damping = np.cumsum(self.phi ** np.arange(1, steps + 1))
+        return self.level[:, None] + damping[None, :] * self.trend[:, None]
+
+    # Forecast standard errors of the ETS(A,Ad,N) model, shape (series, steps)
+    def forecast_std(self, steps):
+        damping = np.cumsum(self.phi ** np.arange(1, steps))
+        c = self.alpha[:, None] * (1 + self.beta[:, None] * damping[None, :])
+        variance = np.concatenate([np.ones((len(self.sigma), 1)), 1 + np.cumsum(c ** 2, axis=1)], axis=1)
+        return self.sigma[:, None] * np.sqrt(variance)
+
+
+def fit_panel(panel, alphas=PANEL_ALPHAS, betas=PANEL_BETAS, phi=PANEL_DAMPING):
+    grid_alpha, grid_beta = (g.ravel()[:, None] for g in np.meshgrid(alphas, betas, indexing="ij"))
+    n_series, n_weeks = panel.shape
+    level = np.full((len(grid_alpha), n_series), np.nan)
+    trend = np.zeros_like(level)
+    sse = np.zeros_like(level)
+    observations = np.zeros(n_series)
+
+    for week in range(n_weeks):
+        y = panel[:, week]
+        observed = ~np.isnan(y)
+        started = observed & ~np.isnan(level[0])
+        error = np.where(started, y - (level + phi * trend), 0.0)
+        # Error-correction form: l = l + phi*b + alpha*e, b = phi*b + alpha*beta*e
+        level = np.where(started, level + phi * trend + grid_alpha * error, np.where(observed, y, level))
+        trend = np.where(started, phi * trend + grid_alpha * grid_beta * error, trend)
+        sse += error ** 2
+        observations += started
+
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(n_series)
+    sigma = np.sqrt(sse[best, columns] / np.maximum(observations, 1))
+    return PanelFit(level[best, columns], trend[best, columns], grid_alpha[best, 0], grid_beta[best, 0], phi, sigma)
+
+
+# Forecast every weekly series in one vectorized fit. Returns one predictions
+# dict per series in the same shape as forecasting.forecast_horizons(); caps is
+# an optional per-series upper bound (None for no cap).
+def forecast_panel(price_series_list, horizons=None, interval_levels=None, freq="W", caps=None):
+    horizons = DEFAULT_HORIZONS if horizons is None else horizons
+    interval_levels = DEFAULT_INTERVAL_LEVELS if interval_levels is None else interval_levels
+    steps = max(horizons.values())
+
+    fit = fit_panel(stack_series(price_series_list))
+    upper_bound = np.full(len(price_series_list), np.inf) if caps is None else \
+        np.array([np.inf if cap is None else cap for cap in caps], dtype=float)
+    upper_bound = upper_bound[:, None]
+    mean = fit.forecast(steps)
+    std = fit.forecast_std(steps)
+
+    bands = {}
+    for level in interval_levels:
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        bands[interval_label(level)] = (np.clip(mean - z * std, 0, upper_bound), np.clip(mean + z * std, 0, upper_bound))
+    mean = np.clip(mean, 0, upper_bound)
+
+    return [
+        horizon_predictions(mean[row], {label: (lower[row], upper[row]) for label, (lower, upper) in bands.items()},
+                            series.index[-1], horizons, freq=freq)
+        for row, series in enumerate(price_series_list)
+    ]
@@ -0,0 +1,108 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# bcrypt hashing and verification for the auth endpoints, run on a small
+# dedicated thread pool. bcrypt releases the GIL while hashing, so the pool
+# size caps how many cores a login spike can take from the other endpoints.
+# Request threads only wait on the result.
+
+BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+BCRYPT_MAX_PENDING = int(os.environ.get("BCRYPT_MAX_PENDING", 64))
+BCRYPT_TIMEOUT = float(os.environ.get("BCRYPT_TIMEOUT", 30))
+# Retry-After (seconds) sent with the 503 when hashing is saturated or times out
+BCRYPT_RETRY_AFTER = int(os.environ.get("BCRYPT_RETRY_AFTER", 5))
+
+HASH_COST = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class HashingQueueFull(Exception):
+    """Raised when too many hashing requests are already queued."""
+    status_code = 503
+
+
+def hash_cost(pw_hash):
+    match = HASH_COST.match(pw_hash.decode() if isinstance(pw_hash, bytes) else pw_hash or "")
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    def __init__(self, bcrypt, log_rounds=BCRYPT_LOG_ROUNDS, workers=BCRYPT_WORKERS,
+                 max_pending=BCRYPT_MAX_PENDING, timeout=BCRYPT_TIMEOUT):
+        self.bcrypt = bcrypt
+        self.log_rounds = log_rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._stats = {"queued": 0, "running": 0, "max_queued": 0, "completed": 0, "rejected": 0,
+                       "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "work_seconds_total": 0.0}
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._stats["queued"] >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise HashingQueueFull(f"Too many pending password hashing requests ({self.max_pending})")
+            self._stats["queued"] += 1
+            self._stats["max_queued"] = max(self._stats["max_queued"], self._stats["queued"])
+        submitted = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            with self._lock:
+                self._stats["queued"] -= 1
+                self._stats["running"] += 1
+                self._stats["wait_seconds_total"] += started - submitted
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._stats["running"] -= 1
+                    self._stats["completed"] += 1
+                    self._stats["work_seconds_total"] += time.monotonic() - started
+
+        future = self._executor.submit(task)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            # Still queued: drop it rather than hash for a request that gave up
+            if future.cancel():
+                with self._lock:
+                    self._stats["queued"] -= 1
+            raise
+
+    def hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password, self.log_rounds).decode("utf-8")
+
+    def check(self, pw_hash, password):
+        try:
+            return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+        except ValueError:
+            # Not a bcrypt hash
+            return False
+
+    # Hashes stored at another cost are rehashed on the next successful login
+    def needs_rehash(self, pw_hash):
+        return hash_cost(pw_hash) != self.log_rounds
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        completed = stats["completed"]
+        return {
+            "queue_depth": stats["queued"],
+            "running": stats["running"],
+            "max_queue_depth": stats["max_queued"],
+            "completed": completed,
+            "rejected": stats["rejected"],
+            "wait_seconds_avg": stats["wait_seconds_total"] / completed if completed else 0.0,
+            "wait_seconds_max": stats["wait_seconds_max"],
+            "hash_seconds_avg": stats["work_seconds_total"] / completed if completed else 0.0,
+            "workers": self.workers,
+            "log_rounds": self.log_rounds,
+        }
@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+from functools import partial
+import pandas as pd
+from price_store import get_price_store
+from forecasting import (
+    fit_price_model, forecast_horizons, weekly_price_series, parse_horizons, parse_interval_levels, parse_engine,
+    get_forecast_cache, get_incremental_forecaster, FORECAST_ENGINES
+)
+from panel_forecast import forecast_panel
+from jobs import get_job_manager
+from driver_pool import DriverPoolTimeout, get_driver_pool
+from agmarknet_http import FETCH_ENGINE, AgmarknetError, fetch_market_prices_http, PriceGridNotFound, price_grid_rows
+from instrumentation import span, timed_iter, collect_spans, observe_spans, profiled, traced_call, get_metrics
+
+# Market price pipeline shared by server.py (Flask) and API.py (FastAPI):
+# fetch (price store first, then agmarknet over HTTP with Selenium as the
+# fallback), preprocess to a weekly series, and forecast. The frontends only
+# translate requests and errors; the price store, forecast caches, WebDriver
+# pool and job pools are owned here. Each stage is timed with an
+# instrumentation span (scrape, page_load, form_wait, parse, load, preprocess,
+# fit, forecast). Running this module directly times the pipeline without
+# either web framework.
+
+AGMARKNET_URL = "https://agmarknet.gov.in/"
+PRICE_HISTORY_DAYS = 3 * 365
+# Last day of the history window: YYYY-MM-DD, or "today"
+PRICE_TO_DATE = os.environ.get("PRICE_TO_DATE", "2025-04-03")
+# Forecasts are capped at this multiple of the highest historical weekly price
+FORECAST_CAP_MULTIPLE = 2
+
+
+def price_window(to_date=PRICE_TO_DATE):
+    to_date = datetime.combine(datetime.today().date(), datetime.min.time()) if to_date == "today" \
+        else datetime.strptime(to_date, "%Y-%m-%d")
+    return to_date - timedelta(days=PRICE_HISTORY_DAYS), to_date
+
+
+# Fetch
+
+def close_popup(driver):
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+    try:
+        popup = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CLASS_NAME, "popup-onload")))
+        popup.find_element(By.CLASS_NAME, "close").click()
+        logging.info("Popup closed")
+    except (NoSuchElementException, TimeoutException):
+        logging.info("No popup found or failed to close")
+
+
+# The fixed waits for the form's postbacks, timed separately from the scrape
+def form_wait(seconds):
+    with span("form_wait"):
+        time.sleep(seconds)
+
+
+# Records for one market and date range: a list, or an iterator streamed from
+# the results grid (timed as "parse" while it is consumed). [] when nothing
+# could be fetched.
+def fetch_market_prices(state, commodity, market, from_date, to_date, max_retries=3):
+    with span("scrape"):
+        rows = scrape_market_prices(state, commodity, market, from_date, to_date, max_retries)
+    return timed_iter("parse", rows) if rows else rows
+
+
+def scrape_market_prices(state, commodity, market, from_date, to_date, max_retries=3):
+    if FETCH_ENGINE == "http":
+        try:
+            return fetch_market_prices_http(state, commodity, market, from_date, to_date)
+        except AgmarknetError as e:
+            logging.warning(f"{e}; falling back to Selenium")
+
+    # Selenium is only imported once a scrape actually needs the browser
+    from selenium.webdriver.support.ui import Select, WebDriverWait
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+
+    pool = get_driver_pool()
+    for attempt in range(max_retries):
+        try:
+            with pool.driver() as driver:
+                logging.info(f"Attempt {attempt + 1}/{max_retries}: Loading URL: {AGMARKNET_URL}")
+                with span("page_load"):
+                    driver.get(AGMARKNET_URL)
+                    close_popup(driver)
+
+                logging.info(f"Fetching data for {commodity} in {state}, {market}")
+                WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.ID, "ddlCommodity")))
+                try:
+                    Select(driver.find_element(By.ID, "ddlCommodity")).select_by_visible_text(commodity)
+                    Select(driver.find_element(By.ID, "ddlState")).select_by_visible_text(state)
+                    form_wait(2)
+                    market_dropdown = Select(driver.find_element(By.ID, "ddlMarket"))
+                except NoSuchElementException:
+                    logging.error(f"Commodity '{commodity}' or state '{state}' not available")
+                    return []
+
+                available_markets = [opt.text.strip() for opt in market_dropdown.options if opt.text.strip()]
+                matched_market = next((opt for opt in available_markets if opt.lower() == market.strip().lower()), None)
+                if not matched_market:
+                    logging.error(f"Market '{market}' not found in dropdown. Available options: {available_markets}")
+                    return []
+                market_dropdown.select_by_visible_text(matched_market)
+                form_wait(2)
+
+                for field_id, value in (("txtDate", from_date), ("txtDateTo", to_date)):
+                    date_input = driver.find_element(By.ID, field_id)
+                    date_input.clear()
+                    date_input.send_keys(value.strftime("%d-%b-%Y"))
+                    form_wait(2)
+
+                driver.find_element(By.ID, "btnGo").click()
+                try:
+                    with span("results_wait"):
+                        WebDriverWait(driver, 60).until(
+                            EC.presence_of_element_located((By.ID, "cphBody_GridPriceData")))
+                except TimeoutException:
+                    logging.error("Timeout waiting for price table")
+                    with open("timeout_page.html", "w", encoding="utf-8") as f:
+                        f.write(driver.page_source)
+                    logging.info("Saved page source to 'timeout_page.html' for debugging")
+                    return []
+
+                try:
+                    return price_grid_rows(driver.page_source, market, state)
+                except PriceGridNotFound:
+                    logging.warning(f"No price table found for {market}")
+                    return []
+        except DriverPoolTimeout:
+            raise
+        except (WebDriverException, NoSuchElementException) as e:
+            logging.error(f"Attempt {attempt + 1} failed: {e}")
+            if attempt + 1 < max_retries:
+                time.sleep(5)
+                continue
+            logging.error("All retries failed")
+            return []
+        except Exception as e:
+            logging.error(f"Unexpected error in fetch_market_prices: {e}")
+            return []
+
+
+# Serve prices from the local store, scraping only missing date ranges
+def load_market_data(state, commodity, market, from_date, to_date):
+    with span("load"):
+        data = get_price_store().get_or_fetch(fetch_market_prices, state, commodity, market, from_date, to_date)
+    logging.info(f"Loaded {len(data)} records for {commodity} in {state}, {market}")
+    return data
+
+
+# Preprocess and forecast
+
+# Weekly means over the full date range, gaps interpolated. Raises ValueError
+# when there is too little data.
+def preprocess(df, freq="W"):
+    with span("preprocess"):
+        price_series = weekly_price_series(df, freq=freq, full_range=True)
+    logging.info(f"Processed data points after resampling: {len(price_series)}")
+    return price_series
+
+
+# SARIMA with yearly seasonality if enough data, else ARIMA, with fitted
+# parameters reused from the forecast caches; or the vectorized panel smoother.
+# Prices are kept non-negative and capped at FORECAST_CAP_MULTIPLE x the max.
+def forecast(price_series, series_key=None, horizons=None, interval_levels=None, engine="sarimax", freq="W"):
+    cap = price_series.max() * FORECAST_CAP_MULTIPLE
+    if engine == "panel":
+        # Fitted and forecast in one vectorized pass
+        with span("forecast"):
+            return forecast_panel([price_series], horizons, interval_levels, freq=freq, caps=[cap])[0]
+    with span("fit"):
+        fitted_model = fit_price_model(price_series, series_key=series_key)
+    # One forecast for the longest horizon, sliced per horizon
+    with span("forecast"):
+        return forecast_horizons(fitted_model, price_series.index[-1], horizons, interval_levels, freq=freq, cap=cap)
+
+
+def preprocess_and_predict(df, freq="W", series_key=None, horizons=None, interval_levels=None, engine="sarimax"):
+    try:
+        price_series = preprocess(df, freq=freq)
+    except ValueError as e:
+        return {"error": str(e)}
+    try:
+        return forecast(price_series, series_key, horizons, interval_levels, engine, freq=freq)
+    except Exception as e:
+        logging.error(f"Model fitting failed: {e}")
+        return {"error": f"Model fitting failed: {str(e)}"}
+
+
+def predict_from_records(records, series_key=None, horizons=None, interval_levels=None, engine="sarimax"):
+    return preprocess_and_predict(pd.DataFrame(records), series_key=series_key,
+                                  horizons=horizons, interval_levels=interval_levels, engine=engine)
+
+
+# Jobs
+
+# Price prediction job for one market: scraping runs on the job manager's
+# thread pool and model fitting on its process pool. horizons ({"name": weeks}
+# or [weeks, ...]), interval_levels ([0.8, 0.95]) and engine ("sarimax" or
+# "panel") are validated here (ValueError); JobQueueFull when too many jobs
+# are pending. Stage timings are recorded per job (the fit stage's spans come
+# back from the fit worker) and logged as one JSON line; with profile, both
+# stages are also written out as cProfile stats.
+def submit_price_job(state, market, commodity, horizons=None, interval_levels=None, engine=None, profile=False):
+    horizons = parse_horizons(horizons)
+    interval_levels = parse_interval_levels(interval_levels)
+    engine = parse_engine(engine)
+    from_date, to_date = price_window()
+    profile_name = f"{commodity}-{market}-{time.strftime('%Y%m%dT%H%M%S')}" if profile else None
+    scrape_spans = []
+
+    def scrape():
+        with collect_spans() as spans, profiled(profile_name and f"{profile_name}-scrape"):
+            try:
+                return load_market_data(state, commodity, market, from_date, to_date)
+            finally:
+                observe_spans(spans)
+                scrape_spans.extend(spans)
+
+    def finish(market_data, fitted):
+        prediction, fit_spans = fitted if fitted else (None, [])
+        observe_spans(fit_spans)
+        stages = {}
+        for stage, seconds in scrape_spans + fit_spans:
+            stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+        logging.info(json.dumps({"event": "price_job", "state": state, "market": market, "commodity": commodity,
+                                 "engine": engine, "stages": stages}))
+        if not market_data:
+            return 404, {"error": "No data found for the specified inputs"}
+        if "error" in prediction:
+            return 400, {"error": prediction["error"]}
+        return 200, {
+            "state": state,
+            "market": market,
+            "commodity": commodity,
+            "data_points": len(market_data),
+            "predictions": prediction,
+        }
+
+    return get_job_manager().submit(
+        (state, market, commodity, tuple(horizons.items()), tuple(interval_levels), engine, profile),
+        scrape, (),
+        partial(traced_call, predict_from_records, series_key=(state, market, commodity), horizons=horizons,
+                interval_levels=interval_levels, engine=engine, profile_name=profile_name and f"{profile_name}-fit"),
+        finish,
+    )
+
+
+# Metrics
+
+def driver_pool_metrics():
+    return get_driver_pool().metrics()
+
+
+def forecast_cache_metrics():
+    return {**get_forecast_cache().stats(), "incremental": get_incremental_forecaster().stats()}
+
+
+def prefixed(prefix, values):
+    return {f"{prefix}{name}": value for name, value in values.items()}
+
+
+# Pool and cache counters, exported as gauges on /metrics
+get_metrics().register_collector(lambda: prefixed("driver_pool_", driver_pool_metrics()))
+get_metrics().register_collector(lambda: {
+    **prefixed("forecast_cache_", get_forecast_cache().stats()),
+    **prefixed("forecast_incremental_", get_incremental_forecaster().stats()),
+})
+
+
+# Time the pipeline stages for one market, from a local CSV or the price store
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the price pipeline for one market and time each stage")
+    parser.add_argument("state")
+    parser.add_argument("market")
+    parser.add_argument("commodity")
+    parser.add_argument("--csv", help="read records from a *_past3years.csv file instead of the store")
+    parser.add_argument("--engine", choices=FORECAST_ENGINES, default=parse_engine(None))
+    parser.add_argument("--repeat", type=int, default=1, help="forecast this many times")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    seconds = {}
+    started = time.perf_counter()
+    if args.csv:
+        records = pd.read_csv(args.csv, dtype=str).to_dict("records")
+    else:
+        records = load_market_data(args.state, args.commodity, args.market, *price_window())
+    seconds["load"] = time.perf_counter() - started
+    if not records:
+        parser.error("No data found for the specified inputs")
+
+    started = time.perf_counter()
+    price_series = preprocess(pd.DataFrame(records))
+    seconds["preprocess"] = time.perf_counter() - started
+    for run in range(args.repeat):
+        started = time.perf_counter()
+        predictions = forecast(price_series, (args.state, args.market, args.commodity), engine=args.engine)
+        seconds[f"forecast_{run + 1}"] = time.perf_counter() - started
+    print(json.dumps({"data_points": len(records), "weeks": len(price_series),
+                      "seconds": {stage: round(value, 4) for stage, value in seconds.items()},
+                      "one_week": predictions["one_week"]["predicted_prices"]}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
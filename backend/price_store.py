@@ -0,0 +1,384 @@
+import os
+import csv
+import sys
+import sqlite3
+import itertools
+import logging
+import threading
+from datetime import datetime, date, timedelta
+import numpy as np
+import pandas as pd
+
+# Local SQLite store of scraped agmarknet prices, partitioned by
+# state/market/commodity. Both backends read from here first and only scrape
+# the date ranges that are not yet covered.
+PRICE_DB_PATH = os.environ.get("PRICE_DB_PATH", "price_data.db")
+# Scraped records are consumed and written this many at a time
+PRICE_CHUNK_ROWS = int(os.environ.get("PRICE_CHUNK_ROWS", 1000))
+# Column order of the scraper records (and the *_past3years.csv files)
+RECORD_FIELDS = ["S.No", "Market", "Commodity", "Min Price", "Max Price", "Modal Price", "Date", "State"]
+PRICE_FIELDS = ["Min Price", "Max Price", "Modal Price"]
+# A window reaching today counts as covered for this long after it was
+# fetched; after that today is fetched again to pick up later publications
+PRICE_FRESH_SECONDS = float(os.environ.get("PRICE_FRESH_SECONDS", 6 * 3600))
+# Record dates are ISO dates everywhere: the store, the CSVs and the scraper
+PRICE_DATE_FORMAT = "%Y-%m-%d"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    state TEXT NOT NULL,
+    market TEXT NOT NULL,
+    commodity_key TEXT NOT NULL,
+    commodity TEXT,
+    date TEXT NOT NULL,
+    min_price INTEGER,
+    max_price INTEGER,
+    modal_price INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_prices_series ON prices (state, market, commodity_key, date);
+CREATE TABLE IF NOT EXISTS coverage (
+    state TEXT NOT NULL,
+    market TEXT NOT NULL,
+    commodity_key TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (state, market, commodity_key)
+);
+CREATE TABLE IF NOT EXISTS backfill_windows (
+    state TEXT NOT NULL,
+    market TEXT NOT NULL,
+    commodity_key TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (state, market, commodity_key, from_date, to_date)
+);
+"""
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def to_price(value):
+    if isinstance(value, int) or value is None:
+        return value
+    try:
+        return int(float(str(value).replace(",", "")))
+    except (TypeError, ValueError):
+        return None
+
+
+# Typed ingestion: record dates and prices parsed once, up front, with the
+# known format rather than inferred per value
+
+def parse_price_dates(values):
+    if isinstance(values, pd.Series) and pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy()
+    return pd.to_datetime(values, format=PRICE_DATE_FORMAT, errors="coerce").to_numpy()
+
+
+# Prices as float64, NaN where missing or unparseable. A strict conversion is
+# tried first since it is several times faster than coercing value by value.
+def parse_price_values(values):
+    if isinstance(values, pd.Series) and pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64)
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.asarray(pd.to_numeric(values, errors="coerce"), dtype=np.float64)
+
+
+# Scraper records (a list of dicts or a DataFrame, as strings or typed) as a
+# frame of Date (datetime64) and int32 prices. Rows without a valid date or
+# modal price are dropped; a missing min or max price falls back to the modal.
+def typed_price_frame(records):
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records, columns=RECORD_FIELDS)
+    dates = parse_price_dates(df["Date"])
+    modal = parse_price_values(df["Modal Price"])
+    valid = ~(np.isnat(dates) | np.isnan(modal))
+    if not valid.all():
+        dates, modal = dates[valid], modal[valid]
+    columns = {"Date": dates}
+    for field in ("Min Price", "Max Price"):
+        if field in df:
+            values = parse_price_values(df[field])[valid]
+            values = np.where(np.isnan(values), modal, values)
+        else:
+            values = modal
+        columns[field] = values.astype(np.int32)
+    columns["Modal Price"] = modal.astype(np.int32)
+    return pd.DataFrame(columns)
+
+
+# A *_past3years.csv file as a typed price frame; the prices are parsed as
+# numbers by the CSV reader rather than read as strings and converted
+def read_price_csv(path):
+    df = pd.read_csv(path, usecols=lambda col: col == "Date" or col in PRICE_FIELDS, dtype={"Date": str})
+    return typed_price_frame(df)
+
+
+# What a fetch returns for a range that was fetched successfully but has no
+# arrivals (the results grid is empty), as opposed to the [] returned when
+# nothing could be fetched. Such a range is recorded as covered.
+class EmptyFetch(list):
+    pass
+
+
+def chunked(iterable, size=PRICE_CHUNK_ROWS):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Stream scraper records into a CSV, writing them in chunks; returns the count
+def write_records_csv(records, path, chunk_size=PRICE_CHUNK_ROWS):
+    written = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for chunk in chunked(records, chunk_size):
+            writer.writerows(chunk)
+            written += len(chunk)
+    return written
+
+
+class PriceStore:
+    def __init__(self, db_path=PRICE_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    # One connection per thread; WAL lets readers proceed while a scrape writes
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def coverage(self, state, market, commodity):
+        row = self._coverage_row(state, market, commodity)
+        if not row:
+            return None
+        return parse_date(row[0]), parse_date(row[1])
+
+    def _coverage_row(self, state, market, commodity):
+        return self.connection().execute(
+            "SELECT from_date, to_date, updated_at FROM coverage WHERE state = ? AND market = ? AND commodity_key = ?",
+            (state, market, commodity),
+        ).fetchone()
+
+    # Write the coverage window. updated_at records when today was last
+    # fetched, so it is kept when this write (fetched_to) does not reach today.
+    def _set_coverage(self, conn, state, market, commodity, from_date, to_date, fetched_to, previous):
+        updated_at = datetime.now().isoformat(timespec="seconds")
+        if previous and fetched_to < date.today() and parse_date(previous[1]) >= date.today():
+            updated_at = previous[2]
+        conn.execute(
+            "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?, ?)",
+            (state, market, commodity, from_date.isoformat(), to_date.isoformat(), updated_at),
+        )
+
+    # Every stored series as (state, market, commodity, from_date, to_date)
+    def series(self):
+        rows = self.connection().execute(
+            "SELECT state, market, commodity_key, from_date, to_date FROM coverage ORDER BY state, market, commodity_key"
+        ).fetchall()
+        return [(state, market, commodity, parse_date(from_date), parse_date(to_date))
+                for state, market, commodity, from_date, to_date in rows]
+
+    # Date ranges in [from_date, to_date] that have not been fetched yet. The
+    # last covered day is fetched again since it may have been published
+    # partially, except for today while it is within PRICE_FRESH_SECONDS.
+    def missing_ranges(self, state, market, commodity, from_date, to_date, fresh_seconds=None):
+        from_date, to_date = parse_date(from_date), parse_date(to_date)
+        row = self._coverage_row(state, market, commodity)
+        if not row:
+            return [(from_date, to_date)]
+        covered_from, covered_to = parse_date(row[0]), parse_date(row[1])
+        fresh_seconds = PRICE_FRESH_SECONDS if fresh_seconds is None else fresh_seconds
+        stale = (covered_to >= date.today()
+                 and (datetime.now() - datetime.fromisoformat(row[2])).total_seconds() >= fresh_seconds)
+        ranges = []
+        if from_date < covered_from:
+            ranges.append((from_date, covered_from - timedelta(days=1)))
+        if to_date > covered_to or (stale and to_date >= covered_to):
+            ranges.append((max(covered_to, from_date), to_date))
+        return ranges
+
+    # Replace stored rows in [from_date, to_date] with the given scraper records
+    # and merge the range into the coverage window as mark_covered does, up to
+    # today at most (see missing_ranges for when today is fetched again).
+    # records may be any iterable (e.g. a streaming grid parser); it is
+    # consumed and inserted in chunks.
+    # With require_rows, an empty records iterable changes nothing; without
+    # update_coverage only the rows are replaced (see mark_covered).
+    def save_prices(self, state, market, commodity, records, from_date, to_date, require_rows=False,
+                    update_coverage=True):
+        from_date, to_date = parse_date(from_date), parse_date(to_date)
+        skipped = 0
+
+        def rows():
+            nonlocal skipped
+            for record in records:
+                try:
+                    record_date = parse_date(record["Date"])
+                except ValueError:
+                    skipped += 1
+                    continue
+                yield (
+                    state, market, commodity, record.get("Commodity", commodity), record_date.isoformat(),
+                    to_price(record.get("Min Price")), to_price(record.get("Max Price")),
+                    to_price(record.get("Modal Price")),
+                )
+
+        saved = 0
+        with self._write_lock:
+            conn = self.connection()
+            with conn:
+                conn.execute(
+                    "DELETE FROM prices WHERE state = ? AND market = ? AND commodity_key = ? AND date BETWEEN ? AND ?",
+                    (state, market, commodity, from_date.isoformat(), to_date.isoformat()),
+                )
+                for chunk in chunked(rows()):
+                    conn.executemany("INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", chunk)
+                    saved += len(chunk)
+                if require_rows and not saved:
+                    conn.rollback()
+                elif update_coverage:
+                    self._merge_coverage(conn, state, market, commodity, from_date, to_date)
+        if skipped:
+            logging.warning(f"Skipped {skipped} records with unparseable dates for {commodity} in {market}")
+        return saved
+
+    # Record [from_date, to_date] as fetched. It is merged with the current
+    # coverage window when the two overlap or touch, and replaces it otherwise
+    # (coverage is a single window, so a gap between them must stay missing).
+    def mark_covered(self, state, market, commodity, from_date, to_date):
+        with self._write_lock:
+            conn = self.connection()
+            with conn:
+                self._merge_coverage(conn, state, market, commodity, parse_date(from_date), parse_date(to_date))
+
+    # The mark_covered rule, within the caller's transaction and write lock
+    def _merge_coverage(self, conn, state, market, commodity, from_date, to_date):
+        to_date = fetched_to = min(to_date, date.today())
+        if to_date < from_date:
+            return
+        previous = self._coverage_row(state, market, commodity)
+        if previous:
+            covered = parse_date(previous[0]), parse_date(previous[1])
+            if from_date <= covered[1] + timedelta(days=1) and to_date >= covered[0] - timedelta(days=1):
+                from_date, to_date = min(covered[0], from_date), max(covered[1], to_date)
+            else:
+                previous = None
+        self._set_coverage(conn, state, market, commodity, from_date, to_date, fetched_to, previous)
+
+    # Backfill checkpoints: {(from_date, to_date): rows} of completed windows
+    def completed_windows(self, state, market, commodity):
+        rows = self.connection().execute(
+            "SELECT from_date, to_date, rows FROM backfill_windows "
+            "WHERE state = ? AND market = ? AND commodity_key = ?",
+            (state, market, commodity),
+        ).fetchall()
+        return {(parse_date(from_date), parse_date(to_date)): count for from_date, to_date, count in rows}
+
+    def mark_window_complete(self, state, market, commodity, from_date, to_date, rows):
+        with self._write_lock:
+            conn = self.connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO backfill_windows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (state, market, commodity, parse_date(from_date).isoformat(), parse_date(to_date).isoformat(),
+                     rows, datetime.now().isoformat(timespec="seconds")),
+                )
+
+    # Stored prices as record dicts in the same shape fetch_market_prices returns
+    def load_prices(self, state, market, commodity, from_date, to_date):
+        cursor = self.connection().execute(
+            "SELECT commodity, min_price, max_price, modal_price, date FROM prices "
+            "WHERE state = ? AND market = ? AND commodity_key = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (state, market, commodity, parse_date(from_date).isoformat(), parse_date(to_date).isoformat()),
+        )
+        return [
+            {
+                "S.No": str(i),
+                "Market": market,
+                "Commodity": row[0],
+                "Min Price": row[1],
+                "Max Price": row[2],
+                "Modal Price": row[3],
+                "Date": row[4],
+                "State": state,
+            }
+            for i, row in enumerate(cursor, start=1)
+        ]
+
+    # Serve from the store, scraping only the ranges that are missing.
+    # fetch_fn has the fetch_market_prices signature and may return a list or
+    # an iterator of records; the records go into the store as they are parsed.
+    # An EmptyFetch (no arrivals) covers the range; any other empty result
+    # can mean the scrape failed, so the range is left uncovered.
+    def get_or_fetch(self, fetch_fn, state, commodity, market, from_date, to_date):
+        for range_from, range_to in self.missing_ranges(state, market, commodity, from_date, to_date):
+            logging.info(f"Fetching missing range {range_from} to {range_to} for {commodity} in {state}, {market}")
+            records = fetch_fn(state, commodity, market,
+                               datetime.combine(range_from, datetime.min.time()),
+                               datetime.combine(range_to, datetime.min.time()))
+            saved = self.save_prices(state, market, commodity, records, range_from, range_to, require_rows=True)
+            if not saved and isinstance(records, EmptyFetch):
+                logging.info(f"No arrivals for {range_from} to {range_to}; marking the range as covered")
+                self.mark_covered(state, market, commodity, range_from, range_to)
+                continue
+            if not saved:
+                logging.warning(f"No records fetched for {range_from} to {range_to}")
+                continue
+            logging.info(f"Stored {saved} records for {commodity} in {state}, {market}")
+        return self.load_prices(state, market, commodity, from_date, to_date)
+
+    # Seed the store from a *_past3years.csv file written by the old endpoints
+    def import_csv(self, path):
+        df = pd.read_csv(path, dtype=str)
+        if df.empty:
+            return 0
+        state, market, commodity = df["State"].iloc[0], df["Market"].iloc[0], df["Commodity"].iloc[0]
+        dates = pd.to_datetime(df["Date"], format="%Y-%m-%d", errors="coerce").dropna()
+        if dates.empty:
+            return 0
+        return self.save_prices(state, market, commodity, df.to_dict("records"),
+                                dates.min().date(), dates.max().date())
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_price_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PriceStore()
+        return _default_store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "import":
+        print("Usage: python price_store.py import <csv_file> [<csv_file> ...]")
+        sys.exit(1)
+    store = get_price_store()
+    for csv_path in sys.argv[2:]:
+        print(f"Imported {store.import_csv(csv_path)} records from '{csv_path}'")
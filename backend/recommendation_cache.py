@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from train import main_feature_columns
+
+# Cache of /predict results in front of SubCropRecommender.recommend_sub_crops.
+# Requests are keyed on their capped inputs (validate_and_preprocess_input)
+# rounded to RECOMMEND_CACHE_PRECISION decimals per feature, so the repeated
+# soil-test profiles clients send hit the cache; misses are computed on the
+# rounded inputs, so a result is the same whether or not it came from the
+# cache. Keys include the recommender's model_version(), so a rebuilt artifact
+# (reloaded by the model registry) never serves results of the old model.
+#
+# RECOMMEND_CACHE selects the backend: "memory" (per-process LRU with a TTL,
+# default), "redis" (shared by every worker, needs the optional redis package
+# and a Redis-compatible server at RECOMMEND_CACHE_REDIS_URL) or "off".
+
+RECOMMEND_CACHE = os.environ.get("RECOMMEND_CACHE", "memory")
+RECOMMEND_CACHE_ENTRIES = int(os.environ.get("RECOMMEND_CACHE_ENTRIES", 4096))
+RECOMMEND_CACHE_TTL = float(os.environ.get("RECOMMEND_CACHE_TTL", 3600))
+RECOMMEND_CACHE_REDIS_URL = os.environ.get("RECOMMEND_CACHE_REDIS_URL", "redis://localhost:6379/0")
+RECOMMEND_CACHE_REDIS_TIMEOUT = float(os.environ.get("RECOMMEND_CACHE_REDIS_TIMEOUT", 0.1))
+# Decimals kept per feature, e.g. "ph=1,rainfall=0"; unlisted features use DEFAULT_PRECISION
+RECOMMEND_CACHE_PRECISION = os.environ.get("RECOMMEND_CACHE_PRECISION", "")
+DEFAULT_PRECISION = {"N": 0, "P": 0, "K": 0, "temperature": 1, "humidity": 1, "ph": 2, "rainfall": 1}
+CACHE_COUNTERS = ["hits", "misses", "stores", "evictions", "expired", "invalidations", "errors"]
+
+
+def parse_precision(value):
+    precision = dict(DEFAULT_PRECISION)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, decimals = item.partition("=")
+        if name.strip() not in main_feature_columns:
+            raise ValueError(f"Unknown feature in RECOMMEND_CACHE_PRECISION: {name.strip()}")
+        precision[name.strip()] = int(decimals)
+    return precision
+
+
+class MemoryBackend:
+    def __init__(self, cache, max_entries=RECOMMEND_CACHE_ENTRIES, ttl=RECOMMEND_CACHE_TTL):
+        self.cache = cache
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.cache.count("expired")
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.cache.count("evictions")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Results as JSON under versioned keys, expiring after the TTL; entries of an
+# old model version are never read again and age out on their own. Redis
+# errors count as misses, so an unreachable server only costs the timeout.
+class RedisBackend:
+    def __init__(self, cache, url=RECOMMEND_CACHE_REDIS_URL, ttl=RECOMMEND_CACHE_TTL,
+                 timeout=RECOMMEND_CACHE_REDIS_TIMEOUT):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("RECOMMEND_CACHE=redis requires the redis package") from None
+        self.cache = cache
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def get(self, key):
+        try:
+            value = self.client.get(key)
+        except Exception as e:
+            logging.debug(f"Recommendation cache read failed: {e}")
+            self.cache.count("errors")
+            return None
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value):
+        try:
+            self.client.set(key, json.dumps(value), ex=max(1, int(self.ttl)))
+        except Exception as e:
+            logging.debug(f"Recommendation cache write failed: {e}")
+            self.cache.count("errors")
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+CACHE_BACKENDS = {
+    "memory": MemoryBackend,
+    "redis": RedisBackend,
+}
+
+
+class RecommendationCache:
+    def __init__(self, backend=RECOMMEND_CACHE, precision=RECOMMEND_CACHE_PRECISION, prefix="recommend"):
+        if backend != "off" and backend not in CACHE_BACKENDS:
+            raise ValueError(f"Unknown RECOMMEND_CACHE: {backend} (choose from off, {', '.join(CACHE_BACKENDS)})")
+        self.backend_name = backend
+        self.precision = parse_precision(precision) if isinstance(precision, str) else dict(precision)
+        self.prefix = prefix
+        self.model_version = None
+        # Shared memory counters so hits in forked workers are counted too
+        self._counters = multiprocessing.Array("q", len(CACHE_COUNTERS))
+        self.backend = None if backend == "off" else CACHE_BACKENDS[backend](self)
+
+    def count(self, name):
+        with self._counters.get_lock():
+            self._counters[CACHE_COUNTERS.index(name)] += 1
+
+    # The capped inputs rounded to the configured precision, in main_feature_columns order
+    def quantize(self, capped_inputs):
+        return [round(float(capped_inputs[col]), self.precision[col]) for col in main_feature_columns]
+
+    def key(self, version, values, num_recommendations):
+        return f"{self.prefix}:{version}:{num_recommendations}:{','.join(repr(value) for value in values)}"
+
+    # recommend_sub_crops through the cache. Warnings depend on the raw inputs,
+    # so they are recomputed per request and never cached; neither are errors.
+    def recommend(self, recommender, values, num_recommendations=3):
+        if self.backend is None:
+            return recommender.recommend_sub_crops(*values, num_recommendations=num_recommendations)
+        is_valid, capped_inputs, warnings = recommender.validate_and_preprocess_input(*values)
+        if not is_valid:
+            return {"error": capped_inputs, "main_crop": None, "sub_crops": [], "warnings": warnings}
+
+        version = recommender.model_version()
+        if version != self.model_version:
+            if self.model_version is not None:
+                logging.info(f"Recommender changed to {version}; invalidating the recommendation cache")
+                self.count("invalidations")
+            self.backend.clear()
+            self.model_version = version
+        quantized = self.quantize(capped_inputs)
+        key = self.key(version, quantized, num_recommendations)
+        cached = self.backend.get(key)
+        if cached is not None:
+            self.count("hits")
+            return {**cached, "warnings": warnings if warnings else None}
+
+        self.count("misses")
+        result = recommender.recommend_sub_crops(*quantized, num_recommendations=num_recommendations)
+        if "error" in result:
+            return {**result, "warnings": warnings}
+        self.backend.set(key, {name: value for name, value in result.items() if name != "warnings"})
+        self.count("stores")
+        return {**result, "warnings": warnings if warnings else None}
+
+    def stats(self):
+        with self._counters.get_lock():
+            stats = dict(zip(CACHE_COUNTERS, self._counters[:]))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self.backend) if self.backend is not None else 0
+        stats["backend"] = self.backend_name
+        stats["model_version"] = self.model_version
+        return stats
+
+
+# Created at import time so forked workers share the counters
+_default_cache = RecommendationCache()
+
+
+def get_recommendation_cache():
+    return _default_cache
@@ -1,46 +1,81 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import pickle
-import numpy as np
 import mysql.connector
 from flask_bcrypt import Bcrypt
-from datetime import datetime, timedelta
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.support.ui import Select, WebDriverWait
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
-from bs4 import BeautifulSoup
 import logging
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from statsmodels.tsa.arima.model import ARIMA
+import json
+import os
 import time
-from train import SubCropRecommender
-from database.db_connection import get_db_connection, close_db_connection  # Ensure this file exists
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from train import load_recommender, main_feature_columns, RECOMMENDER_ARTIFACT
+from recommendation_cache import get_recommendation_cache
+from model_registry import get_model_registry
+import price_service
+from forecasting import parse_horizons, parse_interval_levels, parse_engine
+from jobs import JobQueueFull, get_job_manager
+from batch_forecast import resolve_series, stream_batch
+from instrumentation import PROMETHEUS_CONTENT_TYPE, get_metrics, profiling_requested, setup_logging, span
+from password_hashing import BCRYPT_LOG_ROUNDS, BCRYPT_RETRY_AFTER, HashingQueueFull, PasswordHasher
+from database.db_connection import get_db_connection, close_db_connection, db_pool_metrics  # Ensure this file exists
 
 app = Flask(__name__)
+app.config["BCRYPT_LOG_ROUNDS"] = BCRYPT_LOG_ROUNDS
 bcrypt = Bcrypt(app)
+# Hashing and verification run on a bounded pool instead of the request thread
+password_hasher = PasswordHasher(bcrypt)
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, supports_credentials=True)
 
-# Set up logging
-logging.basicConfig(
-    filename="scrape_log.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
-
-# Load the trained model for crop recommendation
-try:
-    with open("subcrop_recommender.pkl", "rb") as model_file:
-        model = pickle.load(model_file)
-except FileNotFoundError:
-    print("Error: Model file 'subcrop_recommender.pkl' not found.")
-    model = None
-
-# Crop Recommendation Endpoint
+# Set up logging; records are written to the file by a background thread
+setup_logging("scrape_log.log")
+
+# Request latency by route, served with the pipeline stage timings on /metrics
+@app.before_request
+def start_request_timer():
+    request.started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    started = getattr(request, "started", None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        get_metrics().observe("http_request_seconds", time.perf_counter() - started,
+                              method=request.method, endpoint=endpoint, status=response.status_code)
+    return response
+
+get_metrics().register_collector(lambda: price_service.prefixed("db_pool_", db_pool_metrics()))
+get_metrics().register_collector(lambda: price_service.prefixed("password_hashing_", password_hasher.metrics()))
+get_metrics().register_collector(lambda: price_service.prefixed("recommend_cache_",
+                                                                 get_recommendation_cache().stats()))
+
+# How long /predict_prices waits for its job before answering 202
+PRICE_JOB_WAIT_SECONDS = float(os.environ.get("PRICE_JOB_WAIT_SECONDS", 300))
+
+# The crop recommendation model (subcrop_recommender.npz, falling back to the
+# pickled recommender) and the forecasting stack are loaded by the model
+# registry, in the background by default; see MODEL_WARMUP in model_registry.py.
+# The recommender is reloaded when either file is rebuilt.
+def load_forecasting_stack():
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    return SARIMAX
+
+model_registry = get_model_registry()
+model_registry.register("subcrop_recommender", load_recommender,
+                        watch=[RECOMMENDER_ARTIFACT, "subcrop_recommender.pkl"])
+model_registry.register("forecasting", load_forecasting_stack)
+model_registry.start()
+
+# Readiness: 200 once warm-up has finished and every model loaded, else 503
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    status = model_registry.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+# Crop Recommendation Endpoint, answered from the recommendation cache when the
+# same (rounded) inputs were seen before; see recommendation_cache.py
 @app.route("/predict", methods=["POST"])
 def predict():
+    model = model_registry.get("subcrop_recommender")
     if not model:
         return jsonify({"error": "Model not loaded"}), 500
 
@@ -56,12 +91,68 @@ def predict():
         except ValueError:
             return jsonify({"error": "Invalid input: All parameters must be numeric"}), 400
 
-        result = model.recommend_sub_crops(*values)
+        result = get_recommendation_cache().recommend(model, values)
         return jsonify(result)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Batch Crop Recommendation Endpoint
+# Accepts a JSON list of samples (objects keyed by feature name or lists in
+# N, P, K, temperature, humidity, ph, rainfall order), optionally wrapped as
+# {"samples": [...]}, or a CSV upload in the "file" form field.
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    model = model_registry.get("subcrop_recommender")
+    if not model:
+        return jsonify({"error": "Model not loaded"}), 500
+
+    try:
+        try:
+            num_recommendations = int(request.args.get("num_recommendations", 3))
+        except ValueError:
+            return jsonify({"error": "num_recommendations must be an integer"}), 400
+        limit = model.max_recommendations()
+        if not 1 <= num_recommendations <= limit:
+            return jsonify({"error": f"num_recommendations must be between 1 and {limit}"}), 400
+        if "file" in request.files:
+            samples = pd.read_csv(request.files["file"])
+            missing = [field for field in main_feature_columns if field not in samples.columns]
+            if missing:
+                return jsonify({"error": f"Missing required columns: {missing}"}), 400
+            matrix = samples[main_feature_columns].apply(pd.to_numeric, errors="coerce").values
+        else:
+            data = request.get_json(silent=True)
+            samples = data.get("samples") if isinstance(data, dict) else data
+            if not isinstance(samples, list) or not samples:
+                return jsonify({"error": "Expected a non-empty list of samples or a CSV file upload"}), 400
+            rows = []
+            for sample in samples:
+                if isinstance(sample, dict):
+                    missing = [field for field in main_feature_columns if field not in sample]
+                    if missing:
+                        return jsonify({"error": f"Missing required field: {missing[0]}"}), 400
+                    rows.append([sample[field] for field in main_feature_columns])
+                else:
+                    rows.append(sample)
+            try:
+                matrix = [[float(val) for val in row] for row in rows]
+            except (ValueError, TypeError):
+                return jsonify({"error": "Invalid input: All parameters must be numeric"}), 400
+
+        try:
+            results = model.recommend_sub_crops_batch(matrix, num_recommendations=num_recommendations)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"count": len(results), "results": results})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# The hashing pool is saturated or too slow; the client should retry shortly
+def hashing_unavailable(message):
+    return jsonify({"error": message}), 503, {"Retry-After": str(BCRYPT_RETRY_AFTER)}
+
 # Signup Endpoint
 @app.route("/signup", methods=["POST"])
 def signup():
@@ -72,16 +163,20 @@ def signup():
     cursor = db.cursor()
     data = request.json
 
-    # Hash the password
-    hashed_password = bcrypt.generate_password_hash(data["password"]).decode("utf-8")
     sql = "INSERT INTO users (username, email, password) VALUES (%s, %s, %s)"
 
     try:
+        # Hash the password
+        hashed_password = password_hasher.hash(data["password"])
         cursor.execute(sql, (data["username"], data["email"], hashed_password))
         db.commit()
         return jsonify({"message": "User registered successfully"}), 201
     except mysql.connector.Error as err:
         return jsonify({"error": str(err)}), 400
+    except HashingQueueFull as e:
+        return hashing_unavailable(str(e))
+    except FutureTimeoutError:
+        return hashing_unavailable("Password hashing timed out, please retry")
     finally:
         close_db_connection(db, cursor)
 
@@ -92,200 +187,176 @@ def login():
     if not db:
         return jsonify({"error": "Database connection failed"}), 500
 
-    cursor = db.cursor()
+    # Server-side prepared statement for the email lookup
+    cursor = db.cursor(prepared=True)
     data = request.json
     sql = "SELECT username, password FROM users WHERE email = %s"
 
     try:
         cursor.execute(sql, (data["email"],))
-        user = cursor.fetchone()
+        # Read the whole result so the connection is free for a rehash update
+        rows = cursor.fetchall()
+        user = rows[0] if rows else None
 
-        if not user or not bcrypt.check_password_hash(user[1], data["password"]):
-            close_db_connection(db, cursor)
+        if not user or not password_hasher.check(user[1], data["password"]):
             return jsonify({"message": "Invalid credentials"}), 401
 
-        close_db_connection(db, cursor)
+        # Upgrade hashes stored at an older BCRYPT_LOG_ROUNDS cost. Best effort:
+        # the password was correct, so a busy hashing pool never fails the login.
+        if password_hasher.needs_rehash(user[1]):
+            update = db.cursor(prepared=True)
+            try:
+                update.execute("UPDATE users SET password = %s WHERE email = %s",
+                               (password_hasher.hash(data["password"]), data["email"]))
+                db.commit()
+            except (HashingQueueFull, FutureTimeoutError, mysql.connector.Error) as e:
+                logging.warning(f"Skipped password rehash after login: {e or type(e).__name__}")
+            finally:
+                update.close()
+
         return jsonify({"message": "Login successful", "username": user[0]})
     except mysql.connector.Error as err:
         return jsonify({"error": str(err)}), 400
+    except HashingQueueFull as e:
+        return hashing_unavailable(str(e))
+    except FutureTimeoutError:
+        return hashing_unavailable("Password hashing timed out, please retry")
     finally:
         close_db_connection(db, cursor)
 
-# Market Price Scraping Logic
-def close_popup(driver):
-    try:
-        popup = WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "popup-onload"))
-        )
-        close_button = popup.find_element(By.CLASS_NAME, "close")
-        close_button.click()
-        logging.info("Popup closed")
-    except (NoSuchElementException, TimeoutException):
-        logging.info("No popup found or failed to close")
-        pass
-
-def fetch_market_prices(state, commodity, market, from_date, to_date, max_retries=3):
-    options = webdriver.ChromeOptions()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument('--headless')  # Uncomment for production
-
-    for attempt in range(max_retries):
-        driver = None
-        try:
-            driver = webdriver.Chrome(options=options)
-            driver.set_page_load_timeout(120)
-            url = "https://agmarknet.gov.in/"
-            logging.info(f"Attempt {attempt + 1}/{max_retries}: Loading URL: {url}")
-            driver.get(url)
-            close_popup(driver)
-
-            logging.info(f"Fetching data for {commodity} in {state}, {market}")
-            WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.ID, "ddlCommodity"))
-            )
-
-            commodity_dropdown = Select(driver.find_element(By.ID, "ddlCommodity"))
-            commodity_dropdown.select_by_visible_text(commodity)
-            state_dropdown = Select(driver.find_element(By.ID, "ddlState"))
-            state_dropdown.select_by_visible_text(state)
-            time.sleep(2)
-            market_dropdown = Select(driver.find_element(By.ID, "ddlMarket"))
-            market_dropdown.select_by_visible_text(market)
-            time.sleep(2)
-
-            from_date_input = driver.find_element(By.ID, "txtDate")
-            from_date_input.clear()
-            from_date_input.send_keys(from_date.strftime("%d-%b-%Y"))
-            time.sleep(2)
-            to_date_input = driver.find_element(By.ID, "txtDateTo")
-            to_date_input.clear()
-            to_date_input.send_keys(to_date.strftime("%d-%b-%Y"))
-            time.sleep(2)
-
-            driver.find_element(By.ID, "btnGo").click()
-            WebDriverWait(driver, 60).until(
-                EC.presence_of_element_located((By.ID, "cphBody_GridPriceData"))
-            )
-
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            table = soup.find("table", {"id": "cphBody_GridPriceData"})
-            if not table:
-                logging.warning("No price data table found")
-                driver.quit()
-                return []
-
-            data_list = []
-            for row in table.find_all("tr")[1:]:  # Skip header
-                cols = row.find_all("td")
-                if len(cols) >= 10:
-                    date_str = cols[9].text.strip()
-                    try:
-                        date_obj = datetime.strptime(date_str, "%d %b %Y")
-                        standardized_date = date_obj.strftime("%Y-%m-%d")
-                    except ValueError:
-                        standardized_date = date_str
-                    data = {
-                        "S.No": cols[0].text.strip(),
-                        "Market": market,
-                        "Commodity": cols[3].text.strip(),
-                        "Min Price": cols[6].text.strip(),
-                        "Max Price": cols[7].text.strip(),
-                        "Modal Price": cols[8].text.strip(),
-                        "Date": standardized_date,
-                        "State": state,
-                    }
-                    data_list.append(data)
-            driver.quit()
-            return data_list
-        except Exception as e:
-            logging.error(f"Attempt {attempt + 1} failed: {str(e)}")
-            if driver:
-                driver.quit()
-            if attempt + 1 < max_retries:
-                time.sleep(5)
-            else:
-                logging.error("All retries failed")
-                return []
-
-def preprocess_and_predict(df, freq="W"):
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-    df["Modal Price"] = pd.to_numeric(df["Modal Price"], errors="coerce")
-    df = df.dropna(subset=["Date", "Modal Price"])
-    
-    if len(df) < 10:
-        return {"error": "Not enough data points for prediction (minimum 10 required)"}
-    
-    df = df.sort_values("Date").set_index("Date")
-    df = df["Modal Price"].resample(freq).mean().interpolate(method="linear").ffill().bfill()
-    price_series = df
-
-    horizons = {"one_week": 1, "one_month": 4, "three_months": 12, "six_months": 24}
-    predictions = {}
-    last_date = price_series.index[-1]
-
-    try:
-        if len(price_series) >= 52:
-            model = SARIMAX(price_series, order=(1, 0, 1), seasonal_order=(1, 0, 1, 52))
-            fitted_model = model.fit(disp=False, maxiter=100)
-        else:
-            model = ARIMA(price_series, order=(1, 0, 1))
-            fitted_model = model.fit()
-
-        for period, steps in horizons.items():
-            forecast = fitted_model.forecast(steps=steps)
-            forecast = np.maximum(forecast, 0)  # Ensure non-negative prices
-            future_dates = pd.date_range(start=last_date, periods=steps + 1, freq="W")[1:]
-            predictions[period] = {
-                "dates": [date.strftime("%Y-%m-%d") for date in future_dates],
-                "predicted_prices": forecast.tolist(),
-            }
-        return predictions
-    except Exception as e:
-        return {"error": f"Model fitting failed: {str(e)}"}
+# Price prediction: fetching, preprocessing and forecasting live in
+# price_service.py, shared with API.py. Optional "horizons" ({"name": weeks} or
+# [weeks, ...]) and "interval_levels" ([0.8, 0.95]) select the forecast
+# horizons and confidence bands returned, and "engine" ("sarimax" or "panel")
+# the forecasting model.
+def submit_price_job(data):
+    return price_service.submit_price_job(data["state"], data["market"], data["commodity"], data.get("horizons"),
+                                          data.get("interval_levels"), data.get("engine"),
+                                          profile=profiling_requested(request.headers))
+
+def job_accepted(job):
+    body = job.to_dict()
+    body["status_url"] = f"/jobs/{job.id}"
+    return jsonify(body), 202
+
+def missing_price_field(data):
+    for field in ["state", "market", "commodity"]:
+        if not data or field not in data:
+            return field
+    return None
 
 # Price Prediction Endpoint
+# Waits up to PRICE_JOB_WAIT_SECONDS for the job and otherwise answers 202 with
+# the job id to poll, so slow markets do not hold the connection indefinitely.
 @app.route("/predict_prices", methods=["POST"])
 def predict_prices():
     try:
         data = request.json
-        required_fields = ["state", "market", "commodity"]
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
+        missing = missing_price_field(data)
+        if missing:
+            return jsonify({"error": f"Missing required field: {missing}"}), 400
 
-        # Define date range (e.g., past 3 years to March 29, 2025)
-        to_date = datetime(2025, 4, 3)  # Hardcoded as per your context
-        from_date = to_date - timedelta(days=3 * 365)  # 3 years back
-
-        # Fetch market prices
-        market_data = fetch_market_prices(
-            data["state"], data["commodity"], data["market"], from_date, to_date
-        )
-
-        if not market_data:
-            return jsonify({"error": "No data found for the specified inputs"}), 404
-
-        # Convert to DataFrame and save
-        df = pd.DataFrame(market_data)
-        safe_commodity = data["commodity"].replace(" ", "").replace("/", "")
-        filename = f"{safe_commodity}{data['state']}{data['market']}_past3years.csv"
-        df.to_csv(filename, index=False)
-
-        # Predict prices
-        prediction = preprocess_and_predict(df)
-        if "error" in prediction:
-            return jsonify({"error": prediction["error"]}), 400
-
-        return jsonify({
-            "state": data["state"],
-            "market": data["market"],
-            "commodity": data["commodity"],
-            "data_file": filename,
-            "predictions": prediction,
-        })
+        job = submit_price_job(data)
+        try:
+            job.wait(timeout=PRICE_JOB_WAIT_SECONDS)
+        except FutureTimeoutError:
+            return job_accepted(job)
+
+        if job.error:
+            return jsonify({"error": job.error}), job.status_code
+        with span("serialize"):
+            response = jsonify(job.result)
+        return response, job.status_code
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Asynchronous Price Prediction Endpoint: returns a job id immediately
+@app.route("/predict_prices/jobs", methods=["POST"])
+def submit_prediction_job():
+    try:
+        data = request.json
+        missing = missing_price_field(data)
+        if missing:
+            return jsonify({"error": f"Missing required field: {missing}"}), 400
+        return job_accepted(submit_price_job(data))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Job status; ?stream=1 streams status changes as server-sent events
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    if request.args.get("stream") not in ("1", "true"):
+        return jsonify(job.to_dict())
+
+    def events():
+        status = None
+        while True:
+            status = job.wait_for_change(status, timeout=15)
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.finished:
+                break
+
+    return Response(events(), mimetype="text/event-stream")
+
+# Request latency and pipeline stage histograms, plus the pool and cache
+# counters below, in the Prometheus text format
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(get_metrics().render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+# Scraper WebDriver pool metrics
+@app.route("/metrics/driver_pool", methods=["GET"])
+def driver_pool_metrics():
+    return jsonify(price_service.driver_pool_metrics())
+
+# MySQL connection pool checkouts, wait times and exhaustion
+@app.route("/metrics/db_pool", methods=["GET"])
+def db_pool_metrics_endpoint():
+    return jsonify(db_pool_metrics())
+
+# Password hashing pool queue depth and timings
+@app.route("/metrics/password_hashing", methods=["GET"])
+def password_hashing_metrics():
+    return jsonify(password_hasher.metrics())
+
+# /predict response cache hit/miss counters
+@app.route("/metrics/recommend_cache", methods=["GET"])
+def recommend_cache_metrics():
+    return jsonify(get_recommendation_cache().stats())
+
+# Forecast model cache hit/miss counters
+@app.route("/metrics/forecast_cache", methods=["GET"])
+def forecast_cache_metrics():
+    return jsonify(price_service.forecast_cache_metrics())
+
+# Batch forecast over the local series (CSV files and price store), streamed as
+# NDJSON: one line per series as it completes, then a summary line. An optional
+# "series" list of {"state", "market", "commodity"} limits the run.
+@app.route("/forecast_batch", methods=["POST"])
+def forecast_batch():
+    data = request.get_json(silent=True) or {}
+    try:
+        horizons = parse_horizons(data.get("horizons"))
+        interval_levels = parse_interval_levels(data.get("interval_levels"))
+        engine = parse_engine(data.get("engine"))
+        series_list, missing = resolve_series(data.get("series"))
+        lines = stream_batch(series_list, missing, horizons, interval_levels, engine)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return Response(lines, mimetype="application/x-ndjson")
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,180 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from train import load_recommender, main_feature_columns, subcrop_feature_columns, RECOMMENDER_ARTIFACT
+
+# Accuracy evaluation for the sub-crop recommender. Every row of every sub-crop
+# table is fed back through the batch recommendation path (classifier, then
+# nearest sub-crops) and scored on whether its own sub-crop comes back. Each
+# main crop's table is one batch and the tables are scored on a process pool
+# (the recommender is pickled to each worker once, which reloads its tables
+# from the artifact or CSVs); the result is a structured report (JSON, or one
+# CSV row per main crop).
+
+EVAL_WORKERS = int(os.environ.get("EVAL_WORKERS", os.cpu_count() or 1))
+STAGES = ("validate", "classify", "match")
+
+
+# A table's rows in main_feature_columns order and each row's label index
+def table_inputs(table):
+    order = [subcrop_feature_columns.index(col) for col in main_feature_columns]
+    inputs = np.asarray(table["features"], dtype=float)[:, order]
+    bounds = list(table["label_starts"]) + [len(inputs)]
+    return inputs, np.repeat(np.arange(len(table["label_starts"])), np.diff(bounds))
+
+
+def top_k_rates(hits, evaluated):
+    return {key: round(count / evaluated, 6) if evaluated else 0.0 for key, count in hits.items()}
+
+
+def evaluate_crop(recommender, main_crop, num_recommendations=3):
+    started = time.perf_counter()
+    table = recommender.get_subcrop_table(main_crop)
+    if table["error"]:
+        return {"main_crop": main_crop, "skipped": table["error"]}
+
+    inputs, expected = table_inputs(table)
+    labels = [str(label) for label in table["labels"]]
+    timings = {}
+    results = recommender.recommend_sub_crops_batch(inputs, num_recommendations, timings=timings)
+
+    ranks = np.zeros(num_recommendations, dtype=int)
+    errors = Counter()
+    main_crop_confusion = Counter()
+    subcrop_confusion = {label: Counter() for label in labels}
+    for result, code in zip(results, expected):
+        if "error" in result:
+            errors[result["error"]] += 1
+            continue
+        main_crop_confusion[str(result["main_crop"])] += 1
+        predicted = [str(item["sub_crop"]) for item in result["sub_crops"]]
+        subcrop_confusion[labels[code]][predicted[0] if predicted else ""] += 1
+        if labels[code] in predicted:
+            ranks[predicted.index(labels[code])] += 1
+
+    evaluated = len(results) - sum(errors.values())
+    hits = {f"top_{k}": int(ranks[:k].sum()) for k in range(1, num_recommendations + 1)}
+    timings["total"] = time.perf_counter() - started
+    return {
+        "main_crop": main_crop,
+        "rows": len(results),
+        "evaluated": evaluated,
+        "errors": dict(errors),
+        "main_crop_accuracy": round(main_crop_confusion[main_crop] / evaluated, 6) if evaluated else 0.0,
+        "hits": hits,
+        "top_k_accuracy": top_k_rates(hits, evaluated),
+        # Predicted main crop counts, and expected sub-crop -> top-1 sub-crop counts
+        "main_crop_confusion": dict(main_crop_confusion),
+        "subcrop_confusion": {label: dict(counts) for label, counts in subcrop_confusion.items()},
+        "seconds": {stage: round(seconds, 6) for stage, seconds in timings.items()},
+    }
+
+
+_worker_recommender = None
+
+
+def init_worker(recommender):
+    global _worker_recommender
+    _worker_recommender = recommender
+
+
+def evaluate_crop_in_worker(main_crop, num_recommendations):
+    return evaluate_crop(_worker_recommender, main_crop, num_recommendations)
+
+
+def evaluate_recommender(recommender, num_recommendations=3, workers=EVAL_WORKERS):
+    started = time.perf_counter()
+    main_crops = list(recommender.crop_name_mapping)
+    if workers <= 1:
+        crops = [evaluate_crop(recommender, crop, num_recommendations) for crop in main_crops]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(recommender,)) as pool:
+            crops = list(pool.map(evaluate_crop_in_worker, main_crops, [num_recommendations] * len(main_crops)))
+
+    scored = [crop for crop in crops if "skipped" not in crop]
+    evaluated = sum(crop["evaluated"] for crop in scored)
+    hits = {f"top_{k}": sum(crop["hits"][f"top_{k}"] for crop in scored)
+            for k in range(1, num_recommendations + 1)}
+    main_crop_hits = sum(crop["main_crop_confusion"].get(crop["main_crop"], 0) for crop in scored)
+    seconds = {stage: round(sum(crop["seconds"].get(stage, 0.0) for crop in scored), 6)
+               for stage in STAGES + ("total",)}
+    seconds["wall"] = round(time.perf_counter() - started, 6)
+    return {
+        "num_recommendations": num_recommendations,
+        "workers": workers,
+        "summary": {
+            "tables": len(scored),
+            "skipped": {crop["main_crop"]: crop["skipped"] for crop in crops if "skipped" in crop},
+            "rows": sum(crop["rows"] for crop in scored),
+            "evaluated": evaluated,
+            "errors": sum(sum(crop["errors"].values()) for crop in scored),
+            "main_crop_accuracy": round(main_crop_hits / evaluated, 6) if evaluated else 0.0,
+            "hits": hits,
+            "top_k_accuracy": top_k_rates(hits, evaluated),
+            # Per-stage seconds summed over tables; wall is the whole run
+            "seconds": seconds,
+        },
+        "crops": crops,
+    }
+
+
+def report_rows(report):
+    for crop in report["crops"]:
+        row = {"main_crop": crop["main_crop"], "skipped": crop.get("skipped", "")}
+        if "skipped" not in crop:
+            row.update(rows=crop["rows"], evaluated=crop["evaluated"], errors=sum(crop["errors"].values()),
+                       main_crop_accuracy=crop["main_crop_accuracy"])
+            row.update(crop["top_k_accuracy"])
+            row.update({f"{stage}_seconds": seconds for stage, seconds in crop["seconds"].items()})
+        yield row
+
+
+# JSON for a .json path, otherwise one CSV row per main crop
+def write_report(report, path):
+    with open(path, "w", newline="") as f:
+        if path.endswith(".json"):
+            json.dump(report, f, indent=2)
+            return
+        k = report["num_recommendations"]
+        columns = (["main_crop", "skipped", "rows", "evaluated", "errors", "main_crop_accuracy"]
+                   + [f"top_{i}" for i in range(1, k + 1)]
+                   + [f"{stage}_seconds" for stage in STAGES + ("total",)])
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(report_rows(report))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate sub-crop recommendation accuracy")
+    parser.add_argument("--artifact", default=RECOMMENDER_ARTIFACT, help="recommender artifact")
+    parser.add_argument("--model", default="subcrop_recommender.pkl", help="pickled recommender if no artifact")
+    parser.add_argument("--top-k", type=int, default=3, help="recommendations per row")
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS)
+    parser.add_argument("--output", nargs="+", default=["subcrop_accuracy_report.json"],
+                        help="report paths (.json for the full report, otherwise CSV)")
+    args = parser.parse_args(argv)
+    if args.top_k < 1:
+        parser.error("--top-k must be at least 1")
+
+    started = time.perf_counter()
+    recommender = load_recommender(args.artifact, args.model)
+    load_seconds = time.perf_counter() - started
+    report = evaluate_recommender(recommender, args.top_k, args.workers)
+    report["summary"]["seconds"]["load"] = round(load_seconds, 6)
+    for path in args.output:
+        write_report(report, path)
+        print(f"Wrote report to '{path}'")
+    summary = report["summary"]
+    print(json.dumps({key: summary[key] for key in ("evaluated", "errors", "main_crop_accuracy", "top_k_accuracy",
+                                                    "seconds")}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import os
+import numpy as np
+
+# Nearest-neighbour indexes for sub-crop matching. Each main crop's table is
+# standardized per feature (so pH counts as much as N or K) and optionally
+# weighted, then indexed per sub-crop label: the distance to a label is the
+# distance to its nearest row, so top-k results are distinct sub-crops.
+#
+# SUBCROP_INDEX selects the backend: "brute" (exact, vectorized), "kdtree"
+# (exact, scipy cKDTree), "balltree" (exact, sklearn BallTree), "hnsw"
+# (approximate, needs the optional hnswlib package) or "auto", which uses
+# brute force for small tables and a KD-tree for large ones. More backends can
+# be added with register_index_backend.
+
+SUBCROP_INDEX = os.environ.get("SUBCROP_INDEX", "auto")
+SUBCROP_INDEX_BRUTE_MAX_ROWS = int(os.environ.get("SUBCROP_INDEX_BRUTE_MAX_ROWS", 20000))
+SUBCROP_SCALING = os.environ.get("SUBCROP_SCALING", "standard")  # "standard" or "none" (raw units)
+# Per-feature weights applied after scaling, e.g. "ph=2,rainfall=0.5"
+SUBCROP_FEATURE_WEIGHTS = os.environ.get("SUBCROP_FEATURE_WEIGHTS", "")
+
+
+def parse_feature_weights(value, feature_columns):
+    weights = np.ones(len(feature_columns))
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, weight = item.partition("=")
+        if name.strip() not in feature_columns:
+            raise ValueError(f"Unknown feature in SUBCROP_FEATURE_WEIGHTS: {name.strip()}")
+        weights[feature_columns.index(name.strip())] = float(weight)
+    return weights
+
+
+class FeatureScaler:
+    def __init__(self, features, weights, scaling=SUBCROP_SCALING):
+        if scaling == "standard":
+            self.mean = features.mean(axis=0, dtype=np.float64)
+            scale = features.std(axis=0, dtype=np.float64)
+            self.scale = np.where(scale > 0, scale, 1.0)
+        elif scaling == "none":
+            self.mean = np.zeros(features.shape[1])
+            self.scale = np.ones(features.shape[1])
+        else:
+            raise ValueError(f"Unknown SUBCROP_SCALING: {scaling}")
+        self.factor = weights / self.scale
+
+    def transform(self, vectors):
+        return np.ascontiguousarray((np.asarray(vectors, dtype=np.float64) - self.mean) * self.factor, dtype=np.float32)
+
+
+# Backends take the scaled rows grouped by label (label_starts as in the
+# sub-crop tables) and return an (n_queries, n_labels) distance matrix.
+class BruteForceBackend:
+    def __init__(self, features, label_starts):
+        self.features = features
+        self.label_starts = label_starts
+        self.squared_norms = np.einsum("ij,ij->i", features, features, dtype=np.float64)
+
+    def label_distances(self, vectors):
+        squared = (np.einsum("ij,ij->i", vectors, vectors, dtype=np.float64)[:, None]
+                   + self.squared_norms[None, :] - 2 * (vectors @ self.features.T))
+        distances = np.sqrt(np.maximum(squared, 0))
+        return np.minimum.reduceat(distances, self.label_starts, axis=1)
+
+
+class PerLabelBackend:
+    def __init__(self, features, label_starts):
+        bounds = list(label_starts) + [len(features)]
+        self.indexes = [self.build(features[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def label_distances(self, vectors):
+        return np.column_stack([self.nearest(index, vectors) for index in self.indexes])
+
+
+class KDTreeBackend(PerLabelBackend):
+    def build(self, rows):
+        from scipy.spatial import cKDTree
+        return cKDTree(rows)
+
+    def nearest(self, index, vectors):
+        return index.query(vectors, k=1)[0]
+
+
+class BallTreeBackend(PerLabelBackend):
+    def build(self, rows):
+        from sklearn.neighbors import BallTree
+        return BallTree(rows)
+
+    def nearest(self, index, vectors):
+        return index.query(vectors, k=1)[0][:, 0]
+
+
+class HNSWBackend(PerLabelBackend):
+    def build(self, rows):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("SUBCROP_INDEX=hnsw requires the hnswlib package") from None
+        index = hnswlib.Index(space="l2", dim=rows.shape[1])
+        index.init_index(max_elements=len(rows), ef_construction=200, M=16)
+        index.add_items(rows)
+        index.set_ef(64)
+        return index
+
+    def nearest(self, index, vectors):
+        # hnswlib's l2 space returns squared distances
+        return np.sqrt(index.knn_query(vectors, k=1)[1][:, 0])
+
+
+INDEX_BACKENDS = {
+    "brute": BruteForceBackend,
+    "kdtree": KDTreeBackend,
+    "balltree": BallTreeBackend,
+    "hnsw": HNSWBackend,
+}
+
+
+def register_index_backend(name, backend_class):
+    INDEX_BACKENDS[name] = backend_class
+
+
+class SubCropIndex:
+    def __init__(self, features, label_starts, feature_columns, backend=SUBCROP_INDEX,
+                 scaling=SUBCROP_SCALING, weights=SUBCROP_FEATURE_WEIGHTS):
+        if isinstance(weights, str):
+            weights = parse_feature_weights(weights, feature_columns)
+        if backend == "auto":
+            backend = "brute" if len(features) <= SUBCROP_INDEX_BRUTE_MAX_ROWS else "kdtree"
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown SUBCROP_INDEX backend: {backend}")
+        self.backend_name = backend
+        self.scaler = FeatureScaler(features, weights, scaling)
+        self.backend = INDEX_BACKENDS[backend](self.scaler.transform(features), np.asarray(label_starts))
+        self.n_labels = len(label_starts)
+
+    # Indices and distances of the k nearest distinct labels per query, nearest
+    # first. Queries are scored in chunks to bound the distance matrix size.
+    def nearest_labels(self, vectors, k, chunk_size=4096):
+        vectors = np.atleast_2d(vectors)
+        k = min(k, self.n_labels)
+        top_labels, top_distances = [], []
+        for start in range(0, len(vectors), chunk_size):
+            label_distances = self.backend.label_distances(self.scaler.transform(vectors[start:start + chunk_size]))
+            if k <= 0:
+                top_labels.append(np.empty((len(label_distances), 0), dtype=np.int64))
+                top_distances.append(np.empty((len(label_distances), 0)))
+                continue
+            top = np.argpartition(label_distances, k - 1, axis=1)[:, :k]
+            distances = np.take_along_axis(label_distances, top, axis=1)
+            order = np.argsort(distances, axis=1, kind="stable")
+            top_labels.append(np.take_along_axis(top, order, axis=1))
+            top_distances.append(np.take_along_axis(distances, order, axis=1))
+        return np.concatenate(top_labels), np.concatenate(top_distances)
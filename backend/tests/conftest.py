@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Tests import the backend modules directly and run from a scratch directory,
+# so the price store, forecast cache and log file never touch the checkout.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+SCRATCH_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("MODEL_WARMUP", "lazy")
+os.environ.setdefault("PRICE_DB_PATH", os.path.join(SCRATCH_DIR, "price_data.db"))
+os.environ.setdefault("FORECAST_CACHE_DIR", os.path.join(SCRATCH_DIR, "model_cache"))
+
+from instrumentation import setup_logging  # noqa: E402
+
+# Installed before server.py / API.py are imported, which then reuse it
+LOG_PATH = os.path.join(SCRATCH_DIR, "test.log")
+setup_logging(LOG_PATH)
+
+
+@pytest.fixture
+def log_path():
+    return LOG_PATH
+
+
+@pytest.fixture
+def backend_dir(monkeypatch):
+    # Model files are opened relative to the backend directory
+    monkeypatch.chdir(BACKEND_DIR)
+    return BACKEND_DIR
+
+
+@pytest.fixture
+def flask_client(backend_dir):
+    import server
+    return server.app.test_client()
@@ -0,0 +1,95 @@
+import os
+from datetime import date, datetime
+import pytest
+import price_service
+import agmarknet_http
+from agmarknet_http import AGMARKNET_URL, PriceGridNotFound, fetch_market_prices_http
+from driver_pool import DriverPoolTimeout
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "agmarknet")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class StubResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+# Serves the saved pages in order and records every request made
+class StubSession:
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append(("GET", url, None))
+        return StubResponse(fixture(self.pages.pop(0)))
+
+    def post(self, url, data=None, **kwargs):
+        self.requests.append(("POST", url, dict(data)))
+        return StubResponse(fixture(self.pages.pop(0)))
+
+
+def fetch(session):
+    return fetch_market_prices_http("Rajasthan", "Onion", "Ajmer(F&V)", datetime(2024, 1, 1), datetime(2024, 1, 3),
+                                    session=session)
+
+
+def test_postbacks_are_replayed_with_the_page_state():
+    session = StubSession("home.html", "commodity_postback.html", "state_postback.html", "results.html")
+    rows = list(fetch(session))
+
+    assert [method for method, _, _ in session.requests] == ["GET", "POST", "POST", "POST"]
+    assert {url for _, url, _ in session.requests} == {AGMARKNET_URL}
+    commodity, state, go = (data for _, _, data in session.requests[1:])
+    # Each postback carries the state of the page it was made from
+    assert (commodity["__VIEWSTATE"], commodity["__EVENTVALIDATION"]) == ("VS-home", "EV-home")
+    assert (state["__VIEWSTATE"], state["__EVENTVALIDATION"]) == ("VS-commodity", "EV-commodity")
+    assert (go["__VIEWSTATE"], go["__EVENTVALIDATION"]) == ("VS-state", "EV-state")
+    assert commodity["__EVENTTARGET"] == "ddlCommodity" and commodity["ddlCommodity"] == "23"
+    assert state["__EVENTTARGET"] == "ddlState" and state["ddlState"] == "RJ"
+    assert "btnGo" not in commodity and "btnGo" not in state
+    assert go["btnGo"] == "Go" and "btnReset" not in go and "chkAll" not in go
+    assert (go["ddlCommodity"], go["ddlState"], go["ddlMarket"]) == ("23", "RJ", "1054")
+    assert (go["txtDate"], go["txtDateTo"]) == ("01-Jan-2024", "03-Jan-2024")
+    assert go["ddlArrivalPrice"] == "0"
+
+    assert [row["Date"] for row in rows] == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+    assert rows[0] == {"S.No": "1", "Market": "Ajmer(F&V)", "Commodity": "Onion", "Min Price": 1010,
+                       "Max Price": 1410, "Modal Price": 1210, "Date": date(2024, 1, 1), "State": "Rajasthan"}
+
+
+def test_unknown_market_fetches_nothing():
+    session = StubSession("home.html", "commodity_postback.html", "state_postback.html")
+    assert fetch_market_prices_http("Rajasthan", "Onion", "Kota", datetime(2024, 1, 1), datetime(2024, 1, 3),
+                                    session=session) == []
+    assert len(session.requests) == 3
+
+
+def test_no_data_page_raises_grid_not_found():
+    session = StubSession("home.html", "commodity_postback.html", "state_postback.html", "no_data.html")
+    with pytest.raises(PriceGridNotFound):
+        fetch(session)
+
+
+def test_no_data_page_falls_back_to_selenium(monkeypatch):
+    session = StubSession("home.html", "commodity_postback.html", "state_postback.html", "no_data.html")
+    monkeypatch.setattr(agmarknet_http, "create_session", lambda: session)
+    monkeypatch.setattr(price_service, "FETCH_ENGINE", "http")
+
+    class UnavailablePool:
+        def driver(self, timeout=None):
+            raise DriverPoolTimeout("Selenium engine reached")
+
+    monkeypatch.setattr(price_service, "get_driver_pool", lambda: UnavailablePool())
+    with pytest.raises(DriverPoolTimeout, match="Selenium engine reached"):
+        price_service.scrape_market_prices("Rajasthan", "Onion", "Ajmer(F&V)", datetime(2024, 1, 1),
+                                           datetime(2024, 1, 3))
+    assert len(session.requests) == 4
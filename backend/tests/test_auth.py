@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import pytest
+import server
+from password_hashing import HashingQueueFull, PasswordHasher
+
+
+class FakeCursor:
+    def execute(self, sql, params):
+        self.params = params
+
+    def fetchall(self):
+        return [("farmer", "$2b$12$" + "x" * 53)]
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    def cursor(self, prepared=False):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def auth_client(flask_client, monkeypatch):
+    monkeypatch.setattr(server, "get_db_connection", FakeDB)
+    monkeypatch.setattr(server, "close_db_connection", lambda db, cursor: None)
+    return flask_client
+
+
+def raise_(error):
+    def fn(*args):
+        raise error
+    return fn
+
+
+@pytest.mark.parametrize("path, method", [("/signup", "hash"), ("/login", "check")])
+@pytest.mark.parametrize("error", [FutureTimeoutError(), HashingQueueFull("Too many pending")])
+def test_hashing_unavailable_returns_503(auth_client, monkeypatch, path, method, error):
+    monkeypatch.setattr(server.password_hasher, method, raise_(error))
+    response = auth_client.post(path, json={"username": "farmer", "email": "f@example.com", "password": "secret"})
+    assert response.status_code == 503
+    assert response.is_json and response.json["error"]
+    assert int(response.headers["Retry-After"]) > 0
+
+
+class SlowBcrypt:
+    def generate_password_hash(self, password, rounds):
+        time.sleep(0.2)
+        return b"hash"
+
+
+def test_timed_out_hash_is_dropped_from_the_queue():
+    hasher = PasswordHasher(SlowBcrypt(), workers=1, timeout=0.05)
+    with pytest.raises(FutureTimeoutError):
+        hasher.hash("running")
+    with pytest.raises(FutureTimeoutError):
+        hasher.hash("queued")
+    assert hasher.metrics()["queue_depth"] == 0
+
+
+@pytest.mark.parametrize("error", [FutureTimeoutError(), HashingQueueFull("Too many pending")])
+def test_failed_rehash_does_not_fail_the_login(auth_client, monkeypatch, error):
+    monkeypatch.setattr(server.password_hasher, "check", lambda pw_hash, password: True)
+    monkeypatch.setattr(server.password_hasher, "needs_rehash", lambda pw_hash: True)
+    monkeypatch.setattr(server.password_hasher, "hash", raise_(error))
+    response = auth_client.post("/login", json={"email": "f@example.com", "password": "secret"})
+    assert response.status_code == 200
+    assert response.json == {"message": "Login successful", "username": "farmer"}
@@ -0,0 +1,70 @@
+from datetime import date
+import pytest
+import backfill
+from backfill import backfill as run_backfill, fetch_window
+from price_store import PriceStore, EmptyFetch
+from agmarknet_http import PriceGridNotFound
+
+SERIES = ("Rajasthan", "Ajmer(F&V)", "Onion")
+WINDOW = (date(2024, 1, 1), date(2024, 1, 31))
+
+
+def record(day):
+    return {"S.No": "1", "Market": SERIES[1], "Commodity": SERIES[2], "Min Price": 1000, "Max Price": 1400,
+            "Modal Price": 1200, "Date": day.isoformat(), "State": SERIES[0]}
+
+
+class ScriptedFetch:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, state, commodity, market, from_date, to_date):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(backfill.time, "sleep", lambda seconds: None)
+    store = PriceStore(str(tmp_path / "prices.db"))
+    store.save_prices(*SERIES, [record(date(2024, 1, 10))], *WINDOW, update_coverage=False)
+    return store
+
+
+def stored_rows(store):
+    return store.load_prices(*SERIES, *WINDOW)
+
+
+@pytest.mark.parametrize("outcome", [PriceGridNotFound("Price grid not found in response"), []])
+def test_missing_grid_or_empty_result_fails_without_touching_the_window(store, outcome):
+    fetch = ScriptedFetch(outcome)
+    result = fetch_window(store, fetch, *SERIES, *WINDOW, retries=2)
+    assert result["status"] == "failed"
+    assert fetch.calls == 2
+    assert len(stored_rows(store)) == 1
+    assert store.completed_windows(*SERIES) == {}
+
+
+def test_failed_attempt_is_retried(store):
+    fetch = ScriptedFetch(PriceGridNotFound("Price grid not found in response"), [record(date(2024, 1, 5))])
+    result = fetch_window(store, fetch, *SERIES, *WINDOW, retries=3)
+    assert result["status"] == "ok" and result["attempts"] == 2
+    assert [row["Date"] for row in stored_rows(store)] == ["2024-01-05"]
+    assert store.completed_windows(*SERIES) == {WINDOW: 1}
+
+
+def test_empty_grid_is_checkpointed_as_empty(store):
+    result = fetch_window(store, ScriptedFetch(EmptyFetch()), *SERIES, *WINDOW, retries=2)
+    assert result["status"] == "ok" and result["rows"] == 0
+    assert store.completed_windows(*SERIES) == {WINDOW: 0}
+
+
+def test_backfill_only_covers_the_range_when_every_window_succeeds(store):
+    results = list(run_backfill(*SERIES, date(2024, 1, 1), date(2024, 2, 29), workers=1, retries=1, store=store,
+                                fetch_fn=ScriptedFetch([])))
+    assert results[-1]["failed"] == 2
+    assert store.coverage(*SERIES) is None
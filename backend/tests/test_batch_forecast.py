@@ -0,0 +1,101 @@
+import asyncio
+import time
+import threading
+import pytest
+import batch_forecast
+from batch_forecast import run_batch, stream_batch, BATCH_MAX_CONCURRENT
+from jobs import JobManager, JobQueueFull
+
+SERIES = [{"state": "Tamil Nadu", "market": f"Market {i}", "commodity": "Tomato", "source": "csv"} for i in range(6)]
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(scrape_workers=1, fit_workers=4, fit_executor="thread")
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def fake_forecast(monkeypatch):
+    calls = {"running": 0, "peak": 0, "started": 0}
+    lock = threading.Lock()
+
+    def forecast_series(series, horizons=None, interval_levels=None):
+        with lock:
+            calls["started"] += 1
+            calls["running"] += 1
+            calls["peak"] = max(calls["peak"], calls["running"])
+        time.sleep(0.01)
+        with lock:
+            calls["running"] -= 1
+        return {**batch_forecast.series_identity(series), "source": series["source"], "status": "ok"}
+
+    monkeypatch.setattr(batch_forecast, "forecast_series", forecast_series)
+    return calls
+
+
+def test_run_batch_bounds_series_in_flight(manager, fake_forecast):
+    results = list(run_batch(SERIES, workers=2, manager=manager))
+    assert sorted(result["market"] for result in results) == sorted(series["market"] for series in SERIES)
+    assert fake_forecast["peak"] <= 2
+
+
+def test_closing_run_batch_stops_submitting(manager, fake_forecast):
+    results = run_batch(SERIES, workers=1, manager=manager)
+    next(results)
+    results.close()
+    assert fake_forecast["started"] <= 2
+
+
+def test_concurrent_batches_are_capped(manager, fake_forecast, monkeypatch):
+    monkeypatch.setattr(batch_forecast, "get_job_manager", lambda: manager)
+    streams = [stream_batch(SERIES[:1]) for _ in range(BATCH_MAX_CONCURRENT)]
+    with pytest.raises(JobQueueFull):
+        stream_batch(SERIES[:1])
+    # A stream frees its slot when exhausted, and when closed without being read
+    assert list(streams[0])[-1].startswith('{"summary"')
+    streams[1].close()
+    for stream in [stream_batch(SERIES[:1]) for _ in range(BATCH_MAX_CONCURRENT)]:
+        stream.close()
+
+
+def assert_all_slots_free():
+    streams = [stream_batch([]) for _ in range(BATCH_MAX_CONCURRENT)]
+    for stream in streams:
+        stream.close()
+
+
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+def test_api_stream_frees_its_slot_on_disconnect(manager, fake_forecast, monkeypatch, spec_version):
+    from starlette.requests import ClientDisconnect
+    from API import BatchStreamingResponse
+    monkeypatch.setattr(batch_forecast, "get_job_manager", lambda: manager)
+    response = BatchStreamingResponse(stream_batch(SERIES))
+    sent = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message.get("body") and spec_version == "2.4":
+            raise OSError("Connection reset by peer")
+        sent.append(message)
+
+    scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+    try:
+        asyncio.run(response(scope, receive, send))
+    except ClientDisconnect:
+        pass
+    assert not any(message.get("more_body") is False for message in sent)
+    assert_all_slots_free()
+
+
+def test_flask_stream_frees_its_slot_when_closed(flask_client, manager, fake_forecast, monkeypatch):
+    import server
+    monkeypatch.setattr(batch_forecast, "get_job_manager", lambda: manager)
+    monkeypatch.setattr(server, "resolve_series", lambda requested: (SERIES, []))
+    response = flask_client.post("/forecast_batch", json={}, buffered=False)
+    assert next(response.response)
+    response.close()
+    assert_all_slots_free()
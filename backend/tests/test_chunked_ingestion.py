@@ -0,0 +1,67 @@
+import csv
+from datetime import date
+import pytest
+import price_store
+from price_store import PriceStore, EmptyFetch, chunked, write_records_csv
+from agmarknet_http import PriceGridNotFound, iter_price_grid, price_grid_rows
+
+HEADER = "<tr><th>Sl no.</th>" + "<th>col</th>" * 9 + "</tr>"
+
+
+def grid_row(i, day="01 Jan 2024", modal="1,200"):
+    cols = [str(i), "Rajasthan", "Ajmer(F&V)", "Onion", "Other", "FAQ", "1,000", "1,400", modal, day]
+    return "<tr>" + "".join(f"<td>{col}</td>" for col in cols) + "</tr>"
+
+
+def page(rows):
+    return f'<html><body><table id="cphBody_GridPriceData">{HEADER}{"".join(rows)}</table></body></html>'
+
+
+def records(count):
+    for i in range(count):
+        yield {"S.No": str(i), "Market": "Ajmer(F&V)", "Commodity": "Onion", "Min Price": 1000,
+               "Max Price": 1400, "Modal Price": 1200, "Date": date(2024, 1, 1 + i % 28), "State": "Rajasthan"}
+
+
+def test_chunked_splits_lazily():
+    consumed = []
+    source = (consumed.append(i) or i for i in range(7))
+    chunks = chunked(source, 3)
+    assert next(chunks) == [0, 1, 2]
+    assert consumed == [0, 1, 2]
+    assert list(chunks) == [[3, 4, 5], [6]]
+    assert list(chunked([], 3)) == []
+
+
+def test_grid_rows_are_typed_and_undated_rows_dropped():
+    rows = list(iter_price_grid(page([grid_row(1), grid_row(2, day="n/a"), grid_row(3, modal="")]), "Ajmer(F&V)",
+                                "Rajasthan"))
+    assert [row["S.No"] for row in rows] == ["1", "3"]
+    assert rows[0]["Date"] == date(2024, 1, 1)
+    assert rows[0]["Modal Price"] == 1200 and rows[1]["Modal Price"] is None
+
+
+def test_price_grid_rows_checks_for_the_grid_up_front():
+    with pytest.raises(PriceGridNotFound):
+        price_grid_rows("<html><body><p>No data</p></body></html>", "Ajmer(F&V)", "Rajasthan")
+    assert isinstance(price_grid_rows(page([]), "Ajmer(F&V)", "Rajasthan"), EmptyFetch)
+
+
+def test_save_prices_inserts_in_chunks(tmp_path, monkeypatch):
+    store = PriceStore(str(tmp_path / "prices.db"))
+    sizes = []
+    original = price_store.chunked
+    monkeypatch.setattr(price_store, "chunked", lambda rows: (sizes.append(len(c)) or c for c in original(rows, 10)))
+    saved = store.save_prices("Rajasthan", "Ajmer(F&V)", "Onion", records(25), date(2024, 1, 1), date(2024, 1, 28))
+    assert saved == 25
+    assert sizes == [10, 10, 5]
+    assert len(store.load_prices("Rajasthan", "Ajmer(F&V)", "Onion", date(2024, 1, 1), date(2024, 1, 28))) == 25
+
+
+def test_write_records_csv_streams_in_chunks(tmp_path):
+    path = tmp_path / "prices.csv"
+    assert write_records_csv(records(25), str(path), chunk_size=4) == 25
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 25
+    assert rows[0]["Date"] == "2024-01-01"
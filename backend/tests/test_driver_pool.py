@@ -0,0 +1,122 @@
+import pytest
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from driver_pool import DriverPool, DriverPoolTimeout
+
+
+class FakeDriver:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.quit_calls = 0
+        self.cookie_clears = 0
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise WebDriverException("chrome not reachable")
+        return "about:blank"
+
+    def delete_all_cookies(self):
+        self.cookie_clears += 1
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class FakeDriverPool(DriverPool):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.created = []
+
+    def _create_driver(self):
+        driver = FakeDriver(len(self.created))
+        self.created.append(driver)
+        return driver
+
+
+def test_driver_is_reused_and_cookies_cleared():
+    pool = FakeDriverPool(max_size=1, max_uses=10)
+    with pool.driver() as first:
+        pass
+    with pool.driver() as second:
+        pass
+    assert second is first
+    assert first.cookie_clears == 2
+    assert pool.metrics()["created"] == 1
+
+
+def test_driver_is_recycled_after_max_uses():
+    pool = FakeDriverPool(max_size=1, max_uses=3)
+    used = []
+    for _ in range(4):
+        with pool.driver() as driver:
+            used.append(driver)
+    assert used[:3] == [pool.created[0]] * 3
+    assert used[3] is pool.created[1]
+    assert pool.created[0].quit_calls == 1
+    assert pool.metrics()["recycle_count"] == 1
+
+
+def test_browser_error_discards_driver():
+    pool = FakeDriverPool(max_size=1)
+    with pytest.raises(WebDriverException):
+        with pool.driver():
+            raise WebDriverException("session deleted because of page crash")
+    assert pool.created[0].quit_calls == 1
+    with pool.driver() as driver:
+        assert driver is pool.created[1]
+
+
+def test_page_error_keeps_driver():
+    pool = FakeDriverPool(max_size=1)
+    with pytest.raises(TimeoutException):
+        with pool.driver():
+            raise TimeoutException("page load timed out")
+    with pool.driver() as driver:
+        assert driver is pool.created[0]
+    assert pool.created[0].quit_calls == 0
+    assert pool.metrics()["recycle_count"] == 0
+
+
+def test_unhealthy_idle_driver_is_replaced():
+    pool = FakeDriverPool(max_size=1)
+    with pool.driver() as driver:
+        pass
+    driver.alive = False
+    with pool.driver() as replacement:
+        assert replacement is pool.created[1]
+    assert driver.quit_calls == 1
+    assert pool.metrics()["recycle_count"] == 1
+
+
+def test_checkout_is_bounded():
+    pool = FakeDriverPool(max_size=2)
+    first, second = pool.acquire(), pool.acquire()
+    assert pool.metrics()["in_use"] == 2
+    with pytest.raises(DriverPoolTimeout):
+        pool.acquire(timeout=0.05)
+    assert pool.metrics()["timeouts"] == 1
+    assert len(pool.created) == 2
+
+    pool.release(first)
+    assert pool.acquire(timeout=0.05) is first
+    pool.release(first)
+    pool.release(second)
+    metrics = pool.metrics()
+    assert metrics["in_use"] == 0 and metrics["idle"] == 2
+
+
+def test_failed_driver_creation_frees_its_slot():
+    class FailingPool(FakeDriverPool):
+        fail = True
+
+        def _create_driver(self):
+            if self.fail:
+                self.fail = False
+                raise WebDriverException("chromedriver not found")
+            return super()._create_driver()
+
+    pool = FailingPool(max_size=1)
+    with pytest.raises(WebDriverException):
+        pool.acquire(timeout=0.05)
+    assert pool.acquire(timeout=0.05) is pool.created[0]
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import forecasting
+from forecasting import ForecastModelCache, model_spec, series_fingerprint
+
+
+def weekly_series(weeks=30):
+    rng = np.random.default_rng(3)
+    index = pd.date_range("2023-01-01", periods=weeks, freq="W-SUN")
+    return pd.Series(1000 + rng.normal(0, 20, weeks).cumsum(), index=index)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "model_cache")
+
+
+def test_memory_hit(cache_dir):
+    cache = ForecastModelCache(cache_dir=cache_dir)
+    cache.put("a", [0.5, 0.1, 400.0])
+    np.testing.assert_array_equal(cache.get("a"), [0.5, 0.1, 400.0])
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["disk_hits"] == 0
+
+
+def test_disk_round_trip(cache_dir):
+    ForecastModelCache(cache_dir=cache_dir).put("a", [0.5, 0.1, 400.0])
+    assert os.path.exists(os.path.join(cache_dir, "a.npz"))
+    restarted = ForecastModelCache(cache_dir=cache_dir)
+    np.testing.assert_array_equal(restarted.get("a"), [0.5, 0.1, 400.0])
+    assert restarted.get("a") is not None
+    stats = restarted.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_memory_is_lru_bounded():
+    cache = ForecastModelCache(cache_dir=None, max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_disk_is_evicted_oldest_first(cache_dir):
+    cache = ForecastModelCache(cache_dir=cache_dir)
+    cache.put("a", np.zeros(100))
+    entry_bytes = os.path.getsize(os.path.join(cache_dir, "a.npz"))
+    cache.max_disk_bytes = 2 * entry_bytes
+    os.utime(os.path.join(cache_dir, "a.npz"), (1, 1))
+    cache.put("b", np.zeros(100))
+    cache.put("c", np.zeros(100))
+    assert sorted(os.listdir(cache_dir)) == ["b.npz", "c.npz"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_fit_is_cached_by_series_fingerprint(cache_dir):
+    cache = ForecastModelCache(cache_dir=cache_dir)
+    series = weekly_series()
+    first = cache.fit(series)
+    assert cache.stats()["misses"] == 1
+    np.testing.assert_allclose(cache.fit(series).params, first.params)
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.get(series_fingerprint(series, model_spec(series))) is not None
+
+
+def test_changed_series_warm_starts_from_the_cached_params(cache_dir, monkeypatch):
+    cache = ForecastModelCache(cache_dir=cache_dir, warm_start_points=4)
+    series = weekly_series()
+    shorter = cache.fit(series.iloc[:-2])
+
+    starts = []
+    fit_model = forecasting.fit_model
+    monkeypatch.setattr(forecasting, "fit_model",
+                        lambda model, spec, start_params=None: starts.append(start_params) or fit_model(
+                            model, spec, start_params))
+    cache.fit(series)
+    assert cache.stats()["warm_starts"] == 1
+    np.testing.assert_array_equal(starts[0], shorter.params)
+
+    # A series that is not an extension of a cached one starts cold
+    cache.fit(series + 50)
+    assert starts[1] is None
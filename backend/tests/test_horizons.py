@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from forecasting import (
+    MAX_HORIZON_STEPS, build_model, fit_model, forecast_horizons, model_spec, parse_horizons, parse_interval_levels,
+)
+
+PRICE_REQUEST = {"state": "Rajasthan", "market": "Ajmer(F&V)", "commodity": "Onion"}
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(11)
+    index = pd.date_range("2023-01-01", periods=40, freq="W-SUN")
+    series = pd.Series(1000 + rng.normal(0, 15, 40).cumsum(), index=index)
+    spec = model_spec(series)
+    return series, fit_model(build_model(series, spec), spec)
+
+
+def test_sliced_horizons_equal_separate_forecasts(fitted):
+    series, model = fitted
+    horizons = {"one_week": 1, "one_month": 4, "three_months": 12}
+    predictions = forecast_horizons(model, series.index[-1], horizons, [0.8, 0.95])
+    assert list(predictions) == list(horizons)
+    for name, steps in horizons.items():
+        separate = forecast_horizons(model, series.index[-1], {name: steps}, [0.8, 0.95])[name]
+        assert predictions[name]["dates"] == separate["dates"]
+        assert len(separate["dates"]) == steps
+        np.testing.assert_allclose(predictions[name]["predicted_prices"], separate["predicted_prices"])
+        for label in ("80", "95"):
+            for side in ("lower", "upper"):
+                np.testing.assert_allclose(predictions[name]["intervals"][label][side],
+                                           separate["intervals"][label][side])
+    assert predictions["one_week"]["dates"] == [(series.index[-1] + pd.Timedelta(weeks=1)).strftime("%Y-%m-%d")]
+
+
+def test_forecasts_are_clipped_to_the_cap(fitted):
+    series, model = fitted
+    predictions = forecast_horizons(model, series.index[-1], {"h": 12}, [0.95], cap=series.max())
+    assert max(predictions["h"]["intervals"]["95"]["upper"]) <= series.max()
+    assert min(predictions["h"]["predicted_prices"]) >= 0
+
+
+def test_parse_horizons():
+    assert parse_horizons([1, 4]) == {"1_weeks": 1, "4_weeks": 4}
+    assert parse_horizons({"soon": 2}) == {"soon": 2}
+    assert parse_horizons(None)["six_months"] == 24
+
+
+@pytest.mark.parametrize("value", [[0], [MAX_HORIZON_STEPS + 1], [1.5], [True], {"soon": "4"}, [], "4", 4])
+def test_invalid_horizons_raise(value):
+    with pytest.raises(ValueError):
+        parse_horizons(value)
+
+
+@pytest.mark.parametrize("value", [[0], [100], [-5], "0.95", [True]])
+def test_invalid_interval_levels_raise(value):
+    with pytest.raises(ValueError):
+        parse_interval_levels(value)
+
+
+@pytest.mark.parametrize("path", ["/predict_prices", "/predict_prices/jobs"])
+@pytest.mark.parametrize("horizons", [[MAX_HORIZON_STEPS + 1], [0], {"soon": "4"}])
+def test_invalid_horizons_are_a_400_on_flask(flask_client, path, horizons):
+    response = flask_client.post(path, json={**PRICE_REQUEST, "horizons": horizons})
+    assert response.status_code == 400
+    assert "Horizon" in response.json["error"] or "horizons" in response.json["error"]
+
+
+def test_invalid_horizons_are_a_400_on_fastapi(backend_dir):
+    import API
+    response = TestClient(API.app).post("/predict_prices", json={**PRICE_REQUEST, "horizons": [MAX_HORIZON_STEPS + 1]})
+    assert response.status_code == 400
+    assert str(MAX_HORIZON_STEPS) in response.json()["detail"]
@@ -0,0 +1,21 @@
+import os
+import sys
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK = """
+import os, sys
+sys.path.insert(0, sys.argv[1])
+import server, API
+print(sorted({name.split(".")[0] for name in sys.modules if name.startswith("selenium")}))
+print(os.path.exists("model_cache"))
+"""
+
+
+def test_importing_the_backends_loads_no_selenium_and_writes_no_cache(tmp_path):
+    env = {**os.environ, "MODEL_WARMUP": "lazy", "PRICE_DB_PATH": str(tmp_path / "prices.db")}
+    env.pop("FORECAST_CACHE_DIR", None)
+    output = subprocess.run([sys.executable, "-c", CHECK, BACKEND_DIR], cwd=tmp_path, env=env, check=True,
+                            capture_output=True, text=True).stdout.split("\n")
+    assert output[:2] == ["[]", "False"]
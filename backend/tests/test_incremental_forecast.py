@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from forecasting import ForecastModelCache, IncrementalForecaster, build_model, fit_model, model_spec
+
+KEY = ("Rajasthan", "Ajmer(F&V)", "Onion")
+
+
+def weekly_series(weeks=40, seed=7):
+    rng = np.random.default_rng(seed)
+    values = [1000.0]
+    for _ in range(weeks + 9):
+        values.append(1000 + 0.7 * (values[-1] - 1000) + rng.normal(0, 20))
+    index = pd.date_range("2023-01-01", periods=weeks + 10, freq="W-SUN")
+    return pd.Series(values, index=index)
+
+
+@pytest.fixture
+def full():
+    return weekly_series()
+
+
+def forecaster(tmp_path, **kwargs):
+    return IncrementalForecaster(ForecastModelCache(cache_dir=str(tmp_path / "cache")), **kwargs)
+
+
+def test_extending_by_new_weeks_matches_a_fresh_fit(tmp_path, full):
+    incremental = forecaster(tmp_path, refit_every=13, drift_threshold=10)
+    incremental.fit(KEY, full.iloc[:-3])
+    extended = incremental.fit(KEY, full)
+    assert incremental.stats()["incremental_updates"] == 1
+    assert extended.get_forecast(1).predicted_mean.index[0] == full.index[-1] + full.index.freq
+
+    spec = model_spec(full)
+    fresh = fit_model(build_model(full, spec), spec)
+    np.testing.assert_allclose(extended.get_forecast(4).predicted_mean, fresh.get_forecast(4).predicted_mean,
+                               rtol=0.02)
+
+
+def test_unchanged_series_reuses_the_results(tmp_path, full):
+    incremental = forecaster(tmp_path)
+    first = incremental.fit(KEY, full)
+    assert incremental.fit(KEY, full) is first
+    assert incremental.stats()["unchanged"] == 1
+
+
+def test_drift_beyond_the_threshold_forces_a_refit(tmp_path, full):
+    incremental = forecaster(tmp_path, drift_threshold=3.0)
+    incremental.fit(KEY, full.iloc[:-2])
+    shifted = full.copy()
+    shifted.iloc[-2:] = 5000.0
+    incremental.fit(KEY, shifted)
+    stats = incremental.stats()
+    assert stats["drift_refits"] == 1 and stats["incremental_updates"] == 0
+
+
+def test_refit_interval_is_honoured(tmp_path, full):
+    incremental = forecaster(tmp_path, refit_every=3, drift_threshold=100)
+    incremental.fit(KEY, full.iloc[:-3])
+    for end in (-2, -1):
+        incremental.fit(KEY, full.iloc[:end])
+    assert incremental.stats()["incremental_updates"] == 2
+    incremental.fit(KEY, full)
+    assert incremental.stats()["scheduled_refits"] == 1
+
+
+def test_refit_max_age_is_honoured(tmp_path, full):
+    incremental = forecaster(tmp_path, refit_max_age_days=0, drift_threshold=100)
+    incremental.fit(KEY, full.iloc[:-1])
+    incremental.fit(KEY, full)
+    assert incremental.stats()["scheduled_refits"] == 1
+
+
+def test_changed_history_never_reuses_stale_state(tmp_path, full):
+    incremental = forecaster(tmp_path, drift_threshold=100)
+    incremental.fit(KEY, full.iloc[:-1])
+    revised = full.copy()
+    revised.iloc[5] += 300
+    results = incremental.fit(KEY, revised)
+    assert incremental.stats()["full_fits"] == 2 and incremental.stats()["incremental_updates"] == 0
+
+    spec = model_spec(revised)
+    np.testing.assert_allclose(results.params, fit_model(build_model(revised, spec), spec).params)
+
+    # The state saved on disk is checked the same way by another process
+    other = forecaster(tmp_path, drift_threshold=100)
+    other.fit(KEY, full)
+    assert other.stats()["full_fits"] == 1
@@ -0,0 +1,40 @@
+import re
+from datetime import date, datetime
+import price_service
+from instrumentation import collect_spans, get_metrics, timed_iter
+from price_store import PriceStore
+
+
+def stage_count(stage):
+    match = re.search(rf'^pipeline_stage_seconds_count{{stage="{stage}"}} (\d+)$', get_metrics().render(), re.M)
+    return int(match.group(1)) if match else 0
+
+
+def grid_records(count):
+    for i in range(count):
+        yield {"S.No": str(i), "Market": "Ajmer(F&V)", "Commodity": "Onion", "Min Price": 1000, "Max Price": 1400,
+               "Modal Price": 1200, "Date": date(2024, 1, 1 + i % 28), "State": "Rajasthan"}
+
+
+def test_timed_iter_records_one_span_per_iteration():
+    with collect_spans() as spans:
+        assert list(timed_iter("parse", range(50))) == list(range(50))
+    assert [stage for stage, _ in spans] == ["parse"]
+
+
+def test_closed_timed_iter_records_its_span():
+    with collect_spans() as spans:
+        items = timed_iter("parse", range(50))
+        next(items)
+        items.close()
+    assert [stage for stage, _ in spans] == ["parse"]
+
+
+def test_one_fetch_is_one_parse_observation(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_service, "scrape_market_prices", lambda *args: grid_records(283))
+    store = PriceStore(str(tmp_path / "prices.db"))
+    before = stage_count("parse")
+    records = price_service.fetch_market_prices("Rajasthan", "Onion", "Ajmer(F&V)", datetime(2024, 1, 1),
+                                                datetime(2024, 1, 28))
+    assert store.save_prices("Rajasthan", "Ajmer(F&V)", "Onion", records, date(2024, 1, 1), date(2024, 1, 28)) == 283
+    assert stage_count("parse") == before + 1
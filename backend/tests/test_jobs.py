@@ -0,0 +1,89 @@
+import os
+import threading
+import pytest
+from jobs import JobManager, JobQueueFull
+
+
+def scrape(data, gate=None):
+    if gate is not None:
+        gate.wait(5)
+    return data
+
+
+def double(data):
+    return data * 2
+
+
+# Kills its worker when asked to; marker makes it die only on the first attempt
+def fit_or_die(data):
+    action, marker = data
+    if action == "die" or (action == "die_once" and not os.path.exists(marker)):
+        if marker:
+            open(marker, "w").close()
+        os._exit(1)
+    return action
+
+
+def finish(data, fitted):
+    return 200, {"fitted": fitted}
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(scrape_workers=2, fit_workers=1, fit_executor="thread", max_pending=2)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def process_manager():
+    manager = JobManager(scrape_workers=1, fit_workers=1, fit_executor="process")
+    yield manager
+    manager.shutdown()
+
+
+def test_identical_keys_share_one_job(manager):
+    gate = threading.Event()
+    first = manager.submit(("Rajasthan", "Ajmer(F&V)", "Onion"), scrape, (3, gate), double, finish)
+    same = manager.submit(("Rajasthan", "Ajmer(F&V)", "Onion"), scrape, (5, gate), double, finish)
+    other = manager.submit(("Rajasthan", "Ajmer(F&V)", "Potato"), scrape, (7, gate), double, finish)
+    assert same is first
+    assert other is not first
+    gate.set()
+    assert first.wait(5).result == {"fitted": 6}
+    assert other.wait(5).result == {"fitted": 14}
+
+
+def test_finished_job_is_not_reused(manager):
+    first = manager.submit("key", scrape, (1,), double, finish)
+    first.wait(5)
+    second = manager.submit("key", scrape, (2,), double, finish)
+    assert second is not first
+    assert second.wait(5).result == {"fitted": 4}
+    assert manager.get(first.id) is first
+
+
+def test_pending_jobs_are_bounded(manager):
+    gate = threading.Event()
+    manager.submit("a", scrape, (1, gate), double, finish)
+    manager.submit("b", scrape, (1, gate), double, finish)
+    with pytest.raises(JobQueueFull):
+        manager.submit("c", scrape, (1, gate), double, finish)
+    # Coalescing into an in-flight job is still allowed at the limit
+    assert manager.submit("a", scrape, (1, gate), double, finish) is not None
+    gate.set()
+
+
+def test_dead_fit_worker_fails_only_its_job(process_manager):
+    dead = process_manager.submit("dead", scrape, (("die", None),), fit_or_die, finish).wait(30)
+    assert dead.status == "failed"
+    assert dead.status_code == 500
+
+    ok = process_manager.submit("ok", scrape, (("ok", None),), fit_or_die, finish).wait(30)
+    assert ok.status == "done"
+    assert ok.result == {"fitted": "ok"}
+
+
+def test_fit_lost_to_a_dead_worker_is_retried(process_manager, tmp_path):
+    job = process_manager.submit("retry", scrape, (("die_once", str(tmp_path / "died")),), fit_or_die, finish)
+    assert job.wait(30).result == {"fitted": "die_once"}
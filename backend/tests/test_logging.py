@@ -0,0 +1,37 @@
+import time
+import uuid
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from jobs import JobManager
+
+
+def log_in_worker(message):
+    logging.info(message)
+    return message
+
+
+def wait_for_line(path, message, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(path) as f:
+            if message in f.read():
+                return True
+        time.sleep(0.05)
+    return False
+
+
+def test_process_pool_worker_records_reach_the_log(log_path):
+    message = f"worker record {uuid.uuid4().hex}"
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(log_in_worker, message).result(30) == message
+    assert wait_for_line(log_path, message)
+
+
+def test_fit_pool_records_reach_the_log_while_the_worker_lives(log_path):
+    manager = JobManager(scrape_workers=1, fit_workers=1, fit_executor="process")
+    try:
+        message = f"fit record {uuid.uuid4().hex}"
+        assert manager.submit_fit(log_in_worker, message).result(30) == message
+        assert wait_for_line(log_path, message)
+    finally:
+        manager.shutdown()
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import train
+from model_artifact import ALIGNMENT, read_artifact, read_manifest, write_artifact
+from train import SubCropRecommender, build_recommender_artifact, load_recommender
+
+SAMPLES = [
+    {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9},
+    {"N": 20, "P": 130, "K": 200, "temperature": 23.0, "humidity": 92.0, "ph": 5.9, "rainfall": 112.0},
+    {"N": 118, "P": 33, "K": 30, "temperature": 24.0, "humidity": 56.0, "ph": 6.7, "rainfall": 70.0},
+    {"N": 500, "P": 5, "K": 5, "temperature": 45.0, "humidity": 20.0, "ph": 9.5, "rainfall": 20.0},
+]
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "model.npz")
+    arrays = {
+        "weights": np.arange(12, dtype=np.float32).reshape(3, 4),
+        "labels": np.array(["rice", "maize"]),
+        "offsets": np.array([0, 5, 9], dtype=np.int64),
+        "empty": np.zeros(0),
+    }
+    write_artifact(path, arrays, {"format": "test", "version": 3})
+
+    loaded = read_artifact(path)
+    assert read_manifest(loaded) == {"format": "test", "version": 3}
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array)
+        assert loaded[name].dtype == array.dtype
+    for name in ("weights", "labels", "offsets"):
+        assert isinstance(loaded[name], np.memmap)
+        assert loaded[name].offset % ALIGNMENT == 0
+        assert not loaded[name].flags.writeable
+    # Still an ordinary .npz
+    with np.load(path) as npz:
+        np.testing.assert_array_equal(npz["weights"], arrays["weights"])
+
+
+def test_object_arrays_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        write_artifact(str(tmp_path / "model.npz"), {"bad": np.array([{}, None], dtype=object)}, {})
+
+
+@pytest.fixture
+def artifact_path(backend_dir, tmp_path):
+    return build_recommender_artifact(path=str(tmp_path / "recommender.npz"), classifier_metrics={})
+
+
+def test_artifact_recommendations_match_csv_recommender(artifact_path):
+    expected = SubCropRecommender(main_model_path="main_crop_model.pkl")
+    expected.build_subcrop_indexes()
+    loaded = load_recommender(artifact_path)
+    assert loaded.artifact_path == artifact_path
+    tables = [table for table in loaded.subcrop_tables.values() if not table["error"]]
+    assert tables and all(isinstance(table["features"], np.memmap) for table in tables)
+    for sample in SAMPLES:
+        result = loaded.recommend_sub_crops(**sample, num_recommendations=5)
+        assert result["sub_crops"]
+        assert result == expected.recommend_sub_crops(**sample, num_recommendations=5)
+
+
+def test_version_mismatch_is_rejected(artifact_path, tmp_path):
+    arrays = read_artifact(artifact_path, mmap=False)
+    manifest = read_manifest(arrays)
+    stale = str(tmp_path / "stale.npz")
+    write_artifact(stale, {name: arrays[name] for name in arrays if name != "manifest"},
+                   {**manifest, "version": train.ARTIFACT_VERSION + 1})
+    with pytest.raises(ValueError, match="is not a version"):
+        SubCropRecommender.from_artifact(stale)
+    with pytest.raises(ValueError, match="is not a version"):
+        load_recommender(stale)
+    # The current version is still accepted
+    assert SubCropRecommender.from_artifact(artifact_path).artifact_version.startswith("artifact-")
@@ -0,0 +1,85 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from panel_forecast import PANEL_ALPHAS, PANEL_BETAS, PANEL_DAMPING, fit_panel, forecast_panel, stack_series
+
+
+def weekly(values, end="2024-06-30"):
+    return pd.Series(values, index=pd.date_range(end=end, periods=len(values), freq="W-SUN"), dtype=float)
+
+
+@pytest.fixture
+def ragged():
+    rng = np.random.default_rng(5)
+    return [
+        weekly(1000 + rng.normal(0, 25, 60).cumsum()),
+        weekly(400 + np.arange(25) * 3.0 + rng.normal(0, 5, 25), end="2024-05-05"),
+        weekly(2500 + rng.normal(0, 60, 8)),
+    ]
+
+
+# The damped-trend smoother for one series, one grid point at a time
+def reference_fit(values, phi=PANEL_DAMPING):
+    best = None
+    for alpha, beta in itertools.product(PANEL_ALPHAS, PANEL_BETAS):
+        level, trend, sse, count = values[0], 0.0, 0.0, 0
+        for y in values[1:]:
+            error = y - (level + phi * trend)
+            level = level + phi * trend + alpha * error
+            trend = phi * trend + alpha * beta * error
+            sse += error ** 2
+            count += 1
+        if best is None or sse < best[0]:
+            best = (sse, level, trend, alpha, beta, np.sqrt(sse / count))
+    return best[1:]
+
+
+def test_stack_series_right_aligns_a_ragged_panel(ragged):
+    panel = stack_series(ragged)
+    assert panel.shape == (3, 60)
+    assert np.isnan(panel[1, :35]).all() and np.isnan(panel[2, :52]).all()
+    np.testing.assert_array_equal(panel[1, 35:], ragged[1].to_numpy())
+    assert not np.isnan(panel[0]).any()
+
+
+def test_ragged_panel_fits_without_nans(ragged):
+    fit = fit_panel(stack_series(ragged))
+    for values in (fit.level, fit.trend, fit.alpha, fit.beta, fit.sigma):
+        assert values.shape == (3,) and np.isfinite(values).all()
+    assert fit.forecast(12).shape == fit.forecast_std(12).shape == (3, 12)
+    assert np.isfinite(fit.forecast_std(12)).all()
+
+
+def test_gaps_inside_a_series_are_skipped():
+    values = 1000 + np.arange(30) * 2.0
+    gapped = values.copy()
+    gapped[[10, 11, 20]] = np.nan
+    fit = fit_panel(np.vstack([values, gapped]))
+    assert np.isfinite(fit.level).all() and np.isfinite(fit.sigma).all()
+
+
+def test_matches_a_per_series_loop(ragged):
+    fit = fit_panel(stack_series(ragged))
+    for row, series in enumerate(ragged):
+        level, trend, alpha, beta, sigma = reference_fit(series.to_numpy())
+        assert (fit.alpha[row], fit.beta[row]) == (alpha, beta)
+        np.testing.assert_allclose([fit.level[row], fit.trend[row], fit.sigma[row]], [level, trend, sigma],
+                                   rtol=1e-9, atol=1e-9)
+        alone = fit_panel(stack_series([series]))
+        np.testing.assert_allclose(alone.forecast(24)[0], fit.forecast(24)[row], rtol=1e-12)
+
+
+def test_forecast_panel_shape_and_caps(ragged):
+    horizons = {"one_week": 1, "three_months": 12}
+    predictions = forecast_panel(ragged, horizons, [0.8, 0.95], caps=[None, 420.0, None])
+    assert len(predictions) == 3
+    for series, prediction in zip(ragged, predictions):
+        assert list(prediction) == ["one_week", "three_months"]
+        assert len(prediction["three_months"]["predicted_prices"]) == 12
+        assert prediction["one_week"]["dates"] == [(series.index[-1] + pd.Timedelta(weeks=1)).strftime("%Y-%m-%d")]
+        band = prediction["three_months"]["intervals"]
+        assert all(lo80 >= lo95 for lo80, lo95 in zip(band["80"]["lower"], band["95"]["lower"]))
+        assert min(band["95"]["lower"]) >= 0
+    assert max(predictions[1]["three_months"]["intervals"]["95"]["upper"]) <= 420.0
+    assert max(predictions[1]["three_months"]["predicted_prices"]) <= 420.0
@@ -0,0 +1,25 @@
+SAMPLE = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+
+
+def post_batch(client, query=""):
+    return client.post(f"/predict_batch{query}", json={"samples": [SAMPLE]})
+
+
+def test_num_recommendations_must_be_an_integer(flask_client):
+    response = post_batch(flask_client, "?num_recommendations=abc")
+    assert response.status_code == 400
+    assert response.is_json
+    assert "integer" in response.json["error"]
+
+
+def test_num_recommendations_must_be_in_range(flask_client):
+    for value in (0, -1, 10000):
+        response = post_batch(flask_client, f"?num_recommendations={value}")
+        assert response.status_code == 400
+        assert "between 1 and" in response.json["error"]
+
+
+def test_num_recommendations_within_range(flask_client):
+    response = post_batch(flask_client, "?num_recommendations=2")
+    assert response.status_code == 200
+    assert len(response.json["results"][0]["sub_crops"]) == 2
@@ -0,0 +1,21 @@
+import json
+import pytest
+import price_service
+
+CSV = "AppleRajasthanAjmer(F&V)_past3years.csv"
+ARGS = ["Rajasthan", "Ajmer(F&V)", "Apple", "--csv", CSV]
+
+
+@pytest.mark.parametrize("repeat", ["0", "-1"])
+def test_repeat_must_be_positive(backend_dir, capsys, repeat):
+    with pytest.raises(SystemExit) as exc:
+        price_service.main(ARGS + ["--repeat", repeat])
+    assert exc.value.code == 2
+    assert "--repeat must be at least 1" in capsys.readouterr().err
+
+
+def test_repeat_times_every_forecast(backend_dir, capsys):
+    assert price_service.main(ARGS + ["--repeat", "2"]) == 0
+    output = json.loads(capsys.readouterr().out)
+    assert set(output["seconds"]) == {"load", "preprocess", "forecast_1", "forecast_2"}
+    assert output["one_week"]
@@ -0,0 +1,89 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+import pytest
+from price_store import PriceStore, EmptyFetch
+
+SERIES = ("Rajasthan", "Ajmer(F&V)", "Onion")
+
+
+def record(day, modal=1200):
+    return {"S.No": "1", "Market": SERIES[1], "Commodity": SERIES[2], "Min Price": modal - 100,
+            "Max Price": modal + 100, "Modal Price": modal, "Date": day.isoformat(), "State": SERIES[0]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / "prices.db"))
+
+
+class FakeFetch:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def __call__(self, state, commodity, market, from_date, to_date):
+        self.calls.append((from_date.date(), to_date.date()))
+        return self.result(from_date.date(), to_date.date()) if callable(self.result) else self.result
+
+
+def age_coverage(store, hours):
+    updated_at = (datetime.now() - timedelta(hours=hours)).isoformat(timespec="seconds")
+    with sqlite3.connect(store.db_path) as conn:
+        conn.execute("UPDATE coverage SET updated_at = ?", (updated_at,))
+
+
+def test_range_ending_today_is_covered_while_fresh(store):
+    today = date.today()
+    fetch = FakeFetch(lambda from_date, to_date: [record(from_date)])
+    store.get_or_fetch(fetch, SERIES[0], SERIES[2], SERIES[1], today - timedelta(days=30), today)
+    assert store.coverage(SERIES[0], SERIES[1], SERIES[2])[1] == today
+
+    store.get_or_fetch(fetch, SERIES[0], SERIES[2], SERIES[1], today - timedelta(days=30), today)
+    assert len(fetch.calls) == 1
+
+
+def test_today_is_fetched_again_once_stale(store):
+    today = date.today()
+    fetch = FakeFetch(lambda from_date, to_date: [record(from_date)])
+    store.get_or_fetch(fetch, SERIES[0], SERIES[2], SERIES[1], today - timedelta(days=30), today)
+    age_coverage(store, hours=24)
+
+    assert store.missing_ranges(SERIES[0], SERIES[1], SERIES[2], today - timedelta(days=30), today,
+                                fresh_seconds=3600) == [(today, today)]
+    # Extending only the start keeps today stale
+    store.mark_covered(SERIES[0], SERIES[1], SERIES[2], today - timedelta(days=60), today - timedelta(days=31))
+    assert store.missing_ranges(SERIES[0], SERIES[1], SERIES[2], today - timedelta(days=60), today,
+                                fresh_seconds=3600) == [(today, today)]
+
+
+def test_empty_fetch_marks_range_covered(store):
+    today = date.today()
+    fetch = FakeFetch(EmptyFetch())
+    assert store.get_or_fetch(fetch, SERIES[0], SERIES[2], SERIES[1], today - timedelta(days=7), today) == []
+    assert store.coverage(SERIES[0], SERIES[1], SERIES[2]) == (today - timedelta(days=7), today)
+
+    store.get_or_fetch(fetch, SERIES[0], SERIES[2], SERIES[1], today - timedelta(days=7), today)
+    assert len(fetch.calls) == 1
+
+
+def test_failed_fetch_leaves_range_uncovered(store):
+    today = date.today()
+    fetch = FakeFetch([])
+    store.get_or_fetch(fetch, SERIES[0], SERIES[2], SERIES[1], today - timedelta(days=7), today)
+    assert store.coverage(SERIES[0], SERIES[1], SERIES[2]) is None
+
+    store.get_or_fetch(fetch, SERIES[0], SERIES[2], SERIES[1], today - timedelta(days=7), today)
+    assert len(fetch.calls) == 2
+
+
+def test_disjoint_saves_leave_the_gap_missing(store):
+    store.save_prices(*SERIES, [record(date(2024, 1, 5))], date(2024, 1, 1), date(2024, 1, 31))
+    store.save_prices(*SERIES, [record(date(2024, 3, 5))], date(2024, 3, 1), date(2024, 3, 31))
+    assert store.missing_ranges(*SERIES, date(2024, 1, 1), date(2024, 3, 31)) == [
+        (date(2024, 1, 1), date(2024, 2, 29))]
+
+
+def test_adjacent_saves_merge(store):
+    store.save_prices(*SERIES, [record(date(2024, 1, 5))], date(2024, 1, 1), date(2024, 1, 31))
+    store.save_prices(*SERIES, [record(date(2024, 2, 5))], date(2024, 2, 1), date(2024, 2, 29))
+    assert store.coverage(*SERIES) == (date(2024, 1, 1), date(2024, 2, 29))
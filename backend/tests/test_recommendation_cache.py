@@ -0,0 +1,103 @@
+import pytest
+from recommendation_cache import RecommendationCache, parse_precision, DEFAULT_PRECISION
+
+SAMPLE = [90, 42, 43, 20.87, 82.0, 6.503, 202.94]
+
+
+class FakeRecommender:
+    def __init__(self, version="artifact-aaaa"):
+        self.version = version
+        self.calls = []
+
+    def validate_and_preprocess_input(self, N, P, K, temperature, humidity, ph, rainfall):
+        inputs = dict(N=N, P=P, K=K, temperature=temperature, humidity=humidity, ph=ph, rainfall=rainfall)
+        warnings = [f"N ({N}) outside realistic range (0-140), capped"] if N > 140 else []
+        return True, {**inputs, "N": min(N, 140)}, warnings
+
+    def model_version(self):
+        return self.version
+
+    def recommend_sub_crops(self, *values, num_recommendations=3):
+        self.calls.append(values)
+        return {"main_crop": "rice", "main_confidence": 0.9, "sub_crops": [f"{self.version}:{values}"],
+                "warnings": None}
+
+
+@pytest.fixture
+def cache():
+    return RecommendationCache(backend="memory", precision="")
+
+
+def test_nearby_inputs_share_a_quantized_entry(cache):
+    recommender = FakeRecommender()
+    first = cache.recommend(recommender, SAMPLE)
+    second = cache.recommend(recommender, [90.4, 42, 43, 20.91, 82.04, 6.499, 202.9])
+    assert second == first
+    # The miss is computed on the rounded inputs, so cached and fresh results agree
+    assert recommender.calls == [(90.0, 42.0, 43.0, 20.9, 82.0, 6.5, 202.9)]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_warnings_come_from_the_raw_inputs(cache):
+    recommender = FakeRecommender()
+    cache.recommend(recommender, [150] + SAMPLE[1:])
+    assert cache.recommend(recommender, [160] + SAMPLE[1:])["warnings"] == [
+        "N (160) outside realistic range (0-140), capped"]
+    assert cache.recommend(recommender, SAMPLE)["warnings"] is None
+    assert len(recommender.calls) == 2
+
+
+def test_key_includes_version_and_num_recommendations(cache):
+    values = cache.quantize(dict(zip(DEFAULT_PRECISION, SAMPLE)))
+    key = cache.key("artifact-aaaa", values, 3)
+    assert key.startswith("recommend:artifact-aaaa:3:")
+    assert key != cache.key("artifact-bbbb", values, 3)
+    assert key != cache.key("artifact-aaaa", values, 5)
+
+    recommender = FakeRecommender()
+    cache.recommend(recommender, SAMPLE, num_recommendations=3)
+    cache.recommend(recommender, SAMPLE, num_recommendations=5)
+    assert len(recommender.calls) == 2
+
+
+def test_model_change_invalidates_the_cache(cache):
+    recommender = FakeRecommender("artifact-aaaa")
+    cache.recommend(recommender, SAMPLE)
+    recommender.version = "artifact-bbbb"
+    result = cache.recommend(recommender, SAMPLE)
+    assert result["sub_crops"][0].startswith("artifact-bbbb")
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["entries"] == 1
+    assert stats["model_version"] == "artifact-bbbb"
+
+
+def test_precision_overrides():
+    precision = parse_precision("ph=1, rainfall=0")
+    assert precision["ph"] == 1 and precision["rainfall"] == 0 and precision["N"] == DEFAULT_PRECISION["N"]
+    with pytest.raises(ValueError):
+        parse_precision("soil=1")
+    assert RecommendationCache(backend="memory", precision="ph=1").quantize(
+        dict(zip(DEFAULT_PRECISION, SAMPLE)))[5] == 6.5
+
+
+def test_entries_expire_and_are_evicted():
+    cache = RecommendationCache(backend="memory", precision="")
+    cache.backend.ttl = -1
+    recommender = FakeRecommender()
+    cache.recommend(recommender, SAMPLE)
+    cache.recommend(recommender, SAMPLE)
+    assert cache.stats()["expired"] == 1
+
+    cache.backend.ttl, cache.backend.max_entries = 3600, 1
+    cache.recommend(recommender, SAMPLE)
+    cache.recommend(recommender, [10] + SAMPLE[1:])
+    assert cache.stats()["evictions"] == 1
+
+
+def test_recommender_version_tracks_the_loaded_model(backend_dir):
+    import server
+    recommender = server.model_registry.get("subcrop_recommender")
+    version = recommender.model_version()
+    assert version.startswith(("artifact-", "csv-"))
+    assert recommender.model_version() == version
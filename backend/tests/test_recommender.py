@@ -0,0 +1,25 @@
+import json
+import pytest
+
+SAMPLE = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+
+
+@pytest.fixture
+def recommender(backend_dir):
+    import server
+    return server.model_registry.get("subcrop_recommender")
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-Infinity", float("nan"), float("inf")])
+def test_non_finite_input_is_rejected(recommender, value):
+    is_valid, error, warnings = recommender.validate_and_preprocess_input(**{**SAMPLE, "ph": value})
+    assert not is_valid
+    assert error == "Invalid input: ph must be a number"
+
+
+@pytest.mark.parametrize("value", ["NaN", "inf"])
+def test_predict_with_non_finite_input_returns_valid_json(flask_client, value):
+    response = flask_client.post("/predict", json={**SAMPLE, "rainfall": value})
+    body = json.loads(response.get_data(as_text=True), parse_constant=pytest.fail)
+    assert body["error"] == "Invalid input: rainfall must be a number"
+    assert body["sub_crops"] == []
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from price_store import typed_price_frame, read_price_csv, parse_price_values
+from forecasting import weekly_price_series
+
+BUNDLED_CSV = "TomatoTamil NaduTiruchengode_past3years.csv"
+
+
+def record(day, modal, low="", high=""):
+    return {"S.No": "1", "Market": "Tiruchengode", "Commodity": "Tomato", "Min Price": low, "Max Price": high,
+            "Modal Price": modal, "Date": day, "State": "Tamil Nadu"}
+
+
+def test_typed_frame_parses_once_and_drops_undated_rows():
+    frame = typed_price_frame([
+        record("2024-01-01", "1200", "1000", "1400"),
+        record("", "1300"),
+        record("01 Jan 2024", "1300"),
+        record("2024-01-02", "n/a"),
+        record("2024-01-03", 1250.0),
+    ])
+    assert list(frame.columns) == ["Date", "Min Price", "Max Price", "Modal Price"]
+    assert frame["Date"].dtype.kind == "M"
+    assert all(frame[field].dtype == np.int32 for field in ("Min Price", "Max Price", "Modal Price"))
+    assert frame["Date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-01", "2024-01-03"]
+    # A missing min or max price falls back to the modal price
+    assert frame.iloc[0].tolist()[1:] == [1000, 1400, 1200]
+    assert frame.iloc[1].tolist()[1:] == [1250, 1250, 1250]
+
+
+def test_typed_frame_accepts_typed_input():
+    df = pd.DataFrame({"Date": pd.to_datetime(["2024-01-01", "2024-01-08"]), "Modal Price": [1200, 1300]})
+    frame = typed_price_frame(df)
+    assert frame["Modal Price"].tolist() == [1200, 1300]
+    assert frame["Min Price"].tolist() == [1200, 1300]
+
+
+def test_price_values_fall_back_to_coercion():
+    assert parse_price_values(["1200", "1300.5"]).tolist() == [1200.0, 1300.5]
+    values = parse_price_values(["1200", "", None, "abc"])
+    assert values[0] == 1200.0 and np.isnan(values[1:]).all()
+
+
+def test_read_price_csv_drops_undated_rows(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("S.No,Market,Commodity,Min Price,Max Price,Modal Price,Date,State\n"
+                    "1,Tiruchengode,Tomato,1000,1400,1200,2024-01-01,Tamil Nadu\n"
+                    "2,Tiruchengode,Tomato,1000,1400,1300,,Tamil Nadu\n"
+                    "3,Tiruchengode,Tomato,,,1250,2024-01-03,Tamil Nadu\n")
+    frame = read_price_csv(str(path))
+    assert frame["Date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-01", "2024-01-03"]
+    assert frame["Min Price"].tolist() == [1000, 1250]
+
+
+def test_read_price_csv_matches_the_records_path(backend_dir):
+    records = pd.read_csv(BUNDLED_CSV, dtype=str).to_dict("records")
+    pd.testing.assert_frame_equal(read_price_csv(BUNDLED_CSV), typed_price_frame(records))
+
+
+@pytest.mark.parametrize("full_range", [False, True])
+def test_weekly_series_matches_resampling(backend_dir, full_range):
+    frame = read_price_csv(BUNDLED_CSV).set_index("Date").sort_index()
+    expected = frame["Modal Price"].astype(np.float64).resample("W").mean()
+    if full_range:
+        expected = expected.reindex(pd.date_range(start=frame.index.min(), end=frame.index.max(), freq="W"))
+    expected = expected.interpolate(method="linear").ffill().bfill()
+    series = weekly_price_series(read_price_csv(BUNDLED_CSV), freq="W", full_range=full_range)
+    np.testing.assert_allclose(series.to_numpy(), expected.to_numpy())
+    assert (series.index == expected.index).all()
@@ -1,8 +1,14 @@
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import euclidean_distances
 import pickle
+import json
+import math
 import os
+import sys
+import time
+import hashlib
+from model_artifact import write_artifact, read_artifact, read_manifest, classifier_to_arrays, classifier_from_arrays
+from subcrop_index import SubCropIndex
 
 # Realistic Ranges
 realistic_ranges = {
@@ -18,7 +24,7 @@ crop_name_mapping = {
     'Pegeon Pea (Arhar Fali)': 'Pegeon Pea (Arhar Fali)_subcrop_data.csv',
     'Moath Dal': 'Moath Dal_subcrop_data.csv',
     'Green Gram (Moong)(Whole)': 'Green Gram (Moong)(Whole)_subcrop_data.csv',
-    'Black Gram (Urd Beans)(Whole)': 'Black Gram (Urd Beans)(Whole)_subcrop_data.csv',
+    'Black Gram Dal (Urd Dal)': 'Black Gram Dal (Urd Dal)_subcrop_data.csv',
     'Lentil (Masur)(Whole)': 'Lentil (Masur)(Whole)_subcrop_data.csv',
     'Pomegranate': 'Pomegranate_subcrop_data.csv',
     'Banana': 'Banana_subcrop_data.csv',
@@ -35,6 +41,19 @@ crop_name_mapping = {
     'Coffee': 'Coffee_subcrop_data.csv'
 }
 
+# Feature order expected by the main crop classifier
+main_feature_columns = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Feature order used for sub-crop distance matching
+subcrop_feature_columns = ['N', 'P', 'K', 'temperature', 'rainfall', 'ph', 'humidity']
+
+# Versioned single-file artifact holding the classifier, sub-crop tables and
+# realistic ranges, memory-mapped at load (see model_artifact.py). Built with
+# `python train.py build-artifact`; bump ARTIFACT_VERSION on layout changes.
+RECOMMENDER_ARTIFACT = os.environ.get('RECOMMENDER_ARTIFACT', 'subcrop_recommender.npz')
+ARTIFACT_FORMAT = 'subcrop-recommender'
+ARTIFACT_VERSION = 1
+
 # SubCropRecommender Class
 class SubCropRecommender:
     def __init__(self, main_model_path='main_crop_model.pkl', subcrop_dir='sub_crop_data'):
@@ -42,11 +61,155 @@ class SubCropRecommender:
         self.subcrop_dir = subcrop_dir
         self.crop_name_mapping = crop_name_mapping
         self.realistic_ranges = realistic_ranges
+        self.load_subcrop_tables()
+
+    # The preloaded tables are rebuilt from the CSVs rather than pickled
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('subcrop_tables', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if getattr(self, 'artifact_path', None):
+            self.subcrop_tables = tables_from_arrays(read_artifact(self.artifact_path))
+        else:
+            self.load_subcrop_tables()
+
+    # Recommender backed by a built artifact: nothing is unpickled and the
+    # arrays stay memory-mapped, so the CSVs are not consulted at query time
+    @classmethod
+    def from_artifact(cls, path=RECOMMENDER_ARTIFACT):
+        arrays = read_artifact(path)
+        manifest = read_manifest(arrays)
+        if manifest.get('format') != ARTIFACT_FORMAT or manifest.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"{path} is not a version {ARTIFACT_VERSION} {ARTIFACT_FORMAT} artifact")
+        if (manifest['main_feature_columns'] != main_feature_columns
+                or manifest['subcrop_feature_columns'] != subcrop_feature_columns):
+            raise ValueError(f"{path} was built for different feature columns")
+        recommender = cls.__new__(cls)
+        recommender.main_model = classifier_from_arrays(manifest['classifier'], arrays)
+        recommender.subcrop_dir = None
+        recommender.artifact_path = path
+        # The manifest records when the artifact was built, so every rebuild gets a new version
+        recommender.artifact_version = 'artifact-' + hashlib.sha256(bytes(arrays['manifest'])).hexdigest()[:16]
+        recommender.crop_name_mapping = dict(zip(arrays['crop_names'].tolist(), arrays['crop_files'].tolist()))
+        recommender.realistic_ranges = {
+            param: tuple(int(v) if float(v).is_integer() else float(v) for v in bounds)
+            for param, bounds in zip(arrays['range_features'].tolist(), arrays['ranges'].tolist())
+        }
+        recommender.subcrop_tables = tables_from_arrays(arrays)
+        return recommender
+
+    # Identifies the model answering recommendations, for caches of its
+    # results: the artifact's version, or for a CSV-backed recommender a digest
+    # of the classifier and the sub-crop CSVs' mtimes (the tables reload when
+    # a CSV changes, see get_subcrop_table)
+    def model_version(self):
+        if getattr(self, 'artifact_path', None):
+            return self.artifact_version
+        if getattr(self, 'classifier_digest', None) is None:
+            self.classifier_digest = hashlib.sha256(pickle.dumps(self.main_model)).hexdigest()
+        digest = hashlib.sha256(self.classifier_digest.encode())
+        for main_crop in sorted(self.crop_name_mapping):
+            try:
+                mtime = os.stat(os.path.join(self.subcrop_dir, self.crop_name_mapping[main_crop])).st_mtime_ns
+            except OSError:
+                mtime = None
+            digest.update(f"{main_crop}:{mtime};".encode())
+        return 'csv-' + digest.hexdigest()[:16]
 
     def load_main_crop_model(self, path):
         with open(path, 'rb') as file:
             return pickle.load(file)
 
+    # Load every sub-crop table once into contiguous float32 arrays.
+    # Rows are grouped by integer-coded sub-crop label so every label is one
+    # contiguous slice of the table (see subcrop_index.py).
+    def load_subcrop_tables(self):
+        self.subcrop_tables = {}
+        for main_crop in self.crop_name_mapping:
+            self.subcrop_tables[main_crop] = self.read_subcrop_table(main_crop)
+
+    def read_subcrop_table(self, main_crop):
+        subcrop_filename = self.crop_name_mapping[main_crop]
+        subcrop_file = os.path.join(self.subcrop_dir, subcrop_filename)
+        if not os.path.exists(subcrop_file):
+            return {"error": f"Sub-crop file {subcrop_filename} not found", "mtime": None}
+        mtime = os.stat(subcrop_file).st_mtime_ns
+
+        sub_crop_df = pd.read_csv(subcrop_file)
+        required_cols = ['sub-crop'] + subcrop_feature_columns
+        missing_cols = [col for col in required_cols if col not in sub_crop_df.columns]
+        if missing_cols:
+            return {"error": f"Missing columns: {missing_cols}", "mtime": mtime}
+
+        codes, labels = pd.factorize(sub_crop_df['sub-crop'])
+        order = np.argsort(codes, kind='stable')
+        features = np.ascontiguousarray(
+            sub_crop_df[subcrop_feature_columns].values[order], dtype=np.float32
+        )
+        label_starts = np.searchsorted(codes[order], np.arange(len(labels)))
+        return {
+            "error": None,
+            "mtime": mtime,
+            "features": features,
+            "labels": np.asarray(labels, dtype=object),
+            "label_starts": label_starts,
+        }
+
+    # Return the preloaded table, reloading it if the CSV changed on disk.
+    # Artifact-backed recommenders only change by rebuilding the artifact.
+    def get_subcrop_table(self, main_crop):
+        if self.subcrop_dir is None:
+            return self.subcrop_tables[main_crop]
+        subcrop_file = os.path.join(self.subcrop_dir, self.crop_name_mapping[main_crop])
+        try:
+            mtime = os.stat(subcrop_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        table = self.subcrop_tables.get(main_crop)
+        if table is None or table["mtime"] != mtime:
+            table = self.read_subcrop_table(main_crop)
+            self.subcrop_tables[main_crop] = table
+        return table
+
+    # Nearest-neighbour index over a table's standardized, weighted features,
+    # built on first use and kept with the table (so a reloaded CSV gets a
+    # fresh one). Backend, scaling and weights come from subcrop_index.py.
+    def get_subcrop_index(self, table):
+        if "index" not in table:
+            table["index"] = SubCropIndex(table["features"], table["label_starts"], subcrop_feature_columns)
+        return table["index"]
+
+    # The most sub-crops any main crop has, i.e. the largest useful num_recommendations
+    def max_recommendations(self):
+        return max((len(table["labels"]) for table in self.subcrop_tables.values() if not table["error"]), default=0)
+
+    # Build every table's index up front, e.g. during model warm-up
+    def build_subcrop_indexes(self):
+        for main_crop in self.subcrop_tables:
+            table = self.get_subcrop_table(main_crop)
+            if not table["error"]:
+                self.get_subcrop_index(table)
+
+    # Nearest distinct sub-crops for each input row. Distances are measured in
+    # the index's scaled feature space.
+    def nearest_sub_crops(self, table, input_vectors, num_recommendations=3, chunk_size=4096):
+        top, top_distances = self.get_subcrop_index(table).nearest_labels(
+            input_vectors, num_recommendations, chunk_size)
+        return [[{"sub_crop": table["labels"][i], "distance": float(dist)}
+                 for i, dist in zip(row_top, row_distances)]
+                for row_top, row_distances in zip(top, top_distances)]
+
+    # Predicted main crop and its confidence from a single predict_proba call
+    def classify_main_crops(self, input_df):
+        probabilities = self.main_model.predict_proba(input_df)
+        best = probabilities.argmax(axis=1)
+        main_crops = self.main_model.classes_[best]
+        confidences = probabilities[np.arange(len(best)), best]
+        return main_crops, confidences
+
     def validate_and_preprocess_input(self, N, P, K, temperature, humidity, ph, rainfall):
         inputs = {'N': N, 'P': P, 'K': K, 'temperature': temperature, 
                   'humidity': humidity, 'ph': ph, 'rainfall': rainfall}
@@ -55,6 +218,9 @@ class SubCropRecommender:
                 inputs[param] = float(val)
             except (ValueError, TypeError):
                 return False, f"Invalid input: {param} must be a number", []
+            # float() accepts "nan" and "inf", which would reach the distances
+            if not math.isfinite(inputs[param]):
+                return False, f"Invalid input: {param} must be a number", []
         capped_inputs = {}
         warnings_list = []
         for param, val in inputs.items():
@@ -78,44 +244,22 @@ class SubCropRecommender:
                                       capped_inputs['K'], capped_inputs['temperature'], 
                                       capped_inputs['humidity'], capped_inputs['ph'], 
                                       capped_inputs['rainfall']]],
-                                    columns=['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall'])
-            main_crop = self.main_model.predict(input_df)[0]
-            main_confidence = float(max(self.main_model.predict_proba(input_df)[0]))
+                                    columns=main_feature_columns)
+            main_crops, confidences = self.classify_main_crops(input_df)
+            main_crop = main_crops[0]
+            main_confidence = float(confidences[0])
             
             if main_crop not in self.crop_name_mapping:
                 return {"error": f"No sub-crop mapping for {main_crop}", "main_crop": main_crop, 
                         "sub_crops": [], "warnings": warnings}
             
-            subcrop_filename = self.crop_name_mapping[main_crop]
-            subcrop_file = os.path.join(self.subcrop_dir, subcrop_filename)
-            
-            if not os.path.exists(subcrop_file):
-                return {"error": f"Sub-crop file {subcrop_filename} not found", 
-                        "main_crop": main_crop, "sub_crops": [], "warnings": warnings}
-            
-            sub_crop_df = pd.read_csv(subcrop_file)
-            required_cols = ['sub-crop', 'N', 'P', 'K', 'temperature', 'rainfall', 'ph', 'humidity']
-            missing_cols = [col for col in required_cols if col not in sub_crop_df.columns]
-            if missing_cols:
-                return {"error": f"Missing columns: {missing_cols}", "main_crop": main_crop, 
+            table = self.get_subcrop_table(main_crop)
+            if table["error"]:
+                return {"error": table["error"], "main_crop": main_crop, 
                         "sub_crops": [], "warnings": warnings}
             
-            input_vector = np.array([[capped_inputs['N'], capped_inputs['P'], capped_inputs['K'], 
-                                      capped_inputs['temperature'], capped_inputs['rainfall'], 
-                                      capped_inputs['ph'], capped_inputs['humidity']]])
-            sub_crop_features = sub_crop_df[['N', 'P', 'K', 'temperature', 'rainfall', 'ph', 'humidity']].values
-            
-            distances = euclidean_distances(input_vector, sub_crop_features)[0]
-            sub_crops_with_distances = sorted(zip(sub_crop_df['sub-crop'], distances), key=lambda x: x[1])
-            
-            unique_sub_crops = []
-            seen_sub_crops = set()
-            for crop, dist in sub_crops_with_distances:
-                if crop not in seen_sub_crops:
-                    unique_sub_crops.append({"sub_crop": crop, "distance": float(dist)})
-                    seen_sub_crops.add(crop)
-                if len(unique_sub_crops) == num_recommendations:
-                    break
+            input_vector = np.array([capped_inputs[col] for col in subcrop_feature_columns])
+            unique_sub_crops = self.nearest_sub_crops(table, input_vector, num_recommendations)[0]
             
             return {
                 "main_crop": main_crop,
@@ -126,48 +270,91 @@ class SubCropRecommender:
         except Exception as e:
             return {"error": str(e), "main_crop": None, "sub_crops": [], "warnings": None}
 
-    def calculate_subcrop_accuracy(self, num_recommendations=3):
-        total_tests = 0
-        correct_matches = 0
-        
-        with open('subcrop_accuracy_debug.txt', 'w') as debug_file:
-            for main_crop, filename in self.crop_name_mapping.items():
-                file_path = os.path.join(self.subcrop_dir, filename)
-                if not os.path.exists(file_path):
-                    debug_file.write(f"Skipping {main_crop}: {filename} not found\n")
-                    continue
-                
-                sub_crop_df = pd.read_csv(file_path)
-                required_cols = ['sub-crop', 'N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
-                if not all(col in sub_crop_df.columns for col in required_cols):
-                    debug_file.write(f"Skipping {main_crop}: {filename} missing required columns\n")
-                    continue
-                
-                for _, row in sub_crop_df.iterrows():
-                    expected_sub_crop = row['sub-crop']
-                    test_input = [row['N'], row['P'], row['K'], row['temperature'], 
-                                  row['humidity'], row['ph'], row['rainfall']]
-                    
-                    result = self.recommend_sub_crops(*test_input, num_recommendations=num_recommendations)
-                    
-                    if "error" in result:
-                        debug_file.write(f"Error for {main_crop}: {result['error']}\n")
-                        continue
-                    
-                    predicted_sub_crops = [item['sub_crop'] for item in result['sub_crops']]
-                    total_tests += 1
-                    
-                    if expected_sub_crop in predicted_sub_crops:
-                        correct_matches += 1
-                    else:
-                        debug_file.write(f"Mismatch for {main_crop}: Expected {expected_sub_crop}, Got {predicted_sub_crops}\n")
-            
-            accuracy = (correct_matches / total_tests) * 100 if total_tests > 0 else 0.0
-            accuracy_message = f"Accuracy: {accuracy:.2f}% (Correct: {correct_matches}/{total_tests})"
-            debug_file.write(f"\n{accuracy_message}\n")
-        
+    # Vectorized counterpart of validate_and_preprocess_input for an (n, 7) matrix
+    # in main_feature_columns order. Returns the capped matrix, a validity mask
+    # and per-row warning lists.
+    def validate_and_preprocess_batch(self, matrix):
+        values = np.array(matrix, dtype=float)
+        if values.ndim != 2 or values.shape[1] != len(main_feature_columns):
+            raise ValueError(f"Expected a matrix with {len(main_feature_columns)} columns: {main_feature_columns}")
+        lows = np.array([self.realistic_ranges[col][0] for col in main_feature_columns], dtype=float)
+        highs = np.array([self.realistic_ranges[col][1] for col in main_feature_columns], dtype=float)
+        valid = np.isfinite(values).all(axis=1)
+        out_of_range = (values < lows) | (values > highs)
+        capped = np.clip(values, lows, highs)
+        warnings_list = [[] for _ in range(len(values))]
+        for row, col in zip(*np.nonzero(out_of_range & valid[:, None])):
+            param = main_feature_columns[col]
+            warnings_list[row].append(f"{param} ({values[row, col]}) outside realistic range "
+                                      f"({lows[col]:g}-{highs[col]:g}), capped")
+        return capped, valid, warnings_list
+
+    # Score many samples at once: one classifier call for the whole batch, then
+    # one vectorized distance computation per predicted main crop.
+    # If timings is given, seconds spent per stage (validate, classify, match)
+    # are added to it.
+    def recommend_sub_crops_batch(self, matrix, num_recommendations=3, timings=None):
+        timings = {} if timings is None else timings
+        started = time.perf_counter()
+        capped, valid, warnings_list = self.validate_and_preprocess_batch(matrix)
+        results = [{"error": "Invalid input: all parameters must be finite numbers", "main_crop": None,
+                    "sub_crops": [], "warnings": None} for _ in range(len(capped))]
+        valid_rows = np.flatnonzero(valid)
+        started = add_stage_time(timings, 'validate', started)
+        if len(valid_rows) == 0:
+            return results
+
+        input_df = pd.DataFrame(capped[valid_rows], columns=main_feature_columns)
+        main_crops, confidences = self.classify_main_crops(input_df)
+        started = add_stage_time(timings, 'classify', started)
+        subcrop_order = [main_feature_columns.index(col) for col in subcrop_feature_columns]
+
+        for main_crop in np.unique(main_crops):
+            group = np.flatnonzero(main_crops == main_crop)
+            rows = valid_rows[group]
+            if main_crop not in self.crop_name_mapping:
+                error = f"No sub-crop mapping for {main_crop}"
+                neighbours = None
+            else:
+                table = self.get_subcrop_table(main_crop)
+                error = table["error"]
+                neighbours = None if error else self.nearest_sub_crops(
+                    table, capped[rows][:, subcrop_order], num_recommendations)
+            for i, row in enumerate(rows):
+                warnings = warnings_list[row]
+                if error:
+                    results[row] = {"error": error, "main_crop": main_crop,
+                                    "sub_crops": [], "warnings": warnings}
+                else:
+                    results[row] = {
+                        "main_crop": main_crop,
+                        "main_confidence": float(confidences[group[i]]),
+                        "sub_crops": neighbours[i],
+                        "warnings": warnings if warnings else None
+                    }
+        add_stage_time(timings, 'match', started)
+        return results
+
+    # Share of sub-crop table rows whose own sub-crop is among the top
+    # recommendations. The full per-crop report is written to report_path
+    # (see subcrop_evaluation.py).
+    def calculate_subcrop_accuracy(self, num_recommendations=3, report_path='subcrop_accuracy_report.json'):
+        from subcrop_evaluation import evaluate_recommender, write_report
+        report = evaluate_recommender(self, num_recommendations)
+        if report_path:
+            write_report(report, report_path)
+        summary = report['summary']
+        accuracy = summary['top_k_accuracy'][f'top_{num_recommendations}'] * 100
+        accuracy_message = (f"Accuracy: {accuracy:.2f}% "
+                            f"(Correct: {summary['hits'][f'top_{num_recommendations}']}/{summary['evaluated']})")
         return accuracy, accuracy_message
 
+# Add the seconds since started to a stage total; returns the new start time
+def add_stage_time(timings, stage, started):
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - started
+    return now
+
 # Save the Model as a .pkl File
 def save_subcrop_model(filename='subcrop_recommender.pkl'):
     recommender = SubCropRecommender(main_model_path='main_crop_model.pkl', 
@@ -176,13 +363,211 @@ def save_subcrop_model(filename='subcrop_recommender.pkl'):
         pickle.dump(recommender, file)
     print(f"Sub-crop recommender model saved as '{filename}'")
 
+# The saved model was pickled from this script, so its class is recorded as
+# __main__.SubCropRecommender; resolve that to this module from anywhere
+class SubCropUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module == '__main__' and name == 'SubCropRecommender':
+            return SubCropRecommender
+        return super().find_class(module, name)
+
 # Load and Use the Saved Model
 def load_subcrop_model(filename='subcrop_recommender.pkl'):
     with open(filename, 'rb') as file:
-        return pickle.load(file)
+        return SubCropUnpickler(file).load()
+
+# The artifact when it has been built, else the pickled recommender
+def load_recommender(artifact_path=RECOMMENDER_ARTIFACT, pickle_path='subcrop_recommender.pkl'):
+    if os.path.exists(artifact_path):
+        recommender = SubCropRecommender.from_artifact(artifact_path)
+    else:
+        recommender = load_subcrop_model(pickle_path)
+    recommender.build_subcrop_indexes()
+    return recommender
+
+# Sub-crop tables flattened into shared arrays: every table's rows are one
+# slice of subcrop_features and its labels one slice of subcrop_labels
+def tables_to_arrays(subcrop_tables):
+    crop_names, crop_errors, features, labels, label_starts = [], [], [], [], []
+    feature_offsets, label_offsets = [0], [0]
+    for main_crop, table in subcrop_tables.items():
+        crop_names.append(main_crop)
+        crop_errors.append(table['error'] or '')
+        if not table['error']:
+            features.append(table['features'])
+            labels.append(np.asarray(table['labels']).astype(str))
+            label_starts.append(table['label_starts'])
+        feature_offsets.append(feature_offsets[-1] + (0 if table['error'] else len(table['features'])))
+        label_offsets.append(label_offsets[-1] + (0 if table['error'] else len(table['labels'])))
+    return {
+        'crop_names': np.array(crop_names, dtype=str),
+        'crop_errors': np.array(crop_errors, dtype=str),
+        'crop_feature_offsets': np.array(feature_offsets, dtype=np.int64),
+        'crop_label_offsets': np.array(label_offsets, dtype=np.int64),
+        'subcrop_features': np.concatenate(features).astype(np.float32),
+        'subcrop_labels': np.concatenate(labels),
+        'subcrop_label_starts': np.concatenate(label_starts).astype(np.int64),
+    }
+
+def tables_from_arrays(arrays):
+    tables = {}
+    feature_offsets, label_offsets = arrays['crop_feature_offsets'], arrays['crop_label_offsets']
+    for i, (main_crop, error) in enumerate(zip(arrays['crop_names'].tolist(), arrays['crop_errors'].tolist())):
+        if error:
+            tables[main_crop] = {"error": error, "mtime": None}
+            continue
+        tables[main_crop] = {
+            "error": None,
+            "mtime": None,
+            "features": arrays['subcrop_features'][feature_offsets[i]:feature_offsets[i + 1]],
+            "labels": arrays['subcrop_labels'][label_offsets[i]:label_offsets[i + 1]],
+            "label_starts": arrays['subcrop_label_starts'][label_offsets[i]:label_offsets[i + 1]],
+        }
+    return tables
+
+def build_recommender_artifact(path=RECOMMENDER_ARTIFACT, main_model_path='main_crop_model.pkl',
+                               subcrop_dir='sub_crop_data', classifier_metrics=None):
+    recommender = SubCropRecommender(main_model_path=main_model_path, subcrop_dir=subcrop_dir)
+    classifier_kind, arrays = classifier_to_arrays(recommender.main_model)
+    arrays.update(tables_to_arrays(recommender.subcrop_tables))
+    arrays['crop_files'] = np.array([recommender.crop_name_mapping[crop] for crop in arrays['crop_names']], dtype=str)
+    arrays['range_features'] = np.array(list(realistic_ranges), dtype=str)
+    arrays['ranges'] = np.array(list(realistic_ranges.values()), dtype=np.float64)
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'version': ARTIFACT_VERSION,
+        'classifier': classifier_kind,
+        'main_feature_columns': main_feature_columns,
+        'subcrop_feature_columns': subcrop_feature_columns,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    # Metrics saved by train_main_classifier for this model file
+    if classifier_metrics is None and os.path.exists(CLASSIFIER_METRICS):
+        with open(CLASSIFIER_METRICS) as file:
+            saved_metrics = json.load(file)
+        if saved_metrics.get('model') == os.path.basename(main_model_path):
+            classifier_metrics = saved_metrics
+    if classifier_metrics is not None:
+        manifest['classifier_metrics'] = classifier_metrics
+    write_artifact(path, arrays, manifest)
+    print(f"Recommender artifact ({classifier_kind} classifier) saved as '{path}' "
+          f"({os.path.getsize(path) / 1024:.0f} KiB)")
+    return path
+
+# Main crop classifier training. Every candidate is cross-validated on
+# Crop_recommendation.csv and timed in the form it is served in (the artifact
+# round trip, so forests are timed as a CompactForest). The winner is the
+# fastest single-row predictor whose accuracy is within accuracy_tolerance of
+# the best; it is saved with its metrics and the artifact is rebuilt.
+CLASSIFIER_DATA = 'Crop_recommendation.csv'
+CLASSIFIER_METRICS = 'main_crop_model_metrics.json'
+
+def classifier_candidates():
+    from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    return {
+        'random_forest': lambda: RandomForestClassifier(random_state=42),
+        'random_forest_small': lambda: RandomForestClassifier(n_estimators=30, max_depth=12, random_state=42),
+        'extra_trees': lambda: ExtraTreesClassifier(random_state=42),
+        'decision_tree': lambda: DecisionTreeClassifier(random_state=42),
+        'knn': lambda: make_pipeline(StandardScaler(), KNeighborsClassifier()),
+        'logistic_regression': lambda: make_pipeline(StandardScaler(), LogisticRegression(max_iter=2000)),
+        'gaussian_nb': lambda: GaussianNB(),
+    }
+
+# Served-form latency: median milliseconds for a one-row DataFrame (as in
+# recommend_sub_crops) and microseconds per row for a batch_size-row batch
+def classifier_latency(model, X, repeats=200, batch_size=1000):
+    rng = np.random.default_rng(42)
+    single = []
+    for i in rng.integers(len(X), size=repeats):
+        row = X.iloc[[i]]
+        started = time.perf_counter()
+        model.predict_proba(row)
+        single.append(time.perf_counter() - started)
+    batch = X.iloc[rng.integers(len(X), size=batch_size)]
+    batch_times = []
+    for _ in range(5):
+        started = time.perf_counter()
+        model.predict_proba(batch)
+        batch_times.append(time.perf_counter() - started)
+    return float(np.median(single)) * 1e3, min(batch_times) / batch_size * 1e6
+
+def benchmark_classifier(make_model, X, y, folds=5):
+    from sklearn.model_selection import StratifiedKFold, cross_val_score
+    scores = cross_val_score(make_model(), X, y, cv=StratifiedKFold(folds, shuffle=True, random_state=42))
+    started = time.perf_counter()
+    model = make_model().fit(X, y)
+    fit_seconds = time.perf_counter() - started
+    classifier_kind, arrays = classifier_to_arrays(model)
+    served = classifier_from_arrays(classifier_kind, arrays)
+    single_ms, batch_us = classifier_latency(served, X)
+    return model, {
+        'cv_accuracy_mean': round(float(scores.mean()), 6),
+        'cv_accuracy_std': round(float(scores.std()), 6),
+        'fit_seconds': round(fit_seconds, 4),
+        'single_row_ms': round(single_ms, 4),
+        'batch_row_us': round(batch_us, 3),
+        'size_bytes': int(sum(np.asarray(array).nbytes for array in arrays.values())),
+        'format': classifier_kind,
+    }
+
+def train_main_classifier(data_path=CLASSIFIER_DATA, model_path='main_crop_model.pkl',
+                          metrics_path=CLASSIFIER_METRICS, artifact_path=RECOMMENDER_ARTIFACT,
+                          candidates=None, accuracy_tolerance=0.005):
+    data = pd.read_csv(data_path)
+    missing_cols = [col for col in main_feature_columns + ['label'] if col not in data.columns]
+    if missing_cols:
+        raise ValueError(f"{data_path} is missing columns: {missing_cols}")
+    X, y = data[main_feature_columns], data['label']
+    factories = classifier_candidates()
+    unknown = [name for name in candidates or [] if name not in factories]
+    if unknown:
+        raise ValueError(f"Unknown classifier candidates: {unknown}")
+
+    models, results = {}, {}
+    for name in candidates or factories:
+        models[name], results[name] = benchmark_classifier(factories[name], X, y)
+        print(f"{name}: {json.dumps(results[name])}")
+
+    best_accuracy = max(result['cv_accuracy_mean'] for result in results.values())
+    eligible = [name for name, result in results.items()
+                if result['cv_accuracy_mean'] >= best_accuracy - accuracy_tolerance]
+    selected = min(eligible, key=lambda name: results[name]['single_row_ms'])
+    metrics = {
+        'selected': selected,
+        'model': os.path.basename(model_path),
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'data': os.path.basename(data_path),
+        'rows': len(data),
+        'classes': int(y.nunique()),
+        'accuracy_tolerance': accuracy_tolerance,
+        'candidates': results,
+    }
+    with open(model_path, 'wb') as file:
+        pickle.dump(models[selected], file)
+    with open(metrics_path, 'w') as file:
+        json.dump(metrics, file, indent=2)
+    print(f"Selected {selected}; saved as '{model_path}' with metrics in '{metrics_path}'")
+    if artifact_path:
+        build_recommender_artifact(artifact_path, main_model_path=model_path, classifier_metrics=metrics)
+    return metrics
 
 # Test the Model
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'build-artifact':
+        build_recommender_artifact(*sys.argv[2:3])
+        sys.exit(0)
+    # python train.py train-classifier [data.csv] [model.pkl]
+    if len(sys.argv) > 1 and sys.argv[1] == 'train-classifier':
+        train_main_classifier(*sys.argv[2:4])
+        sys.exit(0)
+
     # Save the model
     save_subcrop_model('subcrop_recommender.pkl')
     